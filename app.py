@@ -1,24 +1,47 @@
 from flask import Flask, redirect, session, url_for
 from config import Config
-from extensions import db, migrate, jwt
+from extensions import db, migrate, jwt, cache
 from routes.auth import auth_bp
 from routes.tv import tv_bp
 from routes.people import people_bp
+from routes.search import search_bp
 from ui.ui_routes import ui_bp
+from commands import register_commands
+import dbpool
+import metrics
+import replicas
+import instrumentation
+import identity
+import passwords
+import ratelimit
+import deletion
 
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", dbpool.engine_options(app.config))
+    # first, so its timers wrap the other extensions' request hooks
+    instrumentation.init_app(app)
 
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+    identity.init_app(app)
+    passwords.init_app(app)
+    cache.init_app(app)
+    # after identity (resolves the user it keys buckets by) and cache (shares its Redis client)
+    ratelimit.init_app(app)
+    replicas.init_app(app)
+    deletion.init_app(app)
+    metrics.init_app(app)
+    register_commands(app)
 
     # API routes
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(tv_bp, url_prefix="/api/tv")
     app.register_blueprint(people_bp, url_prefix="/api/people")
+    app.register_blueprint(search_bp, url_prefix="/api/search")
 
     # UI routes
     app.register_blueprint(ui_bp)
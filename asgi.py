@@ -0,0 +1,334 @@
+# asgi.py
+# ASGI entry point:  uvicorn asgi:app --workers 4
+#
+# The public read API (catalog GETs under /api/tv, /api/search) is served
+# natively on SQLAlchemy's asyncio engine (psycopg async on PostgreSQL,
+# aiosqlite in dev), so a request waiting on the database holds a coroutine
+# rather than a worker thread. Everything else - auth, admin writes, people,
+# the UI - goes to the unchanged Flask app through a WSGI bridge.
+#
+# Handlers reuse the sync query helpers through AsyncSession.run_sync and
+# share the response cache (same keys, entries and ETags) with the Flask views.
+# Native routes draw from the same RATE_LIMIT_READ buckets (ratelimit.py) as
+# the Flask app, keyed by the token's user id or the client address, and hold
+# a slot of the app's ConcurrencyGate (MAX_CONCURRENT_REQUESTS) while served.
+import asyncio
+import hashlib
+import re
+from urllib.parse import parse_qsl
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_etags, parse_date, http_date, quote_etag, unquote_etag
+from app import app as flask_app
+from extensions import db, cache
+from cache import LRUBackend, NullBackend, SHOWS_TAG, show_tag, season_tag
+from models import TVShow, ShowStats
+from schemas import TVShowSchema, SeasonSchema, EpisodeWithActorsSchema
+from queries import (live_show, show_with_seasons, season_with_episodes, season_stats_for_show, build_show_tree,
+                     parse_tree_fields, parse_tree_include, TreeFieldsError)
+from pagination import keyset_page, PageRequestError
+from conditional import is_fresh, entity_etag, collection_etag, episodes_etag
+from routes.tv import SHOW_SORTS, filter_shows, stats_payload
+from routes.search import parse_search_args, search_page
+from search import search
+from dbpool import engine_options, statement_timeout
+from flask import g
+from flask_jwt_extended import decode_token
+import ratelimit
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+psycopg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(app):
+    """The app's database URL with an asyncio driver (psycopg / aiosqlite)."""
+    if app.config.get("ASYNC_DATABASE_URI"):
+        return app.config["ASYNC_DATABASE_URI"]
+    with app.app_context():
+        url = db.engine.url  # relative sqlite paths already resolved by Flask-SQLAlchemy
+    try:
+        return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    except KeyError:
+        raise RuntimeError(f"no asyncio driver configured for {url.get_backend_name()}; set ASYNC_DATABASE_URI")
+
+
+class Reply:
+    """A handler result. ``data`` may be a callable, only run when a body is needed."""
+
+    def __init__(self, data, status=200, etag=None, last_modified=None):
+        self.data = data
+        self.status = status
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def _error(msg, status):
+    return Reply({"msg": msg}, status)
+
+
+# ---------- read handlers (mirror routes/tv.py and routes/search.py) ----------
+async def list_shows(session, args):
+    try:
+        shows, next_cursor = await session.run_sync(
+            lambda s: keyset_page(filter_shows(select(TVShow), args), SHOW_SORTS, args, session=s))
+    except PageRequestError as e:
+        return _error(str(e), 400)
+    return Reply(
+        lambda: {"items": TVShowSchema(many=True).dump(shows), "next_cursor": next_cursor},
+        etag=collection_etag([next_cursor] + [(s.id, s.version) for s in shows]),
+    )
+
+
+async def show_detail(session, args, show_id):
+    show = (await session.execute(live_show(show_id))).scalar_one_or_none()
+    if show is None:
+        return _error("show not found", 404)
+    return Reply(lambda: TVShowSchema().dump(show), etag=entity_etag(show), last_modified=show.updated_at)
+
+
+async def list_seasons(session, args, show_id):
+    show = (await session.execute(show_with_seasons(show_id))).scalar_one_or_none()
+    if show is None:
+        return _error("show not found", 404)
+    return Reply(
+        lambda: SeasonSchema(many=True).dump(show.seasons),
+        etag=collection_etag([(s.id, s.version) for s in show.seasons]),
+    )
+
+
+async def list_episodes(session, args, season_id):
+    season = (await session.execute(season_with_episodes(season_id))).scalar_one_or_none()
+    if season is None:
+        return _error("season not found", 404)
+    return Reply(
+        lambda: EpisodeWithActorsSchema(many=True).dump(season.episodes),
+        etag=episodes_etag(season.episodes),
+    )
+
+
+async def show_stats(session, args, show_id):
+    stats = await session.get(ShowStats, show_id)
+    if stats is None:
+        return _error("show not found", 404)
+    seasons = (await session.execute(season_stats_for_show(show_id))).all()
+    return Reply(stats_payload(stats, seasons))
+
+
+async def show_tree(session, args, show_id):
+    try:
+        include = parse_tree_include(args.get("include"))
+        fields = parse_tree_fields(args.get("fields"))
+    except TreeFieldsError as e:
+        return _error(str(e), 400)
+    tree = await session.run_sync(lambda s: build_show_tree(s.connection(), show_id, fields, include))
+    if tree is None:
+        return _error("show not found", 404)
+    return Reply(tree)
+
+
+async def search_catalog(session, args):
+    try:
+        q, kinds, limit, page = parse_search_args(args)
+    except PageRequestError as e:
+        return _error(str(e), 400)
+    rows = await session.run_sync(
+        lambda s: search(q, kinds, limit=limit + 1, offset=(page - 1) * limit, session=s))
+    return Reply(search_page(rows, limit, page))
+
+
+# (path pattern, handler, cache tags or None for uncached)
+READ_ROUTES = [
+    (r"/api/tv/shows", list_shows, lambda: [SHOWS_TAG]),
+    (r"/api/tv/shows/(?P<show_id>\d+)", show_detail, lambda show_id: [show_tag(show_id)]),
+    (r"/api/tv/shows/(?P<show_id>\d+)/seasons", list_seasons, lambda show_id: [show_tag(show_id)]),
+    (r"/api/tv/seasons/(?P<season_id>\d+)/episodes", list_episodes, lambda season_id: [season_tag(season_id)]),
+    (r"/api/tv/shows/(?P<show_id>\d+)/stats", show_stats, lambda show_id: [show_tag(show_id)]),
+    (r"/api/tv/shows/(?P<show_id>\d+)/tree", show_tree, lambda show_id: [show_tag(show_id)]),
+    (r"/api/search", search_catalog, None),
+]
+
+
+# ---------- plumbing ----------
+class _WsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs every bridged WSGI call on one shared thread, which would
+    # serialize the write API; use the default thread pool instead
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__["run_wsgi_app"].func, thread_sensitive=False)
+
+
+class _WsgiBridge(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _WsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+def _headers(scope):
+    return {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+
+
+def _fresh(headers, etag, last_modified):
+    inm = headers.get("if-none-match")
+    return is_fresh(parse_etags(inm) if inm else None, parse_date(headers.get("if-modified-since")),
+                    etag, last_modified)
+
+
+async def _send(send, status, body=b"", headers=()):
+    raw = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+    raw.append((b"content-length", str(len(body)).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": raw})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _refuse(send, status, msg, retry_after):
+    # same body as ratelimit._refuse (jsonify)
+    body = ('{"msg":"%s"}\n' % msg).encode()
+    await _send(send, status, body, [("Content-Type", "application/json"), ("Retry-After", str(retry_after))])
+
+
+class ReadAPI:
+    """ASGI app: READ_ROUTES on the asyncio engine, every other request to ``wsgi_app``."""
+
+    def __init__(self, wsgi_app, routes=READ_ROUTES):
+        self.flask_app = wsgi_app
+        self.wsgi = _WsgiBridge(wsgi_app)
+        self.routes = [(re.compile(p + r"/?\Z"), h, t) for p, h, t in routes]
+        url = async_database_url(wsgi_app)
+        self.engine = create_async_engine(url, **engine_options(wsgi_app.config, url, asyncio=True))
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.urls = wsgi_app.url_map.bind("localhost")
+        # in-process backends are plain dict operations; anything else (redis)
+        # is network I/O and goes to a thread
+        self._inline_cache = isinstance(cache.backend, (LRUBackend, NullBackend))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] == "http" and scope["method"] == "GET":
+            for pattern, handler, tags in self.routes:
+                match = pattern.match(scope["path"])
+                if match:
+                    # the same per-process cap as the Flask app (ratelimit.ConcurrencyGate), held while serving
+                    gate = self.flask_app.extensions.get("concurrency_gate")
+                    if gate is not None and not gate.acquire():
+                        ratelimit.SHED.inc()
+                        return await _refuse(send, 503, "server busy, retry shortly", 1)
+                    try:
+                        retry_after = await self._admit(scope)
+                        if retry_after is not None:
+                            return await _refuse(send, 429, "rate limit exceeded", retry_after)
+                        kwargs = {k: int(v) for k, v in match.groupdict().items()}
+                        return await self._serve(scope, send, handler, tags, kwargs)
+                    finally:
+                        if gate is not None:
+                            gate.release()
+        await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _admit(self, scope):
+        """The read budget of ratelimit.py for native routes: Retry-After seconds, or None to serve."""
+        limiter = self.flask_app.extensions.get("rate_limiter")
+        if limiter is None:
+            return None
+        headers = _headers(scope)
+        remote = ratelimit.client_address(scope["client"][0] if scope.get("client") else "unknown",
+                                          headers.get("x-forwarded-for"),
+                                          self.flask_app.config["RATE_LIMIT_TRUSTED_PROXIES"])
+        who = f"ip:{remote}"
+        auth = headers.get("authorization", "")
+        if auth.startswith("Bearer "):
+            try:
+                with self.flask_app.app_context():
+                    identity = decode_token(auth[7:])["sub"]
+                who = f"user:{identity['id'] if isinstance(identity, dict) else identity}"
+            except Exception:
+                pass  # an invalid token reads as anonymous
+        if isinstance(limiter.backend, ratelimit.MemoryBackend):
+            return limiter.check("read", who)
+        return await asyncio.to_thread(limiter.check, "read", who)
+
+    async def _cache_call(self, fn, *args):
+        if self._inline_cache:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def _serve(self, scope, send, handler, tags, kwargs):
+        headers = _headers(scope)
+        query = scope["query_string"].decode("latin-1")
+        args = MultiDict(parse_qsl(query, keep_blank_values=True))
+        # same key as Flask's request.full_path, so both servers share entries
+        full_path = scope["path"] + "?" + query
+
+        with self.flask_app.app_context():  # config, JSON provider, schemas
+            # no request context here; dbpool.apply_statement_timeout reads it from g
+            g.statement_timeout_ms = statement_timeout(self.flask_app.config, self._endpoint(scope["path"]))
+            key = entry = None
+            if tags is not None:
+                key, entry, _ = await self._cache_call(cache.lookup, full_path, tags(**kwargs))
+            if entry is not None:
+                return await self._send_entry(send, headers, entry, "HIT")
+
+            async with self.sessions() as session:
+                reply = await handler(session, args, **kwargs)
+                if reply.status != 200:
+                    body = self._json(reply.data)
+                    return await _send(send, reply.status, body.encode(), [("Content-Type", "application/json")])
+                if reply.etag and _fresh(headers, reply.etag, reply.last_modified):
+                    return await _send(send, 304, headers=self._validators(reply))
+                data = reply.data() if callable(reply.data) else reply.data
+
+            body = self._json(data)
+            validators = dict(self._validators(reply))
+            validators.setdefault("ETag", quote_etag(hashlib.sha1(body.encode()).hexdigest()))
+            entry = {"body": body, "mimetype": "application/json", "headers": validators}
+            if key is not None:
+                await self._cache_call(cache.store, key, body, "application/json", validators,
+                                       self.flask_app.config["CACHE_TTL"])
+            return await self._send_entry(send, headers, entry, "MISS" if key is not None else None)
+
+    def _endpoint(self, path):
+        """The Flask endpoint serving ``path``, for its DB_STATEMENT_TIMEOUT_OVERRIDES entry."""
+        try:
+            return self.urls.match(path, "GET")[0]
+        except HTTPException:
+            return None
+
+    def _json(self, data):
+        # byte-identical to jsonify(), so ETags hashed from bodies agree across servers
+        return self.flask_app.json.response(data).get_data(as_text=True)
+
+    @staticmethod
+    def _validators(reply):
+        out = []
+        if reply.etag:
+            out += [("ETag", quote_etag(reply.etag)), ("Cache-Control", "no-cache")]
+        if reply.last_modified:
+            out.append(("Last-Modified", http_date(reply.last_modified)))
+        return out
+
+    @staticmethod
+    async def _send_entry(send, headers, entry, cache_status):
+        response_headers = list(entry["headers"].items())
+        if cache_status:
+            response_headers.append(("X-Cache", cache_status))
+        etag = entry["headers"].get("ETag")
+        last_modified = parse_date(entry["headers"].get("Last-Modified"))
+        if etag and _fresh(headers, unquote_etag(etag)[0], last_modified):
+            return await _send(send, 304, headers=response_headers)
+        return await _send(send, 200, entry["body"].encode(),
+                           [("Content-Type", entry["mimetype"])] + response_headers)
+
+
+app = ReadAPI(flask_app)
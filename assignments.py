@@ -0,0 +1,181 @@
+# assignments.py
+# Cast and crew assignment by set difference.
+#
+# A change names an episode and either the full cast / crew it should end
+# up with ("actor_ids", "crew_ids") or what to add and remove ("actors":
+# {"add": [...], "remove": [...]}, likewise "crew"). The current links of
+# every episode in the batch are read with one query per table, and only
+# the rows that differ are inserted or deleted (executemany), so saving an
+# unchanged cast writes nothing. Everything is validated before the first
+# write and runs on the caller's transaction; the caller commits.
+#
+# These are Core writes, so the derived data is kept up to date here:
+# actor_costar through costars.apply() and season/show actor counts through
+# stats.cast_changed(). Callers invalidate the response cache for the
+# returned seasons/shows after committing.
+from sqlalchemy import bindparam, select
+from extensions import db
+from models import Episode, Season, Actor, Crew, EpisodeCrew, episode_actors
+from queries import hidden_shows
+import costars
+import stats
+
+LINKS = {
+    # name: (table, person column, person model, full-set key)
+    "actors": (episode_actors, "actor_id", Actor, "actor_ids"),
+    "crew": (EpisodeCrew.__table__, "crew_id", Crew, "crew_ids"),
+}
+CHUNK = 500
+
+
+class AssignmentError(ValueError):
+    """Raised before any write; ``errors`` maps change index -> message."""
+
+    def __init__(self, errors):
+        super().__init__("invalid assignment")
+        self.errors = errors
+
+
+def _ids(value):
+    if not isinstance(value, (list, tuple, set)) or not all(isinstance(v, int) and not isinstance(v, bool)
+                                                            for v in value):
+        raise ValueError("must be a list of integer ids")
+    return set(value)
+
+
+def _parse(change):
+    """(episode_id, {link name: (full set or None, add, remove)}) for one change; raises ValueError."""
+    if not isinstance(change, dict):
+        raise ValueError("each change must be an object")
+    episode_id = change.get("episode_id")
+    if not isinstance(episode_id, int) or isinstance(episode_id, bool):
+        raise ValueError("episode_id (an integer) is required")
+    links = {}
+    for name, (_, _, _, full_key) in LINKS.items():
+        if full_key in change and name in change:
+            raise ValueError(f"give either {full_key} or {name}, not both")
+        try:
+            if full_key in change:
+                links[name] = (_ids(change[full_key]), set(), set())
+            elif name in change:
+                diff = change[name]
+                if not isinstance(diff, dict) or set(diff) - {"add", "remove"}:
+                    raise ValueError('must be {"add": [...], "remove": [...]}')
+                add, remove = _ids(diff.get("add", [])), _ids(diff.get("remove", []))
+                if add & remove:
+                    raise ValueError(f"ids both added and removed: {sorted(add & remove)}")
+                links[name] = (None, add, remove)
+        except ValueError as e:
+            raise ValueError(f"{full_key if full_key in change else name}: {e}") from None
+    if not links:
+        raise ValueError("nothing to assign: give actor_ids/actors and/or crew_ids/crew")
+    return episode_id, links
+
+
+def _named(link):
+    full, add, remove = link
+    return (full or set()) | add | remove
+
+
+def _chunks(values):
+    values = sorted(values)
+    for i in range(0, len(values), CHUNK):
+        yield values[i:i + CHUNK]
+
+
+def _existing(conn, column, ids):
+    found = set()
+    for chunk in _chunks(ids):
+        found.update(conn.execute(select(column).where(column.in_(chunk))).scalars())
+    return found
+
+
+def _current(conn, table, person_col, episode_ids):
+    links = {eid: set() for eid in episode_ids}
+    for chunk in _chunks(episode_ids):
+        for eid, pid in conn.execute(select(table.c.episode_id, table.c[person_col])
+                                     .where(table.c.episode_id.in_(chunk))):
+            links[eid].add(pid)
+    return links
+
+
+def apply(changes, conn=None):
+    """Apply a batch of assignment changes; returns (per-change results, {season_id: show_id} touched).
+
+    Raises AssignmentError (nothing written) if a change is malformed or names
+    an unknown episode, actor or crew member.
+    """
+    conn = conn if conn is not None else db.session.connection()
+    if not isinstance(changes, list) or not changes:
+        raise AssignmentError({"changes": "a non-empty list of changes is required"})
+    errors, parsed, seen = {}, [], set()
+    for i, change in enumerate(changes):
+        try:
+            episode_id, links = _parse(change)
+        except ValueError as e:
+            errors[i] = str(e)
+            continue
+        if episode_id in seen:
+            errors[i] = f"episode {episode_id} is listed more than once"
+            continue
+        seen.add(episode_id)
+        parsed.append((i, episode_id, links))
+
+    seasons = {}  # episode_id -> (season_id, show_id)
+    for chunk in _chunks(seen):
+        seasons.update((eid, (sid, show_id)) for eid, sid, show_id in conn.execute(
+            select(Episode.id, Episode.season_id, Season.tvshow_id)
+            .join(Season, Season.id == Episode.season_id)
+            .where(Episode.id.in_(chunk), Season.tvshow_id.not_in(hidden_shows()))))
+    known = {}
+    for name, (_, _, model, _) in LINKS.items():
+        named = set().union(*(_named(links[name]) for _, _, links in parsed if name in links))
+        known[name] = _existing(conn, model.id, named)
+    for i, episode_id, links in parsed:
+        if episode_id not in seasons:
+            errors[i] = f"episode {episode_id} does not exist"
+            continue
+        for name, link in links.items():
+            missing = _named(link) - known[name]
+            if missing:
+                errors[i] = f"unknown {LINKS[name][2].__tablename__} ids: {sorted(missing)}"
+                break
+    if errors:
+        raise AssignmentError(errors)
+
+    results, touched = [], {}
+    cast_before = None
+    for name, (table, person_col, _, _) in LINKS.items():
+        episode_ids = [eid for _, eid, links in parsed if name in links]
+        if not episode_ids:
+            continue
+        current = _current(conn, table, person_col, episode_ids)
+        if name == "actors":
+            cast_before = current
+        inserts, deletes = [], []
+        for _, eid, links in parsed:
+            if name not in links:
+                continue
+            full, add, remove = links[name]
+            have = current[eid]
+            added = (full - have) if full is not None else (add - have)
+            removed = (have - full) if full is not None else (remove & have)
+            inserts += [{"episode_id": eid, person_col: pid} for pid in sorted(added)]
+            deletes += [{"e": eid, "p": pid} for pid in sorted(removed)]
+            links[name] = {"added": sorted(added), "removed": sorted(removed)}
+            if added or removed:
+                touched[seasons[eid][0]] = seasons[eid][1]
+        if inserts:
+            conn.execute(table.insert(), inserts)
+        if deletes:
+            conn.execute(table.delete().where(table.c.episode_id == bindparam("e"),
+                                              table.c[person_col] == bindparam("p")), deletes)
+
+    for _, eid, links in parsed:
+        results.append({"episode_id": eid, **links})
+    if cast_before is not None:
+        costars.apply(cast_before, conn)
+        stats.cast_changed(((seasons[r["episode_id"]][0], actor_id, sign) for r in results if "actors" in r
+                            for key, sign in (("added", 1), ("removed", -1)) for actor_id in r["actors"][key]),
+                           conn)
+    return results, touched
@@ -0,0 +1,2 @@
+# bench: catalog generator, in-process benchmarks and an HTTP load generator.
+# Run from the repository root, e.g. ``python -m bench.run``.
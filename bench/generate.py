@@ -0,0 +1,153 @@
+# bench/generate.py
+# Reproducible synthetic catalog: shows -> seasons -> episodes, actors, crew,
+# cast links (episode_actors / episode_crew) and screentimes, written through
+# the models.py tables with batched Core inserts (executemany). The same
+# seed and sizes always produce the same rows, appended after any rows that
+# already exist.
+#
+#   python -m bench.generate --preset large        # 10k shows, 500k episodes, 2M cast links
+#   python -m bench.generate --shows 500 --episodes 12 --cast 6
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert, select
+
+PRESETS = {
+    # shows, seasons/show, episodes/season, actors, crew, cast/episode, crew/episode, screentimes/episode
+    "small": dict(shows=200, seasons=3, episodes=10, actors=2000, crew=300, cast=4, crew_links=2, screentimes=4),
+    "medium": dict(shows=2000, seasons=4, episodes=10, actors=20000, crew=2000, cast=4, crew_links=2, screentimes=4),
+    "large": dict(shows=10000, seasons=5, episodes=10, actors=100000, crew=10000, cast=4, crew_links=2,
+                  screentimes=4),
+}
+
+FIRST = ["Ada", "Ben", "Cleo", "Dev", "Eva", "Finn", "Gia", "Hugo", "Iris", "Jon", "Kai", "Lena", "Milo",
+         "Nora", "Omar", "Pia", "Quin", "Rosa", "Sam", "Tess", "Umar", "Vera", "Wes", "Xena", "Yuri", "Zoe"]
+LAST = ["Abbott", "Baker", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Hughes", "Ito", "Jensen", "Khan",
+        "Lopez", "Morgan", "Novak", "Okafor", "Patel", "Quinn", "Rossi", "Silva", "Tanaka", "Usman", "Varga"]
+WORDS = ["night", "river", "empire", "signal", "harbor", "glass", "winter", "echo", "crown", "frontier",
+         "shadow", "garden", "station", "orbit", "legacy", "storm", "circuit", "atlas", "ember", "valley"]
+ROLES = ["Director", "Writer", "Producer", "Editor", "Composer", "Cinematographer"]
+ROLE_TYPES = ["lead", "supporting", "guest", "cameo"]
+
+
+def _next_id(session, model):
+    return (session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _phrase(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def generate(shows=200, seasons=3, episodes=10, actors=2000, crew=300, cast=4, crew_links=2,
+             screentimes=4, seed=42, chunk=200, echo=print):
+    """Append a synthetic catalog to the app's database; returns row counts written.
+
+    Must run inside an app context. Commits every ``chunk`` shows.
+    """
+    from extensions import db
+    from models import TVShow, Season, Episode, Actor, Crew, EpisodeCrew, ScreenTime, episode_actors
+    from bulk import sync_id_sequence
+    import stats
+    import costars
+
+    rng = random.Random(seed)
+    session = db.session
+    counts = dict.fromkeys(["show", "season", "episode", "actor", "crew", "episode_actor",
+                            "episode_crew", "screentime"], 0)
+    started = time.perf_counter()
+
+    actor_base = _next_id(session, Actor)
+    rows = [{"id": actor_base + i, "first_name": rng.choice(FIRST), "last_name": rng.choice(LAST)}
+            for i in range(actors)]
+    for i in range(0, len(rows), 10000):
+        session.execute(insert(Actor.__table__), rows[i:i + 10000])
+    crew_base = _next_id(session, Crew)
+    session.execute(insert(Crew.__table__), [
+        {"id": crew_base + i, "first_name": rng.choice(FIRST), "last_name": rng.choice(LAST),
+         "person_definition": rng.choice(ROLES)} for i in range(crew)])
+    session.commit()
+    counts["actor"], counts["crew"] = actors, crew
+    actor_ids = range(actor_base, actor_base + actors)
+    crew_ids = range(crew_base, crew_base + crew)
+
+    show_id, season_id, episode_id = _next_id(session, TVShow), _next_id(session, Season), _next_id(session, Episode)
+    epoch = date(1990, 1, 1)
+    for first in range(0, shows, chunk):
+        show_rows, season_rows, episode_rows = [], [], []
+        cast_rows, crew_rows, screen_rows = [], [], []
+        for _ in range(min(chunk, shows - first)):
+            show_rows.append({"id": show_id, "title": f"{_phrase(rng, 2)} {show_id}",
+                              "description": _phrase(rng, 8)})
+            aired = epoch + timedelta(days=rng.randrange(12000))
+            for season_number in range(1, seasons + 1):
+                season_rows.append({"id": season_id, "tvshow_id": show_id, "season_number": season_number,
+                                    "title": f"Season {season_number}", "season_description": _phrase(rng, 6),
+                                    "date_started": aired})
+                for episode_number in range(1, episodes + 1):
+                    episode_rows.append({
+                        "id": episode_id, "season_id": season_id, "episode_number": episode_number,
+                        "title": _phrase(rng, 3), "description": _phrase(rng, 12),
+                        "rating": rng.randint(1, 10) if rng.random() > 0.1 else None,
+                        "date_published": aired,
+                    })
+                    performers = rng.sample(actor_ids, min(cast, actors))
+                    cast_rows += [{"episode_id": episode_id, "actor_id": a} for a in performers]
+                    crew_rows += [{"episode_id": episode_id, "crew_id": c}
+                                  for c in rng.sample(crew_ids, min(crew_links, crew))]
+                    start = datetime.combine(aired, datetime.min.time()) + timedelta(hours=20)
+                    for n in range(screentimes if performers else 0):
+                        begin = start + timedelta(seconds=rng.randrange(2400))
+                        screen_rows.append({
+                            "actor_id": performers[n % len(performers)], "episode_id": episode_id,
+                            "start_time": begin, "end_time": begin + timedelta(seconds=rng.randint(30, 600)),
+                            "role_name": rng.choice(FIRST), "role_type": rng.choice(ROLE_TYPES),
+                        })
+                    episode_id += 1
+                    aired += timedelta(days=7)
+                season_id += 1
+            show_id += 1
+
+        for table, batch in ((TVShow.__table__, show_rows), (Season.__table__, season_rows),
+                             (Episode.__table__, episode_rows), (episode_actors, cast_rows),
+                             (EpisodeCrew.__table__, crew_rows), (ScreenTime.__table__, screen_rows)):
+            for i in range(0, len(batch), 10000):
+                session.execute(insert(table), batch[i:i + 10000])
+        stats.refresh_shows([r["id"] for r in show_rows])
+        costars.apply({r["id"]: set() for r in episode_rows})
+        session.commit()
+        for key, batch in (("show", show_rows), ("season", season_rows), ("episode", episode_rows),
+                           ("episode_actor", cast_rows), ("episode_crew", crew_rows),
+                           ("screentime", screen_rows)):
+            counts[key] += len(batch)
+        echo(f"  {counts['show']}/{shows} shows, {counts['episode']} episodes "
+             f"({time.perf_counter() - started:.0f}s)")
+
+    for model in (TVShow, Season, Episode, Actor, Crew):
+        sync_id_sequence(model.__table__)
+    session.commit()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append a synthetic catalog to DATABASE_URL.")
+    parser.add_argument("--preset", choices=PRESETS, default="small")
+    for name in PRESETS["small"]:
+        parser.add_argument("--" + name.replace("_", "-"), dest=name, type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--upgrade", action="store_true", help="apply the migrations first")
+    args = parser.parse_args(argv)
+    sizes = {k: getattr(args, k) if getattr(args, k) is not None else v for k, v in PRESETS[args.preset].items()}
+
+    from flask_migrate import upgrade
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        if args.upgrade:
+            upgrade()
+        counts = generate(seed=args.seed, **sizes)
+    print(counts)
+
+
+if __name__ == "__main__":
+    main()
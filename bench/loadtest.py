@@ -0,0 +1,147 @@
+# bench/loadtest.py
+# Closed-loop HTTP load generator: N concurrent keep-alive clients hammer a
+# set of paths for a fixed time and report requests/sec and latency
+# percentiles. Uses only the standard library (a minimal HTTP/1.1 client on
+# asyncio streams) so the client itself doesn't need a thread per connection.
+#
+# Compare the WSGI and ASGI deployments against the same database (start
+# them with RATE_LIMIT_ENABLED=0, or every client shares one IP's budget):
+#   gunicorn -w 4 --threads 8 -b :8000 app:app
+#   uvicorn asgi:app --workers 4 --port 8001
+#   python bench/loadtest.py http://127.0.0.1:8000 http://127.0.0.1:8001 -c 500 -d 30
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = [
+    "/api/tv/shows?limit=20",
+    "/api/tv/shows/1",
+    "/api/tv/shows/1/seasons",
+    "/api/tv/seasons/1/episodes",
+    "/api/tv/shows/1/tree?fields=title,episode_number",
+    "/api/search?q=the",
+]
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif status not in (204, 304):
+        await reader.read()  # body ends at connection close
+        headers["connection"] = "close"
+    return status, headers.get("connection", "").lower() != "close"
+
+
+async def _client(host, port, paths, offset, deadline, stats):
+    reader = writer = None
+    i = offset
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode()
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            stats["errors"] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        stats["latencies"].append(time.perf_counter() - start)
+        stats["status"][status] = stats["status"].get(status, 0) + 1
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+async def run(base_url, paths, concurrency, duration, warmup=2.0):
+    """Load ``base_url`` and return a summary dict (latencies in milliseconds)."""
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    prefix = url.path.rstrip("/")
+    paths = [prefix + p for p in paths]
+
+    if warmup:
+        scratch = {"latencies": [], "status": {}, "errors": 0}
+        deadline = time.monotonic() + warmup
+        await asyncio.gather(*(_client(host, port, paths, n, deadline, scratch)
+                               for n in range(min(concurrency, 50))))
+
+    stats = {"latencies": [], "status": {}, "errors": 0}
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(_client(host, port, paths, n, deadline, stats) for n in range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    lat = sorted(stats["latencies"])
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "url": base_url,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(lat),
+        "errors": stats["errors"],
+        "status": {str(k): v for k, v in sorted(stats["status"].items())},
+        "rps": round(len(lat) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": ms(_percentile(lat, 50)),
+        "p95_ms": ms(_percentile(lat, 95)),
+        "p99_ms": ms(_percentile(lat, 99)),
+        "max_ms": ms(lat[-1] if lat else None),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare req/s and latency of API deployments.")
+    parser.add_argument("urls", nargs="+", help="base URL of each deployment to compare")
+    parser.add_argument("-c", "--concurrency", type=int, default=500)
+    parser.add_argument("-d", "--duration", type=float, default=30.0, help="seconds per target")
+    parser.add_argument("-p", "--path", action="append", dest="paths", help="path to request (repeatable)")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for base_url in args.urls:
+        result = asyncio.run(run(base_url, args.paths or DEFAULT_PATHS, args.concurrency,
+                                 args.duration, args.warmup))
+        results.append(result)
+        print(f"{base_url:32} {result['rps']:>9.1f} req/s  p50 {result['p50_ms']} ms  "
+              f"p99 {result['p99_ms']} ms  errors {result['errors']}  status {result['status']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# bench/logins.py
+# Login throughput: password verifications per second, and per core, through
+# the passwords.py hashing pool at increasing worker counts, next to the
+# inline (request thread) baseline. Also reports how many logins the pool
+# refused with 429 when more clients than PASSWORD_POOL_QUEUE pile on.
+#
+#   python -m bench.logins                          # thread pool, 1..cores workers
+#   python -m bench.logins --pool process --method pbkdf2:sha256:600000
+#   python -m bench.logins --clients 64 --queue 8   # watch backpressure kick in
+import argparse
+import os
+import sys
+import threading
+import time
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+def _run_clients(clients, per_client, login):
+    """(seconds, ok, refused) for ``clients`` threads each calling ``login()`` ``per_client`` times."""
+    counts = {"ok": 0, "refused": 0}
+    lock = threading.Lock()
+    start_line = threading.Barrier(clients + 1)
+
+    def client():
+        start_line.wait()
+        for _ in range(per_client):
+            outcome = login()
+            with lock:
+                counts[outcome] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    start_line.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, counts["ok"], counts["refused"]
+
+
+def main(argv=None):
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Measure password verifications per second per core.")
+    parser.add_argument("--method", default="scrypt", help="werkzeug hash method")
+    parser.add_argument("--pool", default="thread", choices=["thread", "process"])
+    parser.add_argument("--workers", type=int, action="append",
+                        help="pool size to measure (repeatable; default 1, 2, 4, ... up to the core count)")
+    parser.add_argument("--clients", type=int, default=2 * cores, help="concurrent login threads")
+    parser.add_argument("-n", "--logins", type=int, default=20, help="logins per client")
+    parser.add_argument("--queue", type=int, default=0, help="PASSWORD_POOL_QUEUE (0 = clients, so nothing is refused)")
+    args = parser.parse_args(argv)
+
+    from passwords import HashPool, PoolSaturated
+
+    pwhash = generate_password_hash("bench-password", method=args.method)
+    workers = args.workers or sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    print(f"{args.method}, {cores} cores, {args.clients} clients x {args.logins} logins")
+
+    def inline():
+        check_password_hash(pwhash, "bench-password")
+        return "ok"
+
+    seconds, ok, _ = _run_clients(args.clients, args.logins, inline)
+    print(f"{'inline':>12}  {ok / seconds:8.1f} logins/s")
+
+    for n in workers:
+        pool = HashPool(args.pool, n, args.queue or args.clients, timeout=60)
+
+        def pooled():
+            try:
+                pool.run("verify", check_password_hash, pwhash, "bench-password")
+                return "ok"
+            except PoolSaturated:
+                return "refused"
+
+        pooled()  # start the workers outside the timing
+        seconds, ok, refused = _run_clients(args.clients, args.logins, pooled)
+        pool.shutdown()
+        used = min(n, cores)
+        print(f"{args.pool + ' x' + str(n):>12}  {ok / seconds:8.1f} logins/s  "
+              f"{ok / seconds / used:8.1f} per core  refused {refused}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+# bench/run.py
+# In-process endpoint benchmarks. Drives the read endpoints (list_shows,
+# show_detail, tree), the UI season/episode pages, login and the write
+# endpoints through the Flask test client against a generated catalog, and
+# writes one JSON file per run so results can be diffed between commits.
+#
+#   python -m bench.run                                   # SQLite file, "small" catalog
+#   python -m bench.run --database-url postgresql+psycopg://tv:tv@localhost/tvbench --preset medium
+#   python -m bench.run --compare bench/results/<older>.json   # exit 1 on regressions
+#
+# The response cache is off by default (--cache lru to measure hits instead),
+# so repeated GETs measure the query + serialization path. Timings are the
+# whole WSGI round trip minus the network; bench/loadtest.py covers HTTP load.
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+CASES = {}
+
+
+def case(name, iterations=None):
+    """Register ``fn(ctx, rng) -> (method, path, kwargs[, expected status])`` as a benchmark."""
+    def register(fn):
+        CASES[name] = (fn, iterations)
+        return fn
+    return register
+
+
+@case("list_shows")
+def _list_shows(ctx, rng):
+    return "GET", "/api/tv/shows?limit=50", {}
+
+
+@case("list_shows_by_title")
+def _list_shows_by_title(ctx, rng):
+    return "GET", "/api/tv/shows?limit=50&sort=title", {}
+
+
+@case("show_detail")
+def _show_detail(ctx, rng):
+    return "GET", f"/api/tv/shows/{rng.choice(ctx['show_ids'])}", {}
+
+
+@case("show_seasons")
+def _show_seasons(ctx, rng):
+    return "GET", f"/api/tv/shows/{rng.choice(ctx['show_ids'])}/seasons", {}
+
+
+@case("season_episodes")
+def _season_episodes(ctx, rng):
+    return "GET", f"/api/tv/seasons/{rng.choice(ctx['season_ids'])}/episodes", {}
+
+
+@case("show_tree")
+def _show_tree(ctx, rng):
+    return "GET", f"/api/tv/shows/{rng.choice(ctx['show_ids'])}/tree?include=actors", {}
+
+
+@case("ui_seasons")
+def _ui_seasons(ctx, rng):
+    return "GET", f"/shows/{rng.choice(ctx['show_ids'])}/seasons", {}
+
+
+@case("ui_episodes")
+def _ui_episodes(ctx, rng):
+    return "GET", f"/seasons/{rng.choice(ctx['season_ids'])}/episodes", {}
+
+
+@case("login", iterations=20)  # dominated by password hashing
+def _login(ctx, rng):
+    return "POST", "/api/auth/login", {"json": {"username": ctx["username"], "password": ctx["password"]}}
+
+
+@case("create_show")
+def _create_show(ctx, rng):
+    return "POST", "/api/tv/shows", {"json": {"title": f"Bench show {rng.random():.8f}"},
+                                     "headers": ctx["auth"]}, 201
+
+
+@case("update_show")
+def _update_show(ctx, rng):
+    return "PATCH", f"/api/tv/shows/{rng.choice(ctx['show_ids'])}", {
+        "json": {"description": f"updated {rng.random():.8f}"}, "headers": ctx["auth"]}
+
+
+@case("update_season")
+def _update_season(ctx, rng):
+    return "PATCH", f"/api/tv/seasons/{rng.choice(ctx['season_ids'])}", {
+        "json": {"title": f"Season {rng.random():.6f}"}, "headers": ctx["auth"]}
+
+
+@case("delete_show")
+def _delete_show(ctx, rng):
+    # removes the shows create_show added, so the catalog stays the same size across runs
+    return "DELETE", f"/api/tv/shows/{ctx['created'].pop()}", {"headers": ctx["auth"]}
+
+
+def _percentile(sorted_values, pct):
+    k = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def _statements(response):
+    # instrumentation.py reports 'db;dur=..., sql;desc="N statements"'
+    timing = response.headers.get("Server-Timing", "")
+    try:
+        return int(timing.split('desc="', 1)[1].split(" ", 1)[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def measure(client, ctx, name, iterations, warmup, seed):
+    fn, fixed = CASES[name]
+    iterations = min(iterations, fixed or iterations)
+    if name == "delete_show":
+        iterations = min(iterations, len(ctx["created"]))
+    rng = random.Random(seed)
+    timings, statements = [], []
+    for i in range(warmup + iterations):
+        if name == "delete_show" and not ctx["created"]:
+            break
+        method, path, kwargs, *expected = fn(ctx, rng)
+        start = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        elapsed = time.perf_counter() - start
+        if response.status_code != (expected[0] if expected else 200):
+            raise RuntimeError(f"{name}: {method} {path} -> {response.status_code} {response.get_data(as_text=True)[:200]}")
+        if name == "create_show":
+            ctx["created"].append(response.get_json()["id"])
+        if i >= warmup:
+            timings.append(elapsed)
+            statements.append(_statements(response))
+    if not timings:
+        return None
+    timings.sort()
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "iterations": len(timings),
+        "min_ms": ms(timings[0]),
+        "median_ms": ms(statistics.median(timings)),
+        "mean_ms": ms(statistics.fmean(timings)),
+        "p95_ms": ms(_percentile(timings, 95)),
+        "max_ms": ms(timings[-1]),
+        "ops_per_s": round(len(timings) / sum(timings), 1),
+        "sql_statements": max((s for s in statements if s is not None), default=None),
+    }
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _prepare(preset, seed):
+    from flask_migrate import upgrade
+    from sqlalchemy import func, select
+    from extensions import db
+    from models import TVShow, Season, Episode, Actor, ScreenTime, User, episode_actors
+    from bench.generate import PRESETS, generate
+
+    upgrade()
+    if not db.session.execute(select(func.count(TVShow.id))).scalar():
+        print(f"generating the {preset!r} catalog ...")
+        generate(seed=seed, **PRESETS[preset])
+
+    username, password = "bench-admin", "bench-password"
+    if not User.query.filter_by(username=username).first():
+        user = User(username=username, role="admin")
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+
+    count = lambda col: db.session.execute(select(func.count()).select_from(col)).scalar()
+    catalog = {"shows": count(TVShow), "seasons": count(Season), "episodes": count(Episode),
+               "actors": count(Actor), "cast_links": count(episode_actors), "screentimes": count(ScreenTime)}
+    # sample ids to spread reads and writes over the catalog
+    show_ids = db.session.execute(select(TVShow.id).order_by(TVShow.id).limit(1000)).scalars().all()
+    season_ids = db.session.execute(
+        select(Season.id).where(Season.tvshow_id.in_(show_ids[:200]))).scalars().all()
+    db.session.remove()
+    return catalog, {"show_ids": show_ids, "season_ids": season_ids, "username": username,
+                     "password": password, "created": []}
+
+
+def compare(old, new, threshold):
+    """Cases whose median got more than ``threshold`` (fraction) slower; returns report lines."""
+    lines = []
+    for name, result in new["results"].items():
+        before = old.get("results", {}).get(name)
+        if not before or not result:
+            continue
+        change = result["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+        flag = "REGRESSION" if change > threshold else ""
+        lines.append((flag, f"{name:22} {before['median_ms']:>9.3f} -> {result['median_ms']:>9.3f} ms "
+                            f"({change:+.1%}) {flag}"))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark API/UI endpoints in-process and write JSON results.")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", "sqlite:///bench.db"),
+                        help="database to benchmark (relative SQLite paths live in instance/)")
+    parser.add_argument("--preset", default="small", help="catalog size generated into an empty database")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-n", "--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("-k", "--case", action="append", dest="cases", choices=CASES,
+                        help="only run this case (repeatable)")
+    parser.add_argument("--cache", default="null", choices=["null", "lru", "redis"], help="response cache backend")
+    parser.add_argument("--output", default="bench/results", help="directory for the JSON result file")
+    parser.add_argument("--compare", metavar="JSON", help="earlier result file; exit 1 if a median regressed")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold (fraction)")
+    args = parser.parse_args(argv)
+
+    # config.py reads the environment at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["CACHE_BACKEND"] = args.cache
+    os.environ.setdefault("INSTRUMENT_SLOW_REQUEST_MS", "0")
+    os.environ.setdefault("INSTRUMENT_N_PLUS_ONE", "0")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")  # one client looping would hit its own budget
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    from extensions import db
+    from models import User
+
+    app = create_app()
+    with app.app_context():
+        catalog, ctx = _prepare(args.preset, args.seed)
+        admin = User.query.filter_by(username=ctx["username"]).one()
+        admin_id, admin_role = admin.id, admin.role
+        ctx["auth"] = {"Authorization": "Bearer " + create_access_token(
+            identity={"id": admin_id, "role": admin_role})}
+        dialect = db.engine.dialect.name
+        db.session.remove()
+    print(f"{dialect}: {catalog}")
+
+    client = app.test_client()
+    with client.session_transaction() as ui_session:  # UI pages read the login from the session
+        ui_session["user_id"], ui_session["role"] = admin_id, admin_role
+
+    results = {}
+    for name in args.cases or CASES:
+        results[name] = result = measure(client, ctx, name, args.iterations, args.warmup, args.seed)
+        if result:
+            print(f"{name:22} median {result['median_ms']:>9.3f} ms  p95 {result['p95_ms']:>9.3f} ms  "
+                  f"{result['ops_per_s']:>8.1f} ops/s  sql {result['sql_statements']}")
+
+    commit = _git("rev-parse", "HEAD")
+    run = {
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "dialect": dialect,
+        "cache": args.cache,
+        "catalog": catalog,
+        "iterations": args.iterations,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{time.strftime('%Y%m%d-%H%M%S')}-{(commit or 'nogit')[:10]}-{dialect}.json")
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            lines = compare(json.load(f), run, args.threshold)
+        for _, line in lines:
+            print(line)
+        if any(flag for flag, _ in lines):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# bulk.py
+# Dialect-aware multi-row INSERT ... ON CONFLICT helpers (PostgreSQL / SQLite).
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+
+_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def dialect_insert(table, conn=None):
+    """An ``insert(table)`` that supports ``on_conflict_do_*`` for the session's (or ``conn``'s) database."""
+    dialect = (conn or db.session.get_bind()).dialect.name
+    try:
+        return _INSERTS[dialect](table)
+    except KeyError:
+        raise RuntimeError(f"bulk upserts are not supported on {dialect}")
+
+
+def upsert(table, rows, conflict_cols, update_cols=None, conn=None):
+    """Insert ``rows`` (list of dicts), updating ``update_cols`` on a ``conflict_cols`` clash.
+
+    With no ``update_cols`` conflicting rows are skipped (DO NOTHING). All rows
+    must share the same keys; they are sent as one executemany, which
+    SQLAlchemy batches into multi-row VALUES statements. Versioned tables
+    get their version/updated_at bumped on update like an ORM write would.
+    Runs on the session unless a Connection is passed (e.g. from a flush hook).
+    """
+    if not rows:
+        return
+    stmt = dialect_insert(table, conn)
+    if update_cols:
+        set_ = {c: stmt.excluded[c] for c in update_cols}
+        if "version" in table.c:
+            set_["version"] = table.c.version + 1
+            set_["updated_at"] = datetime.utcnow()
+        stmt = stmt.on_conflict_do_update(index_elements=conflict_cols, set_=set_)
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=conflict_cols)
+    (conn or db.session).execute(stmt, rows)
+
+
+def sync_id_sequence(table):
+    """Move a PostgreSQL serial past rows that were inserted with explicit ids."""
+    if db.session.get_bind().dialect.name != "postgresql":
+        return
+    name = table.name
+    db.session.execute(db.text(
+        f"SELECT setval(pg_get_serial_sequence('\"{name}\"', 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM \"{name}\"), 0) + 1, false)"
+    ))
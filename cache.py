@@ -0,0 +1,273 @@
+# cache.py
+# Read-through response cache for public GET endpoints.
+#
+# Cached responses are keyed by URL plus the current "generation" of every
+# tag the endpoint depends on (e.g. "shows", "show:12"). Write handlers call
+# cache.invalidate(*tags), which swaps those generations for fresh tokens,
+# so every dependent entry is missed from then on and ages out via TTL/LRU.
+# Every entry also depends on the "catalog" tag, used for bulk changes.
+# Writes the handlers don't see (ORM flush hooks) queue their tags with
+# invalidate_on_commit() instead; they are invalidated once the session commits.
+# Cached season episode lists and show trees embed actor names, so actor
+# renames/deletes and cast changes made through the ORM queue their seasons
+# and shows here too (_queue_actor_tags).
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import request, current_app, make_response, g, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+CATALOG_TAG = "catalog"
+SHOWS_TAG = "shows"
+
+
+def show_tag(show_id):
+    return f"show:{show_id}"
+
+
+def season_tag(season_id):
+    return f"season:{season_id}"
+
+
+def invalidate_on_commit(session, *tags):
+    """Invalidate ``tags`` after ``session``'s transaction commits; forgotten if it rolls back."""
+    session.info.setdefault("cache_tags", set()).update(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    tags = session.info.pop("cache_tags", None)
+    if tags and has_app_context() and "response_cache" in current_app.extensions:
+        current_app.extensions["response_cache"].invalidate(*tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_tags(session):
+    session.info.pop("cache_tags", None)
+
+
+def _renamed(actor):
+    state = inspect(actor)
+    return any(state.attrs[name].history.has_changes() for name in ("first_name", "last_name"))
+
+
+@event.listens_for(Session, "before_flush")
+def _queue_actor_tags(session, flush_context, instances):
+    """Invalidate, on commit, the seasons and shows whose cached responses embed a changed actor or cast."""
+    from models import Actor, Episode, Season, episode_actors  # models imports extensions, which imports us
+
+    actors, episodes = set(), set()
+    for obj in session.dirty:
+        if isinstance(obj, Actor):
+            if _renamed(obj):
+                actors.add(obj.id)
+            history = inspect(obj).attrs.episodes.history
+            episodes.update(e.id for e in history.added + history.deleted if e.id is not None)
+        elif isinstance(obj, Episode) and inspect(obj).attrs.actors.history.has_changes():
+            episodes.add(obj.id)
+    actors.update(obj.id for obj in session.deleted if isinstance(obj, Actor))
+    if not (actors or episodes):
+        return
+    cast = select(episode_actors.c.episode_id).where(episode_actors.c.actor_id.in_(actors))
+    rows = session.connection().execute(
+        select(Season.id, Season.tvshow_id).join(Episode, Episode.season_id == Season.id)
+        .where(Episode.id.in_(episodes) | Episode.id.in_(cast)).distinct())
+    invalidate_on_commit(session, *(tag for season_id, show_id in rows
+                                    for tag in (season_tag(season_id), show_tag(show_id))))
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def get_many(self, keys):
+        return [None] * len(keys)
+
+    def set_if_missing(self, key, value):
+        return value
+
+    def put(self, key, value):
+        pass
+
+
+class LRUBackend:
+    """In-process LRU with per-entry TTL. Tag generations live outside the LRU
+    so they can never be evicted while entries still depend on them."""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_many(self, keys):
+        with self._lock:
+            return [self._tags.get(k) for k in keys]
+
+    def set_if_missing(self, key, value):
+        with self._lock:
+            return self._tags.setdefault(key, value)
+
+    def put(self, key, value):
+        with self._lock:
+            self._tags[key] = value
+
+
+class RedisBackend:
+    """Redis (or any client with the redis-py API, e.g. fakeredis) backend."""
+
+    def __init__(self, client, prefix="tvcache:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def get_many(self, keys):
+        return self.client.mget([self.prefix + k for k in keys]) if keys else []
+
+    def set_if_missing(self, key, value):
+        if self.client.set(self.prefix + key, value, nx=True):
+            return value
+        return self.client.get(self.prefix + key)
+
+    def put(self, key, value):
+        self.client.set(self.prefix + key, value)
+
+
+def _token(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _new_generation(invalidated=True):
+    # "<unix time>.<random>": the time says how recently the tag was invalidated
+    return "%d.%s" % (time.time() if invalidated else 0, uuid.uuid4().hex)
+
+
+def _generation_time(gen):
+    stamp, _, rest = gen.partition(".")
+    return int(stamp) if rest and stamp.isdigit() else 0
+
+
+class ResponseCache:
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CACHE_BACKEND", "lru")
+        app.config.setdefault("CACHE_TTL", 300)
+        app.config.setdefault("CACHE_MAX_ENTRIES", 2048)
+        app.config.setdefault("CACHE_REDIS_URL", None)
+        kind = app.config["CACHE_BACKEND"]
+        if kind == "lru":
+            self.backend = LRUBackend(app.config["CACHE_MAX_ENTRIES"])
+        elif kind == "redis":
+            import redis  # optional dependency, only needed for this backend
+            self.backend = RedisBackend(redis.Redis.from_url(app.config["CACHE_REDIS_URL"]))
+        elif kind == "null":
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f"unknown CACHE_BACKEND {kind!r}")
+        app.extensions["response_cache"] = self
+
+    # ---------- tags ----------
+    def _generations(self, tags):
+        keys = ["tag:" + t for t in tags]
+        gens = [_token(g) for g in self.backend.get_many(keys)]
+        for i, gen in enumerate(gens):
+            if gen is None:
+                gens[i] = _token(self.backend.set_if_missing(keys[i], _new_generation(invalidated=False)))
+        return gens
+
+    def invalidate(self, *tags):
+        """Drop every cached response that depends on any of ``tags``.
+
+        Call this after the write has committed, otherwise a concurrent reader
+        can cache pre-commit data under the new generation.
+        """
+        for tag in tags:
+            self.backend.put("tag:" + tag, _new_generation())
+
+    # ---------- entries ----------
+    def lookup(self, full_path, tags):
+        """(key, entry, invalidated_at) for a request path; entry is None on a miss.
+
+        Entries are {"body", "mimetype", "headers"} dicts; the key embeds the
+        tags' current generations, so it is only valid for this request.
+        ``invalidated_at`` is when the most recent of those tags last changed.
+        """
+        deps = [CATALOG_TAG, *tags]
+        gens = self._generations(deps)
+        key = "resp:" + full_path + "|" + ",".join(gens)
+        hit = self.backend.get(key)
+        return key, (json.loads(hit) if hit is not None else None), max(map(_generation_time, gens))
+
+    def store(self, key, body, mimetype, headers, ttl):
+        entry = {"body": body, "mimetype": mimetype, "headers": headers}
+        self.backend.set(key, json.dumps(entry), ttl)
+
+    # ---------- views ----------
+    def cached(self, tags, ttl=None):
+        """Cache a GET view. ``tags`` maps the view kwargs to the tags it depends on."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                key, entry, invalidated_at = self.lookup(request.full_path, tags(**kwargs))
+                if entry is not None:
+                    response = current_app.response_class(entry["body"], mimetype=entry["mimetype"])
+                    response.headers.update(entry["headers"])
+                    response.headers["X-Cache"] = "HIT"
+                    return response.make_conditional(request)
+
+                response = make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+                # a replica may not have replayed the write behind a recent
+                # invalidation yet; serve its answer but don't cache it
+                if g.get("db_replica") is not None and \
+                        time.time() - invalidated_at < current_app.config["REPLICA_MAX_LAG_SECONDS"]:
+                    response.headers["X-Cache"] = "BYPASS"
+                    return response.make_conditional(request)
+                # keep a view-supplied (e.g. version based) ETag, else hash the body
+                if not response.get_etag()[0]:
+                    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+                headers = {k: v for k, v in response.headers.items()
+                           if k in ("ETag", "Last-Modified", "Cache-Control")}
+                self.store(key, response.get_data(as_text=True), response.mimetype, headers,
+                           ttl or current_app.config["CACHE_TTL"])
+                response.headers["X-Cache"] = "MISS"
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
@@ -0,0 +1,94 @@
+# commands.py
+# Flask CLI commands (flask <command> ...), registered in create_app.
+import json
+import click
+from ingest import ingest, iter_ndjson, iter_csv, INGEST_TYPES, BATCH_SIZE
+from explain import explain_hot_queries
+from extensions import db, cache
+from cache import CATALOG_TAG
+import stats
+import costars
+import intervals
+import deletion
+
+
+@click.command("import-catalog")
+@click.argument("path", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default="ndjson")
+@click.option("--type", "record_type", type=click.Choice(list(INGEST_TYPES)),
+              help="Record type of every row (required for csv).")
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True)
+def import_catalog(path, fmt, record_type, batch_size):
+    """Bulk-import shows/seasons/episodes/people/links from an NDJSON or CSV file."""
+    if fmt == "csv":
+        if not record_type:
+            raise click.UsageError("--type is required for csv")
+        records = iter_csv(path, record_type)
+    else:
+        records = iter_ndjson(path)
+    report = ingest(records, batch_size=batch_size)
+    cache.invalidate(CATALOG_TAG)
+    click.echo(json.dumps(report.to_dict(), indent=2))
+
+
+@click.command("explain-queries")
+@click.option("--force-index", is_flag=True,
+              help="PostgreSQL: disable seq scans to check an index is usable on small datasets.")
+@click.option("--verbose", "-v", is_flag=True, help="Print every plan, not just failures.")
+def explain_queries(force_index, verbose):
+    """EXPLAIN the hot lookup queries and fail if any of them scans a whole table."""
+    failures = 0
+    for name, ok, plan in explain_hot_queries(force_index=force_index):
+        click.echo(f"{'ok  ' if ok else 'SCAN'} {name}")
+        if verbose or not ok:
+            click.echo("    " + plan.replace("\n", "\n    "))
+        failures += not ok
+    if failures:
+        raise SystemExit(1)
+
+
+@click.command("rebuild-stats")
+def rebuild_stats():
+    """Recompute every season_stats / show_stats row (and the actor appearance counts) from the catalog."""
+    stats.rebuild_all()
+    db.session.commit()
+    click.echo("stats rebuilt")
+
+
+@click.command("rebuild-costars")
+def rebuild_costars():
+    """Recompute the actor_costar co-appearance table from episode_actors."""
+    costars.rebuild_all()
+    db.session.commit()
+    click.echo("co-stars rebuilt")
+
+
+@click.command("screentime-exclusion")
+@click.argument("state", type=click.Choice(["on", "off"]))
+def screentime_exclusion(state):
+    """PostgreSQL: add or drop the constraint rejecting overlapping screentime of one actor."""
+    if db.session.get_bind().dialect.name != "postgresql":
+        raise click.UsageError("exclusion constraints need PostgreSQL; "
+                               "on SQLite SCREENTIME_EXCLUDE_OVERLAPS=1 checks overlaps in the API")
+    if state == "on":
+        db.session.execute(db.text(intervals.pg_exclusion_ddl(False)))
+    db.session.execute(db.text(intervals.pg_exclusion_ddl(state == "on")))
+    db.session.commit()
+    click.echo(f"screentime overlap constraint {state}")
+
+
+@click.command("purge-deleted")
+@click.option("--batch-size", type=int, help="Episodes per transaction (default DELETE_BATCH_SIZE).")
+def purge_deleted(batch_size):
+    """Remove the rows of soft-deleted shows, e.g. ones whose background purge was cut short."""
+    purged = deletion.purge_deleted(batch_size)
+    click.echo(f"purged {len(purged)} show(s)")
+
+
+def register_commands(app):
+    app.cli.add_command(import_catalog)
+    app.cli.add_command(explain_queries)
+    app.cli.add_command(rebuild_stats)
+    app.cli.add_command(rebuild_costars)
+    app.cli.add_command(screentime_exclusion)
+    app.cli.add_command(purge_deleted)
@@ -0,0 +1,66 @@
+# conditional.py
+# HTTP conditional request helpers built on the version/updated_at columns
+# of TVShow, Season and Episode.
+#
+# Views compute an ETag from versions (cheap: no serialization) and only run
+# the marshmallow schema when the client's copy is out of date.
+import hashlib
+from flask import request, make_response
+from instrumentation import serializing
+
+
+def entity_etag(obj):
+    """Strong ETag for a single versioned row, e.g. "tvshow-12-v3"."""
+    return f"{obj.__tablename__}-{obj.id}-v{obj.version}"
+
+
+def collection_etag(parts):
+    """ETag for a list response from an iterable of hashable version fingerprints."""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(repr(part).encode())
+    return h.hexdigest()
+
+
+def episodes_etag(episodes):
+    """collection_etag for episodes with their actors embedded.
+
+    Neither a cast change nor an actor rename touches the episode row, so
+    the embedded actors are part of the fingerprint.
+    """
+    return collection_etag([(e.id, e.version, tuple((a.id, a.first_name, a.last_name) for a in e.actors))
+                            for e in episodes])
+
+
+def is_fresh(if_none_match, if_modified_since, etag, last_modified):
+    """True if a client holding these validators (werkzeug ETags / datetime) is up to date."""
+    if if_none_match:
+        return if_none_match.contains(etag)
+    return bool(if_modified_since and last_modified
+                and last_modified.replace(microsecond=0) <= if_modified_since.replace(tzinfo=None))
+
+
+def conditional(etag, build, last_modified=None):
+    """304 if the client already has ``etag``/``last_modified``, else build() with validators set.
+
+    ``build`` is only called when a full response is actually needed. Lists
+    pass no ``last_modified``: the newest updated_at among their rows stays
+    put when a row is deleted or an episode's cast changes.
+    """
+    if is_fresh(request.if_none_match, request.if_modified_since, etag, last_modified):
+        response = make_response("", 304)
+    else:
+        with serializing():
+            response = make_response(build())
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def if_match_failed(obj):
+    """True if the request has an If-Match header that doesn't match ``obj``'s version."""
+    if not request.if_match:
+        return False
+    return not request.if_match.contains(entity_etag(obj)) and not request.if_match.star_tag
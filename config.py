@@ -1,4 +1,5 @@
 import os
+import json
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -8,5 +9,66 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///dev.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # connection pool (see dbpool.py); SQLALCHEMY_ENGINE_OPTIONS is built from these
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 5))  # seconds to wait for a connection
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+    # PostgreSQL statement_timeout in ms (0 = none), with per-endpoint overrides
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 5000))
+    DB_STATEMENT_TIMEOUT_OVERRIDES = {
+        "tv.export_catalog": 0,
+        "tv.import_catalog": 0,
+        "search.search_catalog": 2000,
+        **json.loads(os.getenv("DB_STATEMENT_TIMEOUT_OVERRIDES", "{}")),
+    }
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "jwt-secret")
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    # per-process cache of user records behind identity.current_user() (0 = no caching)
+    AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", 30))
+    AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", 10000))
+    # password hashing (see passwords.py); older hashes are upgraded on login
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+    PASSWORD_POOL = os.getenv("PASSWORD_POOL", "thread")  # or "process"
+    PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", 0))  # 0 = one per core
+    PASSWORD_POOL_QUEUE = int(os.getenv("PASSWORD_POOL_QUEUE", 0))  # pending hashes before 429; 0 = 4 per worker
+    PASSWORD_POOL_TIMEOUT = float(os.getenv("PASSWORD_POOL_TIMEOUT", 10))
+    # request admission (see ratelimit.py): token buckets per user / IP, "<n>/<second|minute|hour>", "" = unlimited
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # or "redis"
+    RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")  # default: the cache's Redis
+    RATE_LIMIT_READ = os.getenv("RATE_LIMIT_READ", "600/minute")
+    RATE_LIMIT_WRITE = os.getenv("RATE_LIMIT_WRITE", "120/minute")
+    RATE_LIMIT_AUTH = os.getenv("RATE_LIMIT_AUTH", "20/minute")
+    # reverse proxies in front of the app that append to X-Forwarded-For; 0 = key by the socket address
+    RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", 0))
+    MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 0))  # per process; 0 = pool size + overflow
+    # read replicas for GET traffic (comma separated URLs; empty = primary only)
+    REPLICA_DATABASE_URLS = [u for u in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if u]
+    REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", 5))  # read-your-writes window
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 10))
+    REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", 5))
+    # listing endpoints (keyset pagination)
+    PAGE_SIZE = int(os.getenv("PAGE_SIZE", 50))
+    MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 200))
+    # search is offset-paginated; deep pages are refused rather than scanned
+    MAX_SEARCH_PAGE = int(os.getenv("MAX_SEARCH_PAGE", 50))
+    # reject screentime segments of one actor that overlap in an episode (409 / per-row import
+    # error); on PostgreSQL the migration also adds an exclusion constraint (see intervals.py)
+    SCREENTIME_EXCLUDE_OVERLAPS = os.getenv("SCREENTIME_EXCLUDE_OVERLAPS", "0") == "1"
+    # deleting shows (see deletion.py); soft = mark deleted at once, purge the rows in the background
+    SOFT_DELETE_SHOWS = os.getenv("SOFT_DELETE_SHOWS", "0") == "1"
+    DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", 500))  # episodes per purge transaction
+    # response cache for public GETs: "lru" (in-process), "redis" or "null"
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "lru")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_TTL = int(os.getenv("CACHE_TTL", 300))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 2048))
+    # asgi.py read path; defaults to DATABASE_URL with the psycopg (async) / aiosqlite driver
+    ASYNC_DATABASE_URI = os.getenv("ASYNC_DATABASE_URL")
+    # request instrumentation (see instrumentation.py); 0 disables each check
+    INSTRUMENT_SLOW_REQUEST_MS = int(os.getenv("INSTRUMENT_SLOW_REQUEST_MS", 1000))
+    INSTRUMENT_N_PLUS_ONE = int(os.getenv("INSTRUMENT_N_PLUS_ONE", 10))
+    INSTRUMENT_PROFILE_RATE = float(os.getenv("INSTRUMENT_PROFILE_RATE", 0))
+    INSTRUMENT_PROFILER = os.getenv("INSTRUMENT_PROFILER", "cprofile")  # or "pyinstrument"
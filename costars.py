@@ -0,0 +1,161 @@
+# costars.py
+# Maintenance of the actor_costar adjacency table.
+#
+# actor_costar holds, for every pair of actors who share at least one
+# episode, the number of shared episodes - once per direction, so an
+# actor's top co-stars are a single index range scan. Writes apply deltas:
+# the cast of each touched episode is read before and after the change, and
+# only the pairs that appeared or disappeared are adjusted. ORM writes are
+# picked up by the flush hooks below; Core write paths take a snapshot()
+# before writing and pass it to apply() afterwards. Deleting many episodes
+# at once goes through forget_episodes(), one grouped UPDATE instead.
+from collections import Counter
+from itertools import permutations
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Actor, Episode, ActorCostar, episode_actors
+from bulk import dialect_insert
+from queries import hidden_episodes
+
+CHUNK = 500
+
+
+def _conn(conn):
+    return conn if conn is not None else db.session.connection()
+
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), CHUNK):
+        yield values[i:i + CHUNK]
+
+
+def snapshot(episode_ids, conn=None):
+    """{episode_id: set of actor ids} for ``episode_ids`` as currently stored."""
+    conn = _conn(conn)
+    cast = {eid: set() for eid in episode_ids if eid is not None}
+    for ids in _chunks(cast):
+        for eid, aid in conn.execute(select(episode_actors.c.episode_id, episode_actors.c.actor_id)
+                                     .where(episode_actors.c.episode_id.in_(ids))):
+            cast[eid].add(aid)
+    return cast
+
+
+def pair_deltas(before, after):
+    """Counter of (actor_id, costar_id) -> change in shared episodes between two snapshots."""
+    deltas = Counter()
+    for eid in before.keys() | after.keys():
+        old, new = before.get(eid, set()), after.get(eid, set())
+        if old == new:
+            continue
+        for pair in permutations(new, 2):
+            deltas[pair] += 1
+        for pair in permutations(old, 2):
+            deltas[pair] -= 1
+    return {pair: n for pair, n in deltas.items() if n}
+
+
+def apply(before, conn=None):
+    """Adjust actor_costar for the episodes in ``before`` (a snapshot() taken before the write)."""
+    conn = _conn(conn)
+    deltas = pair_deltas(before, snapshot(before, conn))
+    if not deltas:
+        return
+    table = ActorCostar.__table__
+    stmt = dialect_insert(table, conn)
+    stmt = stmt.on_conflict_do_update(index_elements=["actor_id", "costar_id"],
+                                      set_={"episode_count": table.c.episode_count + stmt.excluded.episode_count})
+    rows = [{"actor_id": a, "costar_id": b, "episode_count": n} for (a, b), n in deltas.items()]
+    conn.execute(stmt, rows)
+    # pairs that no longer share an episode
+    gone = {a for (a, _), n in deltas.items() if n < 0}
+    for ids in _chunks(gone):
+        conn.execute(table.delete().where(table.c.actor_id.in_(ids), table.c.episode_count <= 0))
+
+
+def _pairs():
+    a, b = episode_actors.alias("a"), episode_actors.alias("b")
+    return a, select(a.c.actor_id, b.c.actor_id.label("costar_id"), func.count().label("episode_count")) \
+        .join(b, (b.c.episode_id == a.c.episode_id) & (b.c.actor_id != a.c.actor_id)) \
+        .group_by(a.c.actor_id, b.c.actor_id)
+
+
+def forget_episodes(episodes, conn=None):
+    """Take the episodes selected by ``episodes`` (a select of ids) out of actor_costar, before deleting them.
+
+    One grouped UPDATE ... FROM, however many episodes; the caller deletes
+    the episodes (or, for a soft delete, hides them) in the same transaction.
+    """
+    conn = _conn(conn)
+    a, pairs = _pairs()
+    pairs = pairs.where(a.c.episode_id.in_(episodes)).subquery("pairs")
+    table = ActorCostar.__table__
+    conn.execute(update(table)
+                 .where(table.c.actor_id == pairs.c.actor_id, table.c.costar_id == pairs.c.costar_id)
+                 .values(episode_count=table.c.episode_count - pairs.c.episode_count))
+    cast = select(episode_actors.c.actor_id).where(episode_actors.c.episode_id.in_(episodes))
+    conn.execute(table.delete().where(table.c.actor_id.in_(cast), table.c.episode_count <= 0))
+
+
+def rebuild_all(conn=None):
+    """Recompute the whole table from episode_actors (episodes of soft-deleted shows left out)."""
+    conn = _conn(conn)
+    a, pairs = _pairs()
+    conn.execute(ActorCostar.__table__.delete())
+    conn.execute(ActorCostar.__table__.insert().from_select(
+        ["actor_id", "costar_id", "episode_count"], pairs.where(a.c.episode_id.not_in(hidden_episodes()))))
+
+
+def top_costars(actor_id, limit, conn=None):
+    """[(Actor row fields..., episode_count)] for the ``limit`` actors sharing most episodes with ``actor_id``."""
+    conn = _conn(conn)
+    return conn.execute(
+        select(Actor.id, Actor.first_name, Actor.last_name, ActorCostar.episode_count)
+        .join(Actor, Actor.id == ActorCostar.costar_id)
+        .where(ActorCostar.actor_id == actor_id)
+        .order_by(ActorCostar.episode_count.desc(), ActorCostar.costar_id)
+        .limit(limit)
+    ).all()
+
+
+# ---------- ORM writes ----------
+def _cast_changed(obj, attr):
+    return inspect(obj).attrs[attr].history.has_changes()
+
+
+@event.listens_for(Session, "before_flush")
+def _snapshot_cast(session, flush_context, instances):
+    """Record the stored cast of every episode whose cast this flush will change."""
+    touched, dead_actors = set(), set()
+    for obj in session.dirty:
+        if isinstance(obj, Episode) and _cast_changed(obj, "actors"):
+            touched.add(obj.id)
+        elif isinstance(obj, Actor) and _cast_changed(obj, "episodes"):
+            history = inspect(obj).attrs.episodes.history
+            touched.update(e.id for e in history.added + history.deleted if e.id is not None)
+    for obj in session.deleted:
+        if isinstance(obj, Episode):
+            touched.add(obj.id)
+        elif isinstance(obj, Actor):
+            dead_actors.add(obj.id)
+    new_episodes = [obj for obj in session.new if isinstance(obj, Episode)]
+
+    if not (touched or dead_actors or new_episodes):
+        return
+    conn = session.connection()
+    for ids in _chunks(dead_actors):
+        touched.update(conn.execute(select(episode_actors.c.episode_id)
+                                    .where(episode_actors.c.actor_id.in_(ids))).scalars())
+    session.info["costar_snapshot"] = (snapshot(touched, conn), new_episodes)
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_cast_changes(session, flush_context):
+    pending = session.info.pop("costar_snapshot", None)
+    if pending is None:
+        return
+    before, new_episodes = pending
+    for ep in new_episodes:  # ids are assigned by now; they had no cast before
+        before.setdefault(ep.id, set())
+    apply(before, session.connection())
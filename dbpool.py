@@ -0,0 +1,122 @@
+# dbpool.py
+# Engine / connection-pool configuration and instrumentation.
+#
+# engine_options() turns the DB_* config keys into create_engine() arguments
+# (pool size, overflow, checkout timeout, recycle and pre-ping). The pools are QueuePool subclasses that time every
+# checkout, so a burst that exhausts the pool shows up as checkout wait and
+# saturation in /metrics instead of as silently queued requests.
+#
+# The PostgreSQL statement_timeout (DB_STATEMENT_TIMEOUT_MS, or the endpoint's
+# entry in DB_STATEMENT_TIMEOUT_OVERRIDES) is applied with SET LOCAL semantics
+# at the start of every transaction a request opens, so it never leaks to
+# pooled connections and never reaches migrations, CLI commands or the purger.
+import time
+import weakref
+from flask import current_app, g, request, has_app_context, has_request_context
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+import metrics
+
+POOL_WAIT = metrics.Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+POOL_TIMEOUTS = metrics.Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT.", ["pool"])
+
+_pools = weakref.WeakSet()
+
+
+class _InstrumentedPool:
+    metrics_label = "sync"
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        _pools.add(self)
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            POOL_TIMEOUTS.inc(self.metrics_label)
+            raise
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start, self.metrics_label)
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def _pool_stats(stat):
+    def collect():
+        totals = {}
+        for pool in list(_pools):
+            key = (pool.metrics_label,)
+            in_use, capacity = totals.get(key, (0, 0))
+            totals[key] = (in_use + pool.checkedout(), capacity + pool.size() + max(pool._max_overflow, 0))
+        return {k: stat(in_use, capacity) for k, (in_use, capacity) in totals.items()}
+    return collect
+
+
+metrics.Gauge("db_pool_checked_out", "Connections currently checked out.",
+              _pool_stats(lambda in_use, capacity: in_use), ["pool"])
+metrics.Gauge("db_pool_capacity", "pool_size + max_overflow.",
+              _pool_stats(lambda in_use, capacity: capacity), ["pool"])
+metrics.Gauge("db_pool_saturation", "Checked-out connections as a fraction of capacity.",
+              _pool_stats(lambda in_use, capacity: round(in_use / capacity, 4) if capacity else 0.0), ["pool"])
+
+
+def engine_options(config, url=None, asyncio=False):
+    """create_engine() keyword arguments for ``url`` (default: the app's database)."""
+    url = make_url(url or config["SQLALCHEMY_DATABASE_URI"])
+    backend = url.get_backend_name()
+    options = {"pool_pre_ping": config["DB_POOL_PRE_PING"]}
+    # in-memory SQLite lives in a single connection; keep SQLAlchemy's default pool
+    if backend == "sqlite" and url.database in (None, "", ":memory:"):
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if asyncio else InstrumentedQueuePool,
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+        pool_recycle=config["DB_POOL_RECYCLE"],
+    )
+    return options
+
+
+def statement_timeout(config, endpoint):
+    """statement_timeout in ms for requests to ``endpoint`` (0 = none)."""
+    return config["DB_STATEMENT_TIMEOUT_OVERRIDES"].get(endpoint, config["DB_STATEMENT_TIMEOUT_MS"])
+
+
+def apply_statement_timeout(connection):
+    """SET LOCAL the current request's statement_timeout on ``connection`` (PostgreSQL only).
+
+    Resolved when the transaction begins rather than in a before_request
+    hook, so transactions opened by earlier hooks (admission, identity) get
+    it too. Outside a request only an explicit ``g.statement_timeout_ms``
+    applies; migrations, CLI commands and the purger keep the server default.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    if has_request_context():
+        ms = statement_timeout(current_app.config, request.endpoint)
+    else:
+        ms = g.get("statement_timeout_ms") if has_app_context() else None
+    if ms is not None:
+        connection.execute(select(func.set_config("statement_timeout", str(int(ms)), True)))
+
+
+@event.listens_for(Session, "after_begin")
+def _session_statement_timeout(session, transaction, connection):
+    apply_statement_timeout(connection)
+
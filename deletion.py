@@ -0,0 +1,235 @@
+# deletion.py
+# Deleting shows, seasons and episodes without loading them.
+#
+# db.session.delete(show) made the ORM load every season, episode, cast and
+# crew link and screentime row to honor cascade="all, delete-orphan", then
+# delete them one by one. Here a delete is a fixed number of set-based
+# statements, whatever the size of the show: actor_costar is adjusted for
+# the doomed episodes in one grouped UPDATE (costars.forget_episodes), a
+# season is taken out of its show's stats (stats.forget_season), then
+# PostgreSQL needs a single DELETE of the show or season and removes the
+# rest through ON DELETE CASCADE. SQLite (which doesn't enforce foreign
+# keys here) gets one DELETE ... WHERE ... IN (subquery) per child table.
+# The caller commits.
+#
+# With SOFT_DELETE_SHOWS=1, deleting a show instead stamps tvshow.deleted_at,
+# takes its episodes out of actor_costar and drops its show_stats and
+# show_actor rows; the
+# rows stay, hidden from every read (queries.hidden_shows() and friends),
+# and are purged afterwards by a background thread in DELETE_BATCH_SIZE
+# episode batches, one transaction each, so no single transaction holds
+# locks on the whole show. `flask purge-deleted` finishes purges a restart
+# cut short.
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, select, update
+from extensions import db
+from models import (TVShow, Season, Episode, EpisodeCrew, ScreenTime, SeasonStats, ShowStats, SeasonActor, ShowActor,
+                    episode_actors)
+from queries import hidden_shows
+import costars
+import intervals
+import metrics
+import stats
+
+PURGED = metrics.Counter("show_purge_episodes_total", "Episodes removed by the soft-delete purge.")
+EPISODE_LINKS = (ScreenTime.__table__, EpisodeCrew.__table__, episode_actors)
+
+
+def _conn(conn):
+    return conn if conn is not None else db.session.connection()
+
+
+def _cascades(conn):
+    return conn.dialect.name != "sqlite"
+
+
+def _forget_episodes(episodes, conn):
+    """Lock the episodes selected by ``episodes`` and take them out of actor_costar.
+
+    The lock comes first so no cast link can be added between the two (an
+    insert into episode_actors needs a key-share lock on its episode); it is
+    taken inside a count, so no rows travel back.
+    """
+    conn.execute(select(func.count()).select_from(
+        select(Episode.id).where(Episode.id.in_(episodes)).with_for_update().subquery()))
+    costars.forget_episodes(episodes, conn)
+
+
+def _delete_episodes(condition, conn):
+    """Delete the episodes matching ``condition`` (actor_costar already adjusted)."""
+    if not _cascades(conn):
+        episodes = select(Episode.id).where(condition)
+        for table in EPISODE_LINKS:
+            conn.execute(table.delete().where(table.c.episode_id.in_(episodes)))
+    conn.execute(Episode.__table__.delete().where(condition))
+
+
+def _delete_seasons(condition, conn):
+    """Delete the seasons matching ``condition`` and everything in them."""
+    if not _cascades(conn):
+        seasons = select(Season.id).where(condition)
+        _delete_episodes(Episode.season_id.in_(seasons), conn)
+        for table in (SeasonStats.__table__, SeasonActor.__table__):
+            conn.execute(table.delete().where(table.c.season_id.in_(seasons)))
+    conn.execute(Season.__table__.delete().where(condition))
+
+
+def delete_episode(episode_id, conn=None):
+    """Delete one episode; returns (season_id, show_id), or None if it doesn't exist."""
+    conn = _conn(conn)
+    row = conn.execute(select(Episode.season_id, Season.tvshow_id).join(Season, Season.id == Episode.season_id)
+                       .where(Episode.id == episode_id, Season.tvshow_id.not_in(hidden_shows()))
+                       .with_for_update(of=Episode)).first()
+    if row is None:
+        return None
+    before = stats.snapshot([episode_id], conn)
+    costars.forget_episodes(select(Episode.id).where(Episode.id == episode_id), conn)  # locked above
+    _delete_episodes(Episode.id == episode_id, conn)
+    intervals.invalidate_episodes([episode_id])
+    stats.apply(before, conn)
+    return row.season_id, row.tvshow_id
+
+
+def delete_season(season_id, conn=None):
+    """Delete a season and its episodes; returns the show id, or None if the season doesn't exist."""
+    conn = _conn(conn)
+    show_id = conn.execute(select(Season.tvshow_id).where(Season.id == season_id,
+                                                          Season.tvshow_id.not_in(hidden_shows()))
+                           .with_for_update()).scalar()
+    if show_id is None:
+        return None
+    _forget_episodes(select(Episode.id).where(Episode.season_id == season_id), conn)
+    stats.forget_season(season_id, show_id, conn)
+    _delete_seasons(Season.id == season_id, conn)
+    intervals.invalidate_all()
+    return show_id
+
+
+def _show_episodes(show_id):
+    return select(Episode.id).where(Episode.season_id.in_(select(Season.id).where(Season.tvshow_id == show_id)))
+
+
+def _delete_show_rows(show_id, conn):
+    _delete_seasons(Season.tvshow_id == show_id, conn)
+    if not _cascades(conn):
+        for table in (ShowStats.__table__, ShowActor.__table__):
+            conn.execute(table.delete().where(table.c.tvshow_id == show_id))
+    conn.execute(TVShow.__table__.delete().where(TVShow.id == show_id))
+
+
+def soft_delete_show(show_id, conn=None):
+    """Hide a show until the purge removes it; False if there is no such (live) show."""
+    conn = _conn(conn)
+    table = TVShow.__table__
+    now = datetime.utcnow()
+    marked = conn.execute(update(table).where(table.c.id == show_id, table.c.deleted_at.is_(None))
+                          .values(deleted_at=now, version=table.c.version + 1, updated_at=now)).rowcount
+    if not marked:
+        return False
+    _forget_episodes(_show_episodes(show_id), conn)
+    stats.forget_show(show_id, conn)
+    return True
+
+
+def delete_show(show_id, conn=None):
+    """Delete a show: "scheduled" (SOFT_DELETE_SHOWS, see schedule_purge), "deleted", or None if not found."""
+    conn = _conn(conn)
+    if current_app.config["SOFT_DELETE_SHOWS"]:
+        return "scheduled" if soft_delete_show(show_id, conn) else None
+    found = conn.execute(select(TVShow.id).where(TVShow.id == show_id, TVShow.deleted_at.is_(None))
+                         .with_for_update()).scalar()
+    if found is None:
+        return None
+    _forget_episodes(_show_episodes(show_id), conn)
+    _delete_show_rows(show_id, conn)
+    intervals.invalidate_all()
+    return "deleted"
+
+
+def purge_show(show_id, size=None):
+    """Remove a soft-deleted show's rows, one committed batch at a time; False if another purge holds it."""
+    size = size or current_app.config["DELETE_BATCH_SIZE"]
+    seasons = select(Season.id).where(Season.tvshow_id == show_id)
+    while True:
+        # the show row is the purge's lock, taken again by each batch's transaction
+        conn = db.session.connection()
+        held = conn.execute(select(TVShow.id).where(TVShow.id == show_id, TVShow.deleted_at.isnot(None))
+                            .with_for_update(skip_locked=True)).scalar()
+        if held is None:
+            db.session.rollback()
+            return False
+        ids = conn.execute(select(Episode.id).where(Episode.season_id.in_(seasons))
+                           .order_by(Episode.id).limit(size)).scalars().all()
+        if ids:
+            _delete_episodes(Episode.id.in_(ids), conn)
+            intervals.invalidate_episodes(ids)
+        else:
+            _delete_show_rows(show_id, conn)
+        db.session.commit()
+        PURGED.inc(amount=len(ids))
+        if not ids:
+            return True
+
+
+def purge_deleted(size=None):
+    """Purge every soft-deleted show, oldest first; returns the ids purged."""
+    purged, tried = [], set()
+    while True:
+        # again until nothing new turns up: shows may be soft-deleted meanwhile
+        pending = db.session.execute(select(TVShow.id).where(TVShow.deleted_at.isnot(None))
+                                     .order_by(TVShow.deleted_at, TVShow.id)).scalars().all()
+        db.session.rollback()
+        pending = [show_id for show_id in pending if show_id not in tried]
+        if not pending:
+            return purged
+        for show_id in pending:
+            tried.add(show_id)  # one held by another purge is left to it
+            if purge_show(show_id, size):
+                purged.append(show_id)
+
+
+class Purger:
+    """Runs purge_deleted() on one background thread per app; schedule() while running makes it go again."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._thread = None
+        self._again = False
+
+    def schedule(self):
+        with self._lock:
+            self._again = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="show-purge", daemon=True)
+                self._thread.start()
+
+    def join(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._again:
+                    self._thread = None
+                    return
+                self._again = False
+            with self.app.app_context():
+                try:
+                    purge_deleted()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("show purge failed; `flask purge-deleted` finishes it")
+
+
+def schedule_purge():
+    """After committing a soft delete: purge it in the background."""
+    current_app.extensions["show_purger"].schedule()
+
+
+def init_app(app):
+    app.extensions["show_purger"] = Purger(app)
@@ -0,0 +1,82 @@
+# explain.py
+# EXPLAIN-based check that the hot lookup queries are served by an index.
+#
+# Run against a seeded database with `flask explain-queries`. Plans are
+# read from EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (FORMAT JSON) (PostgreSQL);
+# a full table scan of the queried table counts as a failure.
+import json
+from extensions import db
+from models import User, TVShow, Season, Episode, Actor, Crew, EpisodeCrew, ScreenTime, ActorCostar, episode_actors
+
+
+def hot_queries():
+    """(name, table, statement, dialects) for the lookups the app depends on."""
+    return [
+        ("seasons of a show", "season", db.select(Season.id).where(Season.tvshow_id == 1), None),
+        ("episodes of a season", "episode", db.select(Episode.id).where(Episode.season_id == 1), None),
+        ("episodes of an actor", "episode_actors",
+         db.select(episode_actors.c.episode_id).where(episode_actors.c.actor_id == 1), None),
+        ("top co-stars of an actor", "actor_costar",
+         db.select(ActorCostar.costar_id).where(ActorCostar.actor_id == 1)
+         .order_by(ActorCostar.episode_count.desc(), ActorCostar.costar_id).limit(10), None),
+        ("episodes of a crew member", "episode_crew",
+         db.select(EpisodeCrew.episode_id).where(EpisodeCrew.crew_id == 1), None),
+        ("screentime of an episode", "screentime",
+         db.select(ScreenTime.id).where(ScreenTime.episode_id == 1), None),
+        ("user by username", "user", db.select(User.id).where(User.username == "admin"), None),
+        ("crew by role", "crew",
+         db.select(Crew.id).where(db.func.lower(Crew.person_definition) == "director"), None),
+        ("shows by title page", "tvshow",
+         db.select(TVShow.id).order_by(TVShow.title, TVShow.id).limit(50), None),
+        ("show title search", "tvshow",
+         db.select(TVShow.id).where(db.func.lower(TVShow.title).contains("the", autoescape=True)),
+         {"postgresql"}),
+        ("actor name search", "actor",
+         db.select(Actor.id).where(db.func.lower(Actor.last_name).contains("smi", autoescape=True)),
+         {"postgresql"}),
+    ]
+
+
+def _sqlite_plan(conn, sql, table):
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql).all()
+    lines = [r[-1] for r in rows]
+    full_scan = any(l.startswith(f"SCAN {table}") and "USING" not in l for l in lines)
+    return "\n".join(lines), not full_scan
+
+
+def _postgres_plan(conn, sql, table):
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    seq_scans = []
+
+    def walk(node):
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") == table:
+            seq_scans.append(node)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return json.dumps(plan[0]["Plan"], indent=1), not seq_scans
+
+
+def explain_hot_queries(force_index=False):
+    """Yield (name, uses_index, plan_text) for each hot query on this database.
+
+    ``force_index`` disables sequential scans on PostgreSQL, which checks that
+    a usable index exists even when the tables are too small for the planner
+    to prefer it.
+    """
+    with db.engine.connect() as conn:
+        dialect = conn.dialect.name
+        if dialect == "postgresql" and force_index:
+            conn.exec_driver_sql("SET enable_seqscan = off")
+        for name, table, stmt, dialects in hot_queries():
+            if dialects and dialect not in dialects:
+                continue
+            sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+            if dialect == "postgresql":
+                plan, ok = _postgres_plan(conn, sql, table)
+            else:
+                plan, ok = _sqlite_plan(conn, sql, table)
+            yield name, ok, plan
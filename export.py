@@ -0,0 +1,86 @@
+# export.py
+# Streaming catalog export (NDJSON / CSV).
+#
+# Rows are read straight from the tables with a server-side cursor
+# (stream_results + yield_per) and written out one chunk at a time, so
+# memory stays flat however large the catalog is. No ORM objects or
+# marshmallow schemas are involved.
+import csv
+import io
+import json
+from datetime import date, datetime
+from extensions import db
+from dbpool import apply_statement_timeout
+from models import TVShow, Season, Episode, Actor, Crew, EpisodeCrew, ScreenTime, episode_actors
+from queries import hidden_shows, hidden_seasons, hidden_episodes
+
+# export type -> table, in dependency order (parents before children)
+EXPORT_TABLES = {
+    "show": TVShow.__table__,
+    "season": Season.__table__,
+    "episode": Episode.__table__,
+    "actor": Actor.__table__,
+    "crew": Crew.__table__,
+    "episode_actor": episode_actors,
+    "episode_crew": EpisodeCrew.__table__,
+    "screentime": ScreenTime.__table__,
+}
+
+# export type -> condition leaving out rows of soft-deleted shows awaiting the purge
+LIVE_ROWS = {
+    "show": lambda t: t.c.deleted_at.is_(None),
+    "season": lambda t: t.c.tvshow_id.not_in(hidden_shows()),
+    "episode": lambda t: t.c.season_id.not_in(hidden_seasons()),
+    "episode_actor": lambda t: t.c.episode_id.not_in(hidden_episodes()),
+    "episode_crew": lambda t: t.c.episode_id.not_in(hidden_episodes()),
+    "screentime": lambda t: t.c.episode_id.not_in(hidden_episodes()),
+}
+
+CHUNK_ROWS = 1000
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _stream_rows(export_type):
+    """Yield lists of row tuples of an export type in primary-key order."""
+    table = EXPORT_TABLES[export_type]
+    stmt = db.select(table).order_by(*table.primary_key.columns)
+    if export_type in LIVE_ROWS:
+        stmt = stmt.where(LIVE_ROWS[export_type](table))
+    with db.engine.connect() as conn:
+        apply_statement_timeout(conn)
+        result = conn.execution_options(stream_results=True, yield_per=CHUNK_ROWS).execute(stmt)
+        for chunk in result.partitions():
+            yield chunk
+
+
+def iter_ndjson(types):
+    """NDJSON lines for each export type; every object carries a "type" key."""
+    for export_type in types:
+        table = EXPORT_TABLES[export_type]
+        keys = [c.name for c in table.columns]
+        for chunk in _stream_rows(export_type):
+            yield "".join(
+                json.dumps({"type": export_type, **{k: _plain(v) for k, v in zip(keys, row)}}) + "\n"
+                for row in chunk
+            )
+
+
+def iter_csv(export_type):
+    """CSV for a single export type: a header row followed by the data."""
+    table = EXPORT_TABLES[export_type]
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([c.name for c in table.columns])
+    for chunk in _stream_rows(export_type):
+        writer.writerows([_plain(v) for v in row] for row in chunk)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    # header-only output for an empty table
+    if buf.tell():
+        yield buf.getvalue()
@@ -0,0 +1,162 @@
+# identity.py
+# Who is making the request, resolved once.
+#
+# API calls carry a JWT whose identity is {"id", "role"}; UI pages keep
+# user_id in the session. current_user() turns either into a CurrentUser
+# record and keeps it on flask.g for the rest of the request, and
+# flask_jwt_extended's user lookup goes through the same path, so a token
+# whose user has been deleted is refused by @jwt_required (401).
+#
+# Roles are read from the user record, not the token claim, so a demoted
+# admin loses access without waiting for their token to expire. Records are
+# kept in a small per-process TTL cache (AUTH_USER_CACHE_TTL seconds,
+# AUTH_USER_CACHE_SIZE entries); a flush that changes a user's role, name or
+# email, or deletes the user, drops the entry at once in this process,
+# and other workers pick the change up when their entry expires.
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from flask import g, session, has_request_context
+from flask_jwt_extended import verify_jwt_in_request, get_current_user
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from extensions import db, jwt
+from models import User
+import metrics
+
+LOOKUPS = metrics.Counter("auth_user_lookups_total", "User record lookups by whether the cache answered.",
+                          ["result"])
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    id: int
+    username: str
+    email: str
+    role: str
+
+    @property
+    def is_admin(self):
+        return self.role == "admin"
+
+
+class UserCache:
+    """LRU of user id -> CurrentUser (or None for an unknown id) with a TTL per entry."""
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl, self.max_entries = ttl, max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            item = self._entries.get(user_id)
+            if item is None:
+                return _MISSING
+            expires, record = item
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return _MISSING
+            self._entries.move_to_end(user_id)
+            return record
+
+    def set(self, user_id, record):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, record)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+users = UserCache()
+
+
+def load_user(user_id):
+    """The CurrentUser for ``user_id``, or None if there is no such user."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    record = users.get(user_id)
+    if record is not _MISSING:
+        LOOKUPS.inc("hit")
+        return record
+    LOOKUPS.inc("miss")
+    row = db.session.execute(
+        select(User.id, User.username, User.email, User.role).where(User.id == user_id)
+    ).first()
+    record = CurrentUser(*row) if row else None
+    users.set(user_id, record)
+    return record
+
+
+def _token_user_id(jwt_data):
+    identity = jwt_data.get("sub")
+    return identity.get("id") if isinstance(identity, dict) else identity
+
+
+def current_user():
+    """The requesting user (JWT first, then the UI session), or None if anonymous."""
+    if not has_request_context():
+        return None
+    user = g.get("current_user", _MISSING)
+    if user is not _MISSING:
+        return user
+    user = None
+    try:
+        if verify_jwt_in_request(optional=True) is not None:
+            user = get_current_user()
+    except Exception:
+        user = None  # bad/expired tokens are rejected by the view itself
+    if user is None and session.get("user_id") is not None:
+        user = load_user(session["user_id"])
+    g.current_user = user
+    return user
+
+
+def is_admin():
+    user = current_user()
+    return user is not None and user.is_admin
+
+
+# ---------- invalidation ----------
+@event.listens_for(Session, "after_flush")
+def _users_changed(session, flush_context):
+    # new users too: SQLite can hand a deleted user's id to the next insert
+    changed = [obj.id for obj in session.new | session.deleted if isinstance(obj, User)]
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if state.attrs.role.history.has_changes() or state.attrs.username.history.has_changes() \
+                    or state.attrs.email.history.has_changes():
+                changed.append(obj.id)
+    if changed:
+        users.invalidate(*changed)
+
+
+def init_app(app):
+    users.ttl = app.config.get("AUTH_USER_CACHE_TTL", users.ttl)
+    users.max_entries = app.config.get("AUTH_USER_CACHE_SIZE", users.max_entries)
+
+    @app.before_request
+    def _forget_user():
+        # g outlives the request when an app context was already pushed (scripts, test clients)
+        g.pop("current_user", None)
+
+    @jwt.user_lookup_loader
+    def _lookup(jwt_header, jwt_data):
+        # called once per request by verify_jwt_in_request; flask_jwt_extended keeps the result on g
+        return load_user(_token_user_id(jwt_data))
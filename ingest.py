@@ -0,0 +1,325 @@
+# ingest.py
+# Bulk catalog import (NDJSON / CSV) with batched, set-based writes.
+#
+# Records are grouped into batches of one type, validated with the
+# schemas.py classes, checked for missing parents with one query per parent
+# table (and for explicit ids already taken by another row), then written
+# with a single multi-row INSERT ... ON CONFLICT.
+# Invalid rows are skipped and reported; they never abort the batch.
+import csv
+import json
+from dataclasses import dataclass, field
+from flask import current_app
+from marshmallow import ValidationError
+from extensions import db
+from models import TVShow, Season, Episode, Actor, Crew, EpisodeCrew, ScreenTime, episode_actors
+from schemas import (TVShowSchema, SeasonSchema, EpisodeSchema, ActorSchema, CrewSchema,
+                     EpisodeActorSchema, EpisodeCrewSchema, ScreenTimeSchema)
+from bulk import upsert, dialect_insert, sync_id_sequence
+import stats
+import costars
+import intervals
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+# maintained by the database side; ignored if present (e.g. in an export)
+BOOKKEEPING_FIELDS = ("version", "updated_at", "deleted_at")
+
+
+@dataclass
+class IngestType:
+    table: object
+    schema: type
+    # natural key used for ON CONFLICT; None means "id if given, else plain insert"
+    conflict_cols: list = None
+    # foreign key column -> parent model, checked per batch
+    parents: dict = field(default_factory=dict)
+    # link tables have nothing to update on conflict
+    link: bool = False
+    # extra per-batch validation: fn([(line, row)]) -> {line: errors}
+    check: object = None
+    # insert-only: rows clashing with an existing key are reported instead of updated
+    report_conflicts: bool = False
+
+
+def _screentime_overlaps(rows):
+    """With SCREENTIME_EXCLUDE_OVERLAPS, an actor can't be on screen twice at once in one episode (one query)."""
+    if not current_app.config["SCREENTIME_EXCLUDE_OVERLAPS"]:
+        return {}
+    clashes = intervals.batch_overlaps(db.session.connection(), [
+        (line, r["episode_id"], r["actor_id"], r.get("start_time"), r.get("end_time")) for line, r in rows])
+    return {line: {"start_time": [f"overlaps screentime {', '.join(map(str, ids))}" if ids
+                                  else "overlaps an earlier segment in this batch"]}
+            for line, ids in clashes.items()}
+
+
+INGEST_TYPES = {
+    "show": IngestType(TVShow.__table__, TVShowSchema),
+    "season": IngestType(Season.__table__, SeasonSchema, ["tvshow_id", "season_number"], {"tvshow_id": TVShow}),
+    "episode": IngestType(Episode.__table__, EpisodeSchema, ["season_id", "episode_number"], {"season_id": Season}),
+    "actor": IngestType(Actor.__table__, ActorSchema),
+    "crew": IngestType(Crew.__table__, CrewSchema),
+    "episode_actor": IngestType(episode_actors, EpisodeActorSchema, ["episode_id", "actor_id"],
+                                {"episode_id": Episode, "actor_id": Actor}, link=True),
+    "episode_crew": IngestType(EpisodeCrew.__table__, EpisodeCrewSchema, ["episode_id", "crew_id"],
+                               {"episode_id": Episode, "crew_id": Crew}, link=True),
+    "screentime": IngestType(ScreenTime.__table__, ScreenTimeSchema, ["actor_id", "episode_id", "start_time"],
+                             {"episode_id": Episode, "actor_id": Actor}, check=_screentime_overlaps,
+                             report_conflicts=True),
+}
+
+
+class IngestReport:
+    def __init__(self):
+        self.processed = 0
+        self.written = {}
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, record_type, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "type": record_type, "errors": errors})
+
+    def to_dict(self):
+        return {"processed": self.processed, "written": self.written,
+                "error_count": self.error_count, "errors": self.errors}
+
+
+# ---------- parsing ----------
+def iter_ndjson(lines, default_type=None):
+    """(line_no, type, record) for each non-blank NDJSON line; ``default_type`` fills in a missing "type"."""
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None, "invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "expected a JSON object"
+            continue
+        yield line_no, record.pop("type", default_type), record
+
+
+def iter_json_array(records, record_type):
+    """(index, type, record) for each element of an already parsed JSON array (1-based index)."""
+    for index, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            yield index, record_type, "expected a JSON object"
+            continue
+        yield index, record.pop("type", record_type), record
+
+
+def iter_csv(lines, record_type):
+    """(line_no, type, record) for each CSV data row; empty cells become null."""
+    for line_no, row in enumerate(csv.DictReader(lines), start=2):
+        yield line_no, record_type, {k: (v if v != "" else None) for k, v in row.items()}
+
+
+# ---------- writing ----------
+def _missing_parents(spec, rows):
+    """Per-row parent errors, using one IN query per parent table."""
+    missing = {}
+    for col, model in spec.parents.items():
+        wanted = {r[col] for _, r in rows}
+        found = set(db.session.execute(db.select(model.id).where(model.id.in_(wanted))).scalars())
+        for line, r in rows:
+            if r[col] not in found:
+                missing.setdefault(line, {})[col] = [f"{model.__tablename__} {r[col]} not found"]
+    return missing
+
+
+def _id_clashes(spec, rows):
+    """Per-row errors for explicit ids held by a row with another natural key (one query per batch).
+
+    A natural-key upsert can't update such a row, and inserting would
+    violate the primary key.
+    """
+    if not spec.conflict_cols or spec.report_conflicts or "id" not in spec.table.c:
+        return {}
+    with_id = [(line, r) for line, r in rows if "id" in r]
+    if not with_id:
+        return {}
+    table = spec.table
+    owners = {row[0]: tuple(row[1:]) for row in db.session.execute(
+        db.select(table.c.id, *(table.c[c] for c in spec.conflict_cols))
+        .where(table.c.id.in_({r["id"] for _, r in with_id})))}
+    clashes = {}
+    for line, r in with_id:
+        key = tuple(r[c] for c in spec.conflict_cols)
+        # the first row of the batch to use a new id claims it
+        if owners.setdefault(r["id"], key) != key:
+            clashes[line] = {"id": [f"{table.name} {r['id']} already exists with another "
+                                    f"{', '.join(spec.conflict_cols)}"]}
+    return clashes
+
+
+def _load_rows(record_type, spec, batch, report):
+    """Validate a batch with the type's schema; returns [(line, row)] for the good ones."""
+    schema = spec.schema()
+    rows = []
+    for line, rec in batch:
+        # dump_only ids are accepted on import so exports round-trip
+        record_id = rec.pop("id", None)
+        for name in BOOKKEEPING_FIELDS:
+            rec.pop(name, None)
+        try:
+            row = schema.load(rec)
+            if record_id is not None:
+                row["id"] = int(record_id)
+        except ValidationError as e:
+            report.error(line, record_type, e.messages)
+            continue
+        except (TypeError, ValueError):
+            report.error(line, record_type, {"id": ["Not a valid integer."]})
+            continue
+        rows.append((line, row))
+    return rows
+
+
+def _write(spec, rows, conflict_cols):
+    columns = sorted({k for r in rows for k in r})
+    values = [{c: r.get(c) for c in columns} for r in rows]
+    if conflict_cols is None:
+        # hand the generated ids back so follow-up work (stats) can use them
+        result = db.session.execute(spec.table.insert().returning(spec.table.c.id, sort_by_parameter_order=True),
+                                    values)
+        for row, new_id in zip(rows, result.scalars()):
+            row["id"] = new_id
+    else:
+        update = None if spec.link else [c for c in columns if c not in conflict_cols and c != "id"]
+        upsert(spec.table, values, conflict_cols, update)
+
+
+def _insert_reporting_conflicts(record_type, spec, rows, report):
+    """INSERT ... ON CONFLICT DO NOTHING; rows the database skipped are reported. Returns the written rows."""
+    key = lambda r: tuple(r.get(c) for c in spec.conflict_cols)
+    unique, seen = [], set()
+    for line, r in rows:
+        k = key(r)
+        if None not in k and k in seen:
+            report.error(line, record_type,
+                         {"_schema": [f"duplicate of an earlier row ({', '.join(spec.conflict_cols)})"]})
+            continue
+        seen.add(k)
+        unique.append((line, r))
+    if not unique:
+        return []
+
+    columns = sorted({k for _, r in unique for k in r})
+    # no conflict target: skips a clash with any unique (or exclusion) constraint, id included
+    stmt = dialect_insert(spec.table).on_conflict_do_nothing() \
+        .returning(*(spec.table.c[c] for c in spec.conflict_cols), sort_by_parameter_order=True)
+    # inserted rows come back in parameter order, so walking both lists together
+    # pairs each one with its row; the rows in between were skipped
+    inserted = iter(db.session.execute(stmt, [{c: r.get(c) for c in columns} for _, r in unique]))
+    written = []
+    pending = next(inserted, None)
+    for line, r in unique:
+        if pending is not None and tuple(pending) == key(r):
+            written.append(r)
+            pending = next(inserted, None)
+        else:
+            report.error(line, record_type, {"_schema": [f"conflicts with an existing {record_type} "
+                                                         f"({', '.join(spec.conflict_cols)} or id)"]})
+    if any("id" in r for r in written):
+        sync_id_sequence(spec.table)
+    return written
+
+
+def _refresh_stats(record_type, rows):
+    """Core writes bypass the ORM flush hook, so update the aggregates here."""
+    if record_type == "season":
+        stats.refresh_shows({r["tvshow_id"] for r in rows})
+    elif record_type == "episode":
+        stats.refresh_seasons({r["season_id"] for r in rows})
+    elif record_type == "episode_actor":
+        episode_ids = {r["episode_id"] for r in rows}
+        stats.refresh_seasons(db.session.execute(
+            db.select(Episode.season_id).where(Episode.id.in_(episode_ids)).distinct()).scalars())
+    elif record_type == "show":
+        stats.refresh_shows({r["id"] for r in rows})
+
+
+def _write_rows(spec, rows):
+    """Upsert ``rows``; returns the rows written (duplicates within the batch collapsed)."""
+    # later rows win over earlier duplicates of the same key within a batch
+    if spec.conflict_cols:
+        rows = list({tuple(r[c] for c in spec.conflict_cols): r for r in rows}.values())
+        _write(spec, rows, spec.conflict_cols)
+        if any("id" in r for r in rows):
+            sync_id_sequence(spec.table)
+        return rows
+    with_id = list({r["id"]: r for r in rows if "id" in r}.values())
+    without_id = [r for r in rows if "id" not in r]
+    if with_id:
+        _write(spec, with_id, ["id"])
+        sync_id_sequence(spec.table)
+    if without_id:
+        _write(spec, without_id, None)
+    return with_id + without_id
+
+
+def _write_batch(record_type, batch, report):
+    spec = INGEST_TYPES[record_type]
+    rows = _load_rows(record_type, spec, batch, report)
+
+    missing = _missing_parents(spec, rows)
+    for line, errs in missing.items():
+        report.error(line, record_type, errs)
+    rows = [(line, r) for line, r in rows if line not in missing]
+    clashes = _id_clashes(spec, rows)
+    for line, errs in clashes.items():
+        report.error(line, record_type, errs)
+    rows = [(line, r) for line, r in rows if line not in clashes]
+    if spec.check and rows:
+        failed = spec.check(rows)
+        for line, errs in failed.items():
+            report.error(line, record_type, errs)
+        rows = [(line, r) for line, r in rows if line not in failed]
+
+    if spec.report_conflicts:
+        rows = _insert_reporting_conflicts(record_type, spec, rows, report)
+        cast_before = None
+    else:
+        rows = [r for _, r in rows]
+        # co-star counts are adjusted from the cast before and after the write
+        cast_before = costars.snapshot({r["episode_id"] for r in rows}) if record_type == "episode_actor" else None
+        rows = _write_rows(spec, rows)
+    _refresh_stats(record_type, rows)
+    if cast_before is not None:
+        costars.apply(cast_before)
+    if record_type == "screentime":
+        intervals.invalidate_episodes({r["episode_id"] for r in rows})
+
+    db.session.commit()
+    report.written[record_type] = report.written.get(record_type, 0) + len(rows)
+
+
+def ingest(records, batch_size=BATCH_SIZE):
+    """Import ``(line_no, type, record)`` tuples; returns an IngestReport.
+
+    Consecutive records of the same type are written together, so files
+    should list parents before children (shows, seasons, episodes, ...),
+    which is the order /api/tv/export produces.
+    """
+    report = IngestReport()
+    batch_type, batch = None, []
+    for line, record_type, record in records:
+        report.processed += 1
+        if isinstance(record, str):
+            report.error(line, record_type, {"_schema": [record]})
+            continue
+        if record_type not in INGEST_TYPES:
+            report.error(line, record_type, {"type": [f"must be one of: {', '.join(INGEST_TYPES)}"]})
+            continue
+        if batch and (record_type != batch_type or len(batch) >= batch_size):
+            _write_batch(batch_type, batch, report)
+            batch = []
+        batch_type = record_type
+        batch.append((line, record))
+    if batch:
+        _write_batch(batch_type, batch, report)
+    return report
@@ -0,0 +1,218 @@
+# instrumentation.py
+# Per-request timing and SQL accounting.
+#
+# Every request gets a RequestStats in ``g``. Engine events add each
+# statement's time and row count to it, conditional()'s build step and the
+# JSON provider add serialization time, and at teardown the totals go to
+# /metrics (labelled by endpoint).
+#
+# Optional diagnostics:
+#   INSTRUMENT_SLOW_REQUEST_MS  log requests slower than this, with their slowest SQL
+#   INSTRUMENT_N_PLUS_ONE       log requests that run one statement this many times
+#   INSTRUMENT_PROFILE_RATE     fraction of requests run under a profiler; profiles of
+#                               sampled requests that turn out slow go to INSTRUMENT_PROFILE_DIR
+import cProfile
+import os
+import random
+import time
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import metrics
+
+REQUESTS = metrics.Counter("http_requests_total", "Requests served.", ["endpoint", "method", "status"])
+DURATION = metrics.Histogram("http_request_duration_seconds", "Wall time per request.", ["endpoint"])
+DB_TIME = metrics.Histogram("http_request_db_seconds", "Time spent in SQL per request.", ["endpoint"])
+SERIALIZE_TIME = metrics.Histogram("http_request_serialize_seconds",
+                                   "Time spent dumping schemas / encoding JSON per request.", ["endpoint"])
+STATEMENTS = metrics.Histogram("http_request_sql_statements", "SQL statements per request.", ["endpoint"],
+                               buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250, 1000))
+ROWS = metrics.Histogram("http_request_sql_rows", "Rows returned/affected per request (as reported by the driver).",
+                         ["endpoint"], buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000, 50000))
+SLOW = metrics.Counter("http_slow_requests_total", "Requests over INSTRUMENT_SLOW_REQUEST_MS.", ["endpoint"])
+N_PLUS_ONE = metrics.Counter("http_n_plus_one_total", "Requests repeating one statement INSTRUMENT_N_PLUS_ONE times.",
+                             ["endpoint"])
+
+
+class RequestStats:
+    __slots__ = ("started", "db_time", "statements", "rows", "serialize_time", "serializing", "by_sql",
+                 "profiler", "status")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.serialize_time = 0.0
+        self.serializing = False
+        self.by_sql = {}  # statement text -> [count, seconds]
+        self.profiler = None
+        self.status = None
+
+
+def current_stats():
+    return g.get("request_stats") if has_request_context() else None
+
+
+@contextmanager
+def serializing():
+    """Count the enclosed block as serialization time for the current request."""
+    stats = current_stats()
+    if stats is None or stats.serializing:  # nested (schema dump -> jsonify) counts once
+        yield
+        return
+    stats.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialize_time += time.perf_counter() - start
+        stats.serializing = False
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with serializing():
+            return super().dumps(obj, **kwargs)
+
+
+# ---------- SQL ----------
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_stats() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    started = conn.info.get("query_started")
+    if stats is None or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats.db_time += elapsed
+    stats.statements += 1
+    # PostgreSQL reports SELECT row counts; SQLite only reports DML
+    if cursor.rowcount and cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+    entry = stats.by_sql.get(statement)
+    if entry is None:
+        stats.by_sql[statement] = [1, elapsed]
+    else:
+        entry[0] += 1
+        entry[1] += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _failed_cursor_execute(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+# ---------- request hooks ----------
+def _start_profiler(app):
+    kind = app.config["INSTRUMENT_PROFILER"]
+    if kind == "pyinstrument":
+        import pyinstrument  # optional dependency, only needed for this profiler
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        return profiler
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler is already active in this interpreter
+        return None
+    return profiler
+
+
+def _stop_profiler(profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+
+
+def _dump_profile(app, profiler, endpoint):
+    directory = app.config["INSTRUMENT_PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, "%s-%s-%d" % (time.strftime("%Y%m%d-%H%M%S"), endpoint, os.getpid()))
+    if isinstance(profiler, cProfile.Profile):
+        path = base + ".prof"  # python -m pstats / snakeviz
+        profiler.dump_stats(path)
+    else:
+        path = base + ".html"
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+    return path
+
+
+def _slowest_sql(stats, n=3):
+    worst = sorted(stats.by_sql.items(), key=lambda item: item[1][1], reverse=True)[:n]
+    return "\n".join("  %.1f ms x%d: %s" % (secs * 1000, count, " ".join(sql.split()))
+                     for sql, (count, secs) in worst)
+
+
+def init_app(app):
+    app.config.setdefault("INSTRUMENT_SLOW_REQUEST_MS", 0)
+    app.config.setdefault("INSTRUMENT_N_PLUS_ONE", 0)
+    app.config.setdefault("INSTRUMENT_PROFILE_RATE", 0.0)
+    app.config.setdefault("INSTRUMENT_PROFILER", "cprofile")
+    app.config.setdefault("INSTRUMENT_PROFILE_DIR", os.path.join(app.instance_path, "profiles"))
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _start_request():
+        g.request_stats = stats = RequestStats()
+        rate = app.config["INSTRUMENT_PROFILE_RATE"]
+        if rate and random.random() < rate:
+            stats.profiler = _start_profiler(app)
+
+    @app.after_request
+    def _record_status(response):
+        stats = current_stats()
+        if stats is not None:
+            stats.status = response.status_code
+            response.headers["Server-Timing"] = "db;dur=%.1f, sql;desc=\"%d statements\"" % (
+                stats.db_time * 1000, stats.statements)
+        return response
+
+    # teardown also covers streamed responses, which finish after after_request
+    @app.teardown_request
+    def _finish_request(exc):
+        stats = g.pop("request_stats", None)
+        if stats is None:
+            return
+        wall = time.perf_counter() - stats.started
+        if stats.profiler is not None:
+            _stop_profiler(stats.profiler)
+        endpoint = request.endpoint or "unmatched"
+        status = stats.status or (500 if exc is not None else 200)
+
+        REQUESTS.inc(endpoint, request.method, status)
+        DURATION.observe(wall, endpoint)
+        DB_TIME.observe(stats.db_time, endpoint)
+        SERIALIZE_TIME.observe(stats.serialize_time, endpoint)
+        STATEMENTS.observe(stats.statements, endpoint)
+        ROWS.observe(stats.rows, endpoint)
+
+        slow_ms = app.config["INSTRUMENT_SLOW_REQUEST_MS"]
+        if slow_ms and wall * 1000 >= slow_ms:
+            SLOW.inc(endpoint)
+            app.logger.warning(
+                "slow request %s %s: %.0f ms (db %.0f ms in %d statements, serialize %.0f ms)\n%s",
+                request.method, request.full_path, wall * 1000, stats.db_time * 1000, stats.statements,
+                stats.serialize_time * 1000, _slowest_sql(stats))
+            if stats.profiler is not None:
+                app.logger.warning("profile written to %s", _dump_profile(app, stats.profiler, endpoint))
+
+        repeat = app.config["INSTRUMENT_N_PLUS_ONE"]
+        if repeat:
+            repeated = [(sql, count) for sql, (count, _) in stats.by_sql.items() if count >= repeat]
+            if repeated:
+                N_PLUS_ONE.inc(endpoint)
+                for sql, count in repeated:
+                    app.logger.warning("possible N+1 in %s %s: statement ran %d times: %s",
+                                       request.method, request.full_path, count, " ".join(sql.split()))
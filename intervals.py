@@ -0,0 +1,289 @@
+# intervals.py
+# Interval lookups over screentime: who is on screen at a moment, and which
+# segments of one actor overlap.
+#
+# PostgreSQL: screentime.time_range is a generated tsrange [start, end) with
+# a GiST index on (episode_id, time_range), so both questions are index
+# probes (@> for a point, && for a range). With SCREENTIME_EXCLUDE_OVERLAPS
+# the API refuses segments of an actor that overlap their own, and on
+# PostgreSQL an exclusion constraint backs that up.
+# SQLite (dev/tests): an in-process interval tree per episode, built from
+# the episode's rows on first use and dropped when a flush in this process
+# touches them; writes from other processes show up once it is
+# _TREE_CACHE_TTL seconds old.
+# Rows without both times (or with end <= start) have no interval.
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+from sqlalchemy import event, inspect, select, text, and_
+from sqlalchemy.orm import Session, aliased
+from extensions import db
+from models import ScreenTime
+
+EXCLUSION_CONSTRAINT = "ex_screentime_actor_overlap"
+# a point t is on screen when start <= t < end, i.e. the interval overlaps [t, t + 1us)
+_INSTANT = timedelta(microseconds=1)
+_TREE_CACHE_SIZE = 256
+_TREE_CACHE_TTL = 5.0
+ROW_COLUMNS = (ScreenTime.id, ScreenTime.actor_id, ScreenTime.episode_id, ScreenTime.start_time,
+               ScreenTime.end_time, ScreenTime.role_name, ScreenTime.role_type)
+
+
+# ---------- schema ----------
+def pg_ddl():
+    return [
+        "CREATE EXTENSION IF NOT EXISTS btree_gist",
+        "ALTER TABLE screentime ADD COLUMN time_range tsrange GENERATED ALWAYS AS "
+        "(CASE WHEN start_time < end_time THEN tsrange(start_time, end_time, '[)') END) STORED",
+        "CREATE INDEX ix_screentime_time_range ON screentime USING gist (episode_id, time_range)",
+    ]
+
+
+def pg_exclusion_ddl(enable):
+    if enable:
+        return (f"ALTER TABLE screentime ADD CONSTRAINT {EXCLUSION_CONSTRAINT} "
+                f"EXCLUDE USING gist (episode_id WITH =, actor_id WITH =, time_range WITH &&)")
+    return f"ALTER TABLE screentime DROP CONSTRAINT IF EXISTS {EXCLUSION_CONSTRAINT}"
+
+
+@event.listens_for(db.metadata, "after_create")
+def _create_interval_schema(metadata, conn, **kw):
+    # create_all path; migrated databases get this from alembic
+    if conn.dialect.name == "postgresql":
+        for stmt in pg_ddl():
+            conn.exec_driver_sql(stmt)
+
+
+# ---------- interval tree ----------
+class IntervalTree:
+    """Static interval tree over half-open [start, end) intervals.
+
+    Intervals are kept sorted by start in an implicit balanced binary tree
+    (the middle of each index range is its root); every node also stores the
+    largest end in its subtree, so whole subtrees that end before the query
+    are skipped. Queries are O(log n + matches).
+    """
+
+    def __init__(self, intervals):
+        # intervals: iterable of (start, end, value)
+        self._items = sorted((i for i in intervals if i[0] < i[1]), key=lambda i: (i[0], i[1]))
+        self._max_end = [None] * len(self._items)
+        self._build(0, len(self._items))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        best = self._items[mid][1]
+        for child in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child is not None and child > best:
+                best = child
+        self._max_end[mid] = best
+        return best
+
+    def overlapping(self, start, end):
+        """Values of intervals overlapping [start, end), in start order."""
+        found = []
+        self._search(0, len(self._items), start, end, found)
+        return found
+
+    def at(self, point):
+        """Values of intervals containing ``point``."""
+        return self.overlapping(point, point + _INSTANT)
+
+    def _search(self, lo, hi, start, end, found):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] <= start:  # everything below ends before the query
+            return
+        self._search(lo, mid, start, end, found)
+        item_start, item_end, value = self._items[mid]
+        if item_start < end:  # the right subtree starts no earlier than this item
+            if item_end > start:
+                found.append(value)
+            self._search(mid + 1, hi, start, end, found)
+
+
+class _EpisodeTrees:
+    """LRU of per-episode IntervalTrees of (screentime id, actor id), each kept for at most ``ttl`` seconds."""
+
+    def __init__(self, size=_TREE_CACHE_SIZE, ttl=_TREE_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._trees = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conn, episode_id):
+        key = (str(conn.engine.url), episode_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._trees.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._trees.move_to_end(key)
+                return entry[0]
+        rows = conn.execute(
+            select(ScreenTime.start_time, ScreenTime.end_time, ScreenTime.id, ScreenTime.actor_id)
+            .where(ScreenTime.episode_id == episode_id, ScreenTime.start_time.isnot(None),
+                   ScreenTime.end_time.isnot(None))
+        )
+        tree = IntervalTree((start, end, (st_id, actor_id)) for start, end, st_id, actor_id in rows)
+        with self._lock:
+            self._trees[key] = (tree, now)
+            self._trees.move_to_end(key)
+            while len(self._trees) > self.size:
+                self._trees.popitem(last=False)
+        return tree
+
+    def invalidate(self, episode_ids):
+        episode_ids = set(episode_ids)
+        with self._lock:
+            for key in [k for k in self._trees if k[1] in episode_ids]:
+                del self._trees[key]
+
+    def clear(self):
+        with self._lock:
+            self._trees.clear()
+
+
+episode_trees = _EpisodeTrees()
+
+
+def invalidate_episodes(episode_ids):
+    """Drop cached trees after Core writes to these episodes' screentime (ORM writes are tracked)."""
+    episode_trees.invalidate(episode_ids)
+
+
+def invalidate_all():
+    """Drop every cached tree, e.g. after deleting episodes by a condition rather than by id."""
+    episode_trees.clear()
+
+
+@event.listens_for(Session, "after_flush")
+def _screentime_changed(session, flush_context):
+    touched = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, ScreenTime):
+            touched.add(obj.episode_id)
+            touched.update(v for v in inspect(obj).attrs.episode_id.history.deleted if v)
+    if touched:
+        episode_trees.invalidate(touched)
+
+
+# ---------- queries ----------
+def _rows(conn, ids):
+    """Full screentime rows for ``ids`` in start order."""
+    if not ids:
+        return []
+    return conn.execute(
+        select(*ROW_COLUMNS)
+        .where(ScreenTime.id.in_(ids))
+        .order_by(ScreenTime.start_time, ScreenTime.id)
+    ).all()
+
+
+def episode_origin(conn, episode_id):
+    """Earliest start time in an episode (its minute 0), or None."""
+    return conn.execute(select(db.func.min(ScreenTime.start_time))
+                        .where(ScreenTime.episode_id == episode_id)).scalar()
+
+
+def on_screen_at(conn, episode_id, point):
+    """Screentime rows of ``episode_id`` whose [start, end) contains ``point``."""
+    if conn.dialect.name == "postgresql":
+        return conn.execute(
+            select(*ROW_COLUMNS)
+            .where(ScreenTime.episode_id == episode_id,
+                   text("screentime.time_range @> CAST(:point AS timestamp)").bindparams(point=point))
+            .order_by(ScreenTime.start_time, ScreenTime.id)
+        ).all()
+    return _rows(conn, [st_id for st_id, _ in episode_trees.get(conn, episode_id).at(point)])
+
+
+def overlapping(conn, episode_id, start, end, actor_id=None, exclude_id=None):
+    """Screentime rows of ``episode_id`` (optionally one actor's) overlapping [start, end)."""
+    if conn.dialect.name == "postgresql":
+        stmt = select(*ROW_COLUMNS).where(
+            ScreenTime.episode_id == episode_id,
+            text("screentime.time_range && tsrange(CAST(:start AS timestamp), CAST(:end AS timestamp), '[)')")
+            .bindparams(start=start, end=end),
+        )
+        if actor_id is not None:
+            stmt = stmt.where(ScreenTime.actor_id == actor_id)
+        if exclude_id is not None:
+            stmt = stmt.where(ScreenTime.id != exclude_id)
+        return conn.execute(stmt.order_by(ScreenTime.start_time, ScreenTime.id)).all()
+    ids = [st_id for st_id, st_actor in episode_trees.get(conn, episode_id).overlapping(start, end)
+           if (actor_id is None or st_actor == actor_id) and st_id != exclude_id]
+    return _rows(conn, ids)
+
+
+def self_overlaps(conn, episode_id, actor_id=None):
+    """(first id, second id, actor id) for segments of the same actor that overlap within an episode."""
+    if conn.dialect.name == "postgresql":
+        a, b = aliased(ScreenTime, name="a"), aliased(ScreenTime, name="b")
+        stmt = (
+            select(a.id, b.id, a.actor_id)
+            .join(b, and_(b.episode_id == a.episode_id, b.actor_id == a.actor_id, b.id > a.id,
+                          text("a.time_range && b.time_range")))
+            .where(a.episode_id == episode_id)
+            .order_by(a.id, b.id)
+        )
+        if actor_id is not None:
+            stmt = stmt.where(a.actor_id == actor_id)
+        return [tuple(r) for r in conn.execute(stmt)]
+    tree = episode_trees.get(conn, episode_id)
+    pairs = []
+    for start, end, (st_id, st_actor) in tree:
+        if actor_id is not None and st_actor != actor_id:
+            continue
+        pairs += [(st_id, other, st_actor) for other, other_actor in tree.overlapping(start, end)
+                  if other_actor == st_actor and other > st_id]
+    return sorted(pairs)
+
+
+def batch_overlaps(conn, segments, chunk=500):
+    """Which of a batch of new segments would overlap the same actor's screentime.
+
+    ``segments`` are (key, episode_id, actor_id, start, end). Existing rows of
+    the batch's episodes are read with one query per ``chunk`` episodes.
+    Returns {key: ids of the existing rows it overlaps}; an empty list means it
+    overlaps an earlier-starting segment of the same batch instead.
+    """
+    groups = defaultdict(list)
+    for seg in segments:
+        if seg[3] is not None and seg[4] is not None and seg[3] < seg[4]:
+            groups[(seg[1], seg[2])].append(seg)
+    if not groups:
+        return {}
+    existing = defaultdict(list)
+    episode_ids = sorted({episode_id for episode_id, _ in groups})
+    for i in range(0, len(episode_ids), chunk):
+        rows = conn.execute(
+            select(ScreenTime.episode_id, ScreenTime.actor_id, ScreenTime.start_time, ScreenTime.end_time,
+                   ScreenTime.id)
+            .where(ScreenTime.episode_id.in_(episode_ids[i:i + chunk]), ScreenTime.start_time.isnot(None),
+                   ScreenTime.end_time.isnot(None))
+        )
+        for episode_id, actor_id, start, end, st_id in rows:
+            if (episode_id, actor_id) in groups:
+                existing[(episode_id, actor_id)].append((start, end, st_id))
+
+    clashes = {}
+    for group, segs in groups.items():
+        tree = IntervalTree(existing.get(group, ()))
+        accepted_end = None  # latest end among the accepted segments, which are taken in start order
+        for key, _, _, start, end in sorted(segs, key=lambda seg: (seg[3], seg[4])):
+            hits = tree.overlapping(start, end)
+            if hits or (accepted_end is not None and start < accepted_end):
+                clashes[key] = hits
+                continue
+            accepted_end = end if accepted_end is None else max(accepted_end, end)
+    return clashes
@@ -0,0 +1,63 @@
+"""add foreign-key lookup, sort and name-search indexes
+
+season.tvshow_id, episode.season_id, episode_crew.episode_id,
+screentime.actor_id and user.username are already the leading column of a
+unique constraint (or the primary key), so they need no extra index.
+
+Revision ID: 3c5e2a9d41f7
+Revises: 8ef941b29d3e
+Create Date: 2025-12-02 10:14:51.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c5e2a9d41f7'
+down_revision = '8ef941b29d3e'
+branch_labels = None
+depends_on = None
+
+# (index name, table, column)
+TRIGRAM_INDEXES = [
+    ('ix_tvshow_title_trgm', 'tvshow', 'title'),
+    ('ix_actor_first_name_trgm', 'actor', 'first_name'),
+    ('ix_actor_last_name_trgm', 'actor', 'last_name'),
+    ('ix_crew_first_name_trgm', 'crew', 'first_name'),
+    ('ix_crew_last_name_trgm', 'crew', 'last_name'),
+]
+
+
+def upgrade():
+    # reverse / foreign-key lookups
+    op.create_index('ix_episode_actors_actor_id', 'episode_actors', ['actor_id'])
+    op.create_index('ix_episode_crew_crew_id', 'episode_crew', ['crew_id'])
+    op.create_index('ix_screentime_episode_id', 'screentime', ['episode_id'])
+
+    # keyset pagination sort keys
+    op.create_index('ix_tvshow_title_id', 'tvshow', ['title', 'id'])
+    op.create_index('ix_actor_name', 'actor', ['first_name', sa.text("coalesce(last_name, '')"), 'id'])
+    op.create_index('ix_crew_name', 'crew',
+                    [sa.text("coalesce(first_name, '')"), sa.text("coalesce(last_name, '')"), 'id'])
+    op.create_index('ix_crew_role_lower', 'crew', [sa.text('lower(person_definition)')])
+
+    # substring name search (lower(col) LIKE '%q%') on PostgreSQL
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, table, column in TRIGRAM_INDEXES:
+            op.execute(f'CREATE INDEX {name} ON {table} USING gin (lower({column}) gin_trgm_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for name, table, column in TRIGRAM_INDEXES:
+            op.drop_index(name, table_name=table)
+
+    op.drop_index('ix_crew_role_lower', table_name='crew')
+    op.drop_index('ix_crew_name', table_name='crew')
+    op.drop_index('ix_actor_name', table_name='actor')
+    op.drop_index('ix_tvshow_title_id', table_name='tvshow')
+    op.drop_index('ix_screentime_episode_id', table_name='screentime')
+    op.drop_index('ix_episode_crew_crew_id', table_name='episode_crew')
+    op.drop_index('ix_episode_actors_actor_id', table_name='episode_actors')
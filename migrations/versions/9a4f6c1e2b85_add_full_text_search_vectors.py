@@ -0,0 +1,47 @@
+"""add full-text search vectors
+
+PostgreSQL only: generated tsvector columns with GIN indexes on tvshow,
+episode, actor and crew. SQLite dev databases build their FTS5 index on
+the first search instead (see search.py).
+
+Revision ID: 9a4f6c1e2b85
+Revises: 3c5e2a9d41f7
+Create Date: 2025-12-04 16:42:08.551930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4f6c1e2b85'
+down_revision = '3c5e2a9d41f7'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTORS = {
+    'tvshow': "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+              "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+    'episode': "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+               "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+    'actor': "setweight(to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '')), 'A')",
+    'crew': "setweight(to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(person_definition, '')), 'B')",
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, vector in SEARCH_VECTORS.items():
+        op.execute(f'ALTER TABLE {table} ADD COLUMN search_vector tsvector '
+                   f'GENERATED ALWAYS AS ({vector}) STORED')
+        op.execute(f'CREATE INDEX ix_{table}_search_vector ON {table} USING gin (search_vector)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in SEARCH_VECTORS:
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.drop_column(table, 'search_vector')
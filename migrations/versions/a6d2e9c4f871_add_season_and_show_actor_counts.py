@@ -0,0 +1,66 @@
+"""add season_actor / show_actor appearance counts
+
+stats.py keeps season_stats / show_stats up to date with deltas; the
+distinct-actor totals can't be adjusted without knowing whether an actor
+still appears elsewhere in the season or show, so these tables count each
+actor's episodes there and actor_count is their number of rows.
+
+Revision ID: a6d2e9c4f871
+Revises: f3c9d2a7b614
+Create Date: 2026-01-12 10:48:51.203617
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d2e9c4f871'
+down_revision = 'f3c9d2a7b614'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('season_actor',
+    sa.Column('season_id', sa.Integer(), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=False),
+    sa.Column('appearances', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['season_id'], ['season.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['actor_id'], ['actor.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('season_id', 'actor_id')
+    )
+    op.create_index('ix_season_actor_actor_id', 'season_actor', ['actor_id'])
+    op.create_table('show_actor',
+    sa.Column('tvshow_id', sa.Integer(), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=False),
+    sa.Column('appearances', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['tvshow_id'], ['tvshow.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['actor_id'], ['actor.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('tvshow_id', 'actor_id')
+    )
+    op.create_index('ix_show_actor_actor_id', 'show_actor', ['actor_id'])
+
+    # backfill existing catalog (soft-deleted shows have no show_stats, so no show_actor either)
+    op.execute("""
+        INSERT INTO season_actor (season_id, actor_id, appearances)
+        SELECT e.season_id, ea.actor_id, count(*)
+        FROM episode e JOIN episode_actors ea ON ea.episode_id = e.id
+        GROUP BY e.season_id, ea.actor_id
+    """)
+    op.execute("""
+        INSERT INTO show_actor (tvshow_id, actor_id, appearances)
+        SELECT s.tvshow_id, sa.actor_id, sum(sa.appearances)
+        FROM season_actor sa
+        JOIN season s ON s.id = sa.season_id
+        JOIN tvshow t ON t.id = s.tvshow_id
+        WHERE t.deleted_at IS NULL
+        GROUP BY s.tvshow_id, sa.actor_id
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_show_actor_actor_id', table_name='show_actor')
+    op.drop_table('show_actor')
+    op.drop_index('ix_season_actor_actor_id', table_name='season_actor')
+    op.drop_table('season_actor')
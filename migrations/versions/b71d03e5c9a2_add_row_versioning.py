@@ -0,0 +1,40 @@
+"""add updated_at and version columns to tvshow, season and episode
+
+Columns are added nullable and backfilled so the migration works on SQLite
+without rebuilding the tables (which would drop the search triggers);
+PostgreSQL then gets the NOT NULL constraints.
+
+Revision ID: b71d03e5c9a2
+Revises: 9a4f6c1e2b85
+Create Date: 2025-12-08 11:05:37.914402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71d03e5c9a2'
+down_revision = '9a4f6c1e2b85'
+branch_labels = None
+depends_on = None
+
+TABLES = ('tvshow', 'season', 'episode')
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=True))
+        op.execute(f'UPDATE {table} SET updated_at = CURRENT_TIMESTAMP, version = 1')
+        if postgres:
+            op.alter_column(table, 'updated_at', nullable=False)
+            op.alter_column(table, 'version', nullable=False)
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('version')
+            batch_op.drop_column('updated_at')
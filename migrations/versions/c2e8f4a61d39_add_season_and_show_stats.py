@@ -0,0 +1,77 @@
+"""add season_stats and show_stats aggregate tables
+
+Revision ID: c2e8f4a61d39
+Revises: b71d03e5c9a2
+Create Date: 2025-12-10 09:31:22.476019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e8f4a61d39'
+down_revision = 'b71d03e5c9a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('season_stats',
+    sa.Column('season_id', sa.Integer(), nullable=False),
+    sa.Column('episode_count', sa.Integer(), nullable=False),
+    sa.Column('rated_episode_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('first_air_date', sa.Date(), nullable=True),
+    sa.Column('last_air_date', sa.Date(), nullable=True),
+    sa.Column('actor_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['season_id'], ['season.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('season_id')
+    )
+    op.create_table('show_stats',
+    sa.Column('tvshow_id', sa.Integer(), nullable=False),
+    sa.Column('season_count', sa.Integer(), nullable=False),
+    sa.Column('episode_count', sa.Integer(), nullable=False),
+    sa.Column('rated_episode_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('first_air_date', sa.Date(), nullable=True),
+    sa.Column('last_air_date', sa.Date(), nullable=True),
+    sa.Column('actor_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['tvshow_id'], ['tvshow.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('tvshow_id')
+    )
+
+    # backfill existing catalog
+    op.execute("""
+        INSERT INTO season_stats (season_id, episode_count, rated_episode_count, rating_sum,
+                                  first_air_date, last_air_date, actor_count, updated_at)
+        SELECT s.id, count(e.id), count(e.rating), coalesce(sum(e.rating), 0),
+               min(e.date_published), max(e.date_published),
+               (SELECT count(DISTINCT ea.actor_id) FROM episode e2
+                  JOIN episode_actors ea ON ea.episode_id = e2.id WHERE e2.season_id = s.id),
+               CURRENT_TIMESTAMP
+        FROM season s LEFT JOIN episode e ON e.season_id = s.id
+        GROUP BY s.id
+    """)
+    op.execute("""
+        INSERT INTO show_stats (tvshow_id, season_count, episode_count, rated_episode_count, rating_sum,
+                                first_air_date, last_air_date, actor_count, updated_at)
+        SELECT t.id, count(ss.season_id), coalesce(sum(ss.episode_count), 0),
+               coalesce(sum(ss.rated_episode_count), 0), coalesce(sum(ss.rating_sum), 0),
+               min(ss.first_air_date), max(ss.last_air_date),
+               (SELECT count(DISTINCT ea.actor_id) FROM season s2
+                  JOIN episode e ON e.season_id = s2.id
+                  JOIN episode_actors ea ON ea.episode_id = e.id WHERE s2.tvshow_id = t.id),
+               CURRENT_TIMESTAMP
+        FROM tvshow t
+        LEFT JOIN season s ON s.tvshow_id = t.id
+        LEFT JOIN season_stats ss ON ss.season_id = s.id
+        GROUP BY t.id
+    """)
+
+
+def downgrade():
+    op.drop_table('show_stats')
+    op.drop_table('season_stats')
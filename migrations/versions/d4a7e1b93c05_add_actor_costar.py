@@ -0,0 +1,45 @@
+"""add actor_costar co-appearance table
+
+Revision ID: d4a7e1b93c05
+Revises: c2e8f4a61d39
+Create Date: 2025-12-12 14:22:08.631590
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7e1b93c05'
+down_revision = 'c2e8f4a61d39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('actor_costar',
+    sa.Column('actor_id', sa.Integer(), nullable=False),
+    sa.Column('costar_id', sa.Integer(), nullable=False),
+    sa.Column('episode_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['actor_id'], ['actor.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['costar_id'], ['actor.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('actor_id', 'costar_id')
+    )
+    op.create_index('ix_actor_costar_costar_id', 'actor_costar', ['costar_id'])
+    op.create_index('ix_actor_costar_top', 'actor_costar',
+                    ['actor_id', sa.text('episode_count DESC'), 'costar_id'])
+
+    # backfill existing catalog
+    op.execute("""
+        INSERT INTO actor_costar (actor_id, costar_id, episode_count)
+        SELECT a.actor_id, b.actor_id, count(*)
+        FROM episode_actors a
+        JOIN episode_actors b ON b.episode_id = a.episode_id AND b.actor_id != a.actor_id
+        GROUP BY a.actor_id, b.actor_id
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_actor_costar_top', table_name='actor_costar')
+    op.drop_index('ix_actor_costar_costar_id', table_name='actor_costar')
+    op.drop_table('actor_costar')
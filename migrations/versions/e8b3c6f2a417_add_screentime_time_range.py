@@ -0,0 +1,44 @@
+"""add screentime time_range with a GiST index
+
+PostgreSQL only: a generated tsrange [start_time, end_time) column and a
+GiST index on (episode_id, time_range) via btree_gist. With
+SCREENTIME_EXCLUDE_OVERLAPS=1 in the environment an exclusion constraint
+also rejects overlapping segments of the same actor in an episode (existing
+overlaps must be fixed first; `flask screentime-exclusion` toggles it later).
+SQLite dev databases use the in-process interval tree in intervals.py.
+
+Revision ID: e8b3c6f2a417
+Revises: d4a7e1b93c05
+Create Date: 2025-12-15 10:48:53.204117
+
+"""
+import os
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b3c6f2a417'
+down_revision = 'd4a7e1b93c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute("ALTER TABLE screentime ADD COLUMN time_range tsrange GENERATED ALWAYS AS "
+               "(CASE WHEN start_time < end_time THEN tsrange(start_time, end_time, '[)') END) STORED")
+    op.execute('CREATE INDEX ix_screentime_time_range ON screentime USING gist (episode_id, time_range)')
+    if os.getenv('SCREENTIME_EXCLUDE_OVERLAPS', '0') == '1':
+        op.execute('ALTER TABLE screentime ADD CONSTRAINT ex_screentime_actor_overlap '
+                   'EXCLUDE USING gist (episode_id WITH =, actor_id WITH =, time_range WITH &&)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('ALTER TABLE screentime DROP CONSTRAINT IF EXISTS ex_screentime_actor_overlap')
+    op.drop_index('ix_screentime_time_range', table_name='screentime')
+    op.drop_column('screentime', 'time_range')
@@ -0,0 +1,57 @@
+"""ON DELETE CASCADE on the catalog foreign keys; tvshow.deleted_at
+
+Deleting a show, season or episode no longer goes through the ORM cascade
+(see deletion.py): the database removes the child rows. SQLite can't alter
+a foreign key in place and doesn't enforce them by default anyway, so there
+deletion.py deletes the children itself and only the new column is added.
+
+Revision ID: f3c9d2a7b614
+Revises: e8b3c6f2a417
+Create Date: 2026-01-08 14:22:37.918344
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c9d2a7b614'
+down_revision = 'e8b3c6f2a417'
+branch_labels = None
+depends_on = None
+
+# (table, column, referenced table); created unnamed, so PostgreSQL named them <table>_<column>_fkey
+FOREIGN_KEYS = [
+    ('season', 'tvshow_id', 'tvshow'),
+    ('episode', 'season_id', 'season'),
+    ('episode_actors', 'episode_id', 'episode'),
+    ('episode_actors', 'actor_id', 'actor'),
+    ('episode_crew', 'episode_id', 'episode'),
+    ('episode_crew', 'crew_id', 'crew'),
+    ('screentime', 'episode_id', 'episode'),
+    ('screentime', 'actor_id', 'actor'),
+]
+
+
+def _recreate_foreign_keys(ondelete):
+    for table, column, referent in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referent, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    op.add_column('tvshow', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_tvshow_deleted_at', 'tvshow', ['deleted_at'],
+                    postgresql_where=sa.text('deleted_at IS NOT NULL'),
+                    sqlite_where=sa.text('deleted_at IS NOT NULL'))
+    if op.get_bind().dialect.name == 'postgresql':
+        _recreate_foreign_keys('CASCADE')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        _recreate_foreign_keys(None)
+    op.drop_index('ix_tvshow_deleted_at', table_name='tvshow')
+    with op.batch_alter_table('tvshow', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
@@ -1,10 +1,16 @@
 from datetime import datetime
+from flask import current_app, has_app_context
 from extensions import db
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # -------------------------
 # User model (auth)
 # -------------------------
+def password_hash_method():
+    # werkzeug method string, e.g. "scrypt" or "pbkdf2:sha256:600000" (see passwords.py)
+    return current_app.config.get("PASSWORD_HASH_METHOD", "scrypt") if has_app_context() else "scrypt"
+
+
 class User(db.Model):
     __tablename__ = "user"
 
@@ -16,7 +22,7 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     def set_password(self, pw: str) -> None:
-        self.password_hash = generate_password_hash(pw)
+        self.password_hash = generate_password_hash(pw, method=password_hash_method())
 
     def check_password(self, pw: str) -> bool:
         return check_password_hash(self.password_hash, pw)
@@ -29,8 +35,24 @@ class User(db.Model):
 # -------------------------
 episode_actors = db.Table(
     "episode_actors",
-    db.Column("episode_id", db.Integer, db.ForeignKey("episode.id"), primary_key=True),
-    db.Column("actor_id", db.Integer, db.ForeignKey("actor.id"), primary_key=True)
+    db.Column("episode_id", db.Integer, db.ForeignKey("episode.id", ondelete="CASCADE"), primary_key=True),
+    db.Column("actor_id", db.Integer, db.ForeignKey("actor.id", ondelete="CASCADE"), primary_key=True),
+    # the PK covers episode -> actors; this covers actor -> episodes
+    db.Index("ix_episode_actors_actor_id", "actor_id"),
+)
+
+def trigram_index(name, column):
+    """GIN trigram index on lower(column) for substring search; PostgreSQL only."""
+    return db.Index(
+        name, db.func.lower(column).label("lower_value"),
+        postgresql_using="gin", postgresql_ops={"lower_value": "gin_trgm_ops"},
+    ).ddl_if(dialect="postgresql")
+
+# pg_trgm must exist before the trigram indexes are created (create_all path;
+# migrations create it explicitly)
+db.event.listen(
+    db.metadata, "before_create",
+    db.DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
 )
 
 # -------------------------
@@ -42,8 +64,23 @@ class TVShow(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(128), nullable=False)
     description = db.Column(db.String(200), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    version = db.Column(db.Integer, default=1, server_default="1", nullable=False)
+
+    # set by a soft delete (deletion.py); the row goes once the purge has removed its seasons
+    deleted_at = db.Column(db.DateTime, nullable=True)
 
-    seasons = db.relationship("Season", back_populates="tvshow", cascade="all, delete-orphan", lazy="select")
+    # passive_deletes: children go by ON DELETE CASCADE (or deletion.py), never loaded just to be deleted
+    seasons = db.relationship("Season", back_populates="tvshow", cascade="all, delete-orphan", passive_deletes=True,
+                              lazy="select", order_by="Season.season_number")
+
+    __table_args__ = (
+        db.Index("ix_tvshow_title_id", "title", "id"),
+        trigram_index("ix_tvshow_title_trgm", title),
+        db.Index("ix_tvshow_deleted_at", deleted_at, postgresql_where=deleted_at.isnot(None),
+                 sqlite_where=deleted_at.isnot(None)),
+    )
+    __mapper_args__ = {"version_id_col": version}
 
     def __repr__(self) -> str:
         return f"<TVShow {self.title}>"
@@ -52,17 +89,23 @@ class Season(db.Model):
     __tablename__ = "season"
 
     id = db.Column(db.Integer, primary_key=True)
-    tvshow_id = db.Column(db.Integer, db.ForeignKey("tvshow.id"), nullable=False)
+    tvshow_id = db.Column(db.Integer, db.ForeignKey("tvshow.id", ondelete="CASCADE"), nullable=False)
     season_number = db.Column(db.Integer, nullable=False)
     season_description = db.Column(db.String(200), nullable=True)
     date_started = db.Column(db.Date, nullable=True)
     date_ended = db.Column(db.Date, nullable=True)
     title = db.Column(db.String(128), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    version = db.Column(db.Integer, default=1, server_default="1", nullable=False)
 
     tvshow = db.relationship("TVShow", back_populates="seasons", lazy="joined")
-    episodes = db.relationship("Episode", back_populates="season", cascade="all, delete-orphan", lazy="select")
+    episodes = db.relationship("Episode", back_populates="season", cascade="all, delete-orphan", passive_deletes=True,
+                               lazy="select", order_by="Episode.episode_number")
+    # maintained by stats.py; read-only from the ORM's point of view
+    stats = db.relationship("SeasonStats", uselist=False, lazy="select", viewonly=True)
 
     __table_args__ = (db.UniqueConstraint("tvshow_id", "season_number", name="uq_tv_season"),)
+    __mapper_args__ = {"version_id_col": version}
 
     def __repr__(self) -> str:
         return f"<Season {self.season_number} of tvshow {self.tvshow_id}>"
@@ -71,19 +114,25 @@ class Episode(db.Model):
     __tablename__ = "episode"
 
     id = db.Column(db.Integer, primary_key=True)
-    season_id = db.Column(db.Integer, db.ForeignKey("season.id"), nullable=False)
+    season_id = db.Column(db.Integer, db.ForeignKey("season.id", ondelete="CASCADE"), nullable=False)
     episode_number = db.Column(db.Integer, nullable=False)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=True)
     rating = db.Column(db.Integer, nullable=True)
     date_published = db.Column(db.Date, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    version = db.Column(db.Integer, default=1, server_default="1", nullable=False)
 
     season = db.relationship("Season", back_populates="episodes", lazy="joined")
-    screentimes = db.relationship("ScreenTime", back_populates="episode", cascade="all, delete-orphan", lazy="select")
-    crews = db.relationship("EpisodeCrew", back_populates="episode", cascade="all, delete-orphan", lazy="select")
-    actors = db.relationship("Actor", secondary=episode_actors, back_populates="episodes")
+    screentimes = db.relationship("ScreenTime", back_populates="episode", cascade="all, delete-orphan",
+                                  passive_deletes=True, lazy="select")
+    crews = db.relationship("EpisodeCrew", back_populates="episode", cascade="all, delete-orphan",
+                            passive_deletes=True, lazy="select")
+    actors = db.relationship("Actor", secondary=episode_actors, back_populates="episodes",
+                             passive_deletes=True)
 
     __table_args__ = (db.UniqueConstraint("season_id", "episode_number", name="uq_season_episode"),)
+    __mapper_args__ = {"version_id_col": version}
 
     def __repr__(self) -> str:
         return f"<Episode S{self.season_id}-E{self.episode_number}>"
@@ -99,7 +148,15 @@ class Crew(db.Model):
     last_name = db.Column(db.String(128), nullable=True)
     person_definition = db.Column(db.String(128), nullable=True)
 
-    episode_crews = db.relationship("EpisodeCrew", back_populates="crew", cascade="all, delete-orphan", lazy="select")
+    episode_crews = db.relationship("EpisodeCrew", back_populates="crew", cascade="all, delete-orphan",
+                                    passive_deletes=True, lazy="select")
+
+    __table_args__ = (
+        db.Index("ix_crew_name", db.func.coalesce(first_name, ""), db.func.coalesce(last_name, ""), "id"),
+        db.Index("ix_crew_role_lower", db.func.lower(person_definition)),
+        trigram_index("ix_crew_first_name_trgm", first_name),
+        trigram_index("ix_crew_last_name_trgm", last_name),
+    )
 
     def __repr__(self) -> str:
         return f"<Crew {self.first_name} {self.last_name}>"
@@ -108,8 +165,8 @@ class EpisodeCrew(db.Model):
     __tablename__ = "episode_crew"
 
     id = db.Column(db.Integer, primary_key=True)
-    episode_id = db.Column(db.Integer, db.ForeignKey("episode.id"), nullable=False)
-    crew_id = db.Column(db.Integer, db.ForeignKey("crew.id"), nullable=False)
+    episode_id = db.Column(db.Integer, db.ForeignKey("episode.id", ondelete="CASCADE"), nullable=False)
+    crew_id = db.Column(db.Integer, db.ForeignKey("crew.id", ondelete="CASCADE"), nullable=False, index=True)
 
     episode = db.relationship("Episode", back_populates="crews", lazy="joined")
     crew = db.relationship("Crew", back_populates="episode_crews", lazy="joined")
@@ -126,8 +183,16 @@ class Actor(db.Model):
     first_name = db.Column(db.String(128), nullable=False)
     last_name = db.Column(db.String(128), nullable=True)
 
-    screentimes = db.relationship("ScreenTime", back_populates="actor", cascade="all, delete-orphan", lazy="select")
-    episodes = db.relationship("Episode", secondary=episode_actors, back_populates="actors")
+    screentimes = db.relationship("ScreenTime", back_populates="actor", cascade="all, delete-orphan",
+                                  passive_deletes=True, lazy="select")
+    episodes = db.relationship("Episode", secondary=episode_actors, back_populates="actors",
+                             passive_deletes=True)
+
+    __table_args__ = (
+        db.Index("ix_actor_name", "first_name", db.func.coalesce(last_name, ""), "id"),
+        trigram_index("ix_actor_first_name_trgm", first_name),
+        trigram_index("ix_actor_last_name_trgm", last_name),
+    )
 
     def __repr__(self) -> str:
         return f"<Actor {self.first_name} {self.last_name}>"
@@ -136,8 +201,8 @@ class ScreenTime(db.Model):
     __tablename__ = "screentime"
 
     id = db.Column(db.Integer, primary_key=True)
-    actor_id = db.Column(db.Integer, db.ForeignKey("actor.id"), nullable=False)
-    episode_id = db.Column(db.Integer, db.ForeignKey("episode.id"), nullable=False)
+    actor_id = db.Column(db.Integer, db.ForeignKey("actor.id", ondelete="CASCADE"), nullable=False)
+    episode_id = db.Column(db.Integer, db.ForeignKey("episode.id", ondelete="CASCADE"), nullable=False, index=True)
     start_time = db.Column(db.DateTime, nullable=True)
     end_time = db.Column(db.DateTime, nullable=True)
     role_name = db.Column(db.String(128), nullable=True)
@@ -149,4 +214,86 @@ class ScreenTime(db.Model):
     __table_args__ = (db.UniqueConstraint("actor_id", "episode_id", "start_time", name="uq_actor_episode_time"),)
 
     def __repr__(self) -> str:
-        return f"<ScreenTime actor={self.actor_id} episode={self.episode_id}>"
\ No newline at end of file
+        return f"<ScreenTime actor={self.actor_id} episode={self.episode_id}>"
+
+# -------------------------
+# Denormalized aggregates (maintained by stats.py)
+# -------------------------
+class SeasonStats(db.Model):
+    __tablename__ = "season_stats"
+
+    season_id = db.Column(db.Integer, db.ForeignKey("season.id", ondelete="CASCADE"), primary_key=True)
+    episode_count = db.Column(db.Integer, default=0, nullable=False)
+    rated_episode_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    first_air_date = db.Column(db.Date, nullable=True)
+    last_air_date = db.Column(db.Date, nullable=True)
+    actor_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    @property
+    def avg_rating(self):
+        return self.rating_sum / self.rated_episode_count if self.rated_episode_count else None
+
+    def __repr__(self) -> str:
+        return f"<SeasonStats season={self.season_id} episodes={self.episode_count}>"
+
+class ShowStats(db.Model):
+    __tablename__ = "show_stats"
+
+    tvshow_id = db.Column(db.Integer, db.ForeignKey("tvshow.id", ondelete="CASCADE"), primary_key=True)
+    season_count = db.Column(db.Integer, default=0, nullable=False)
+    episode_count = db.Column(db.Integer, default=0, nullable=False)
+    rated_episode_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    first_air_date = db.Column(db.Date, nullable=True)
+    last_air_date = db.Column(db.Date, nullable=True)
+    actor_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    @property
+    def avg_rating(self):
+        return self.rating_sum / self.rated_episode_count if self.rated_episode_count else None
+
+    def __repr__(self) -> str:
+        return f"<ShowStats tvshow={self.tvshow_id} episodes={self.episode_count}>"
+
+class SeasonActor(db.Model):
+    """How many episodes of a season an actor appears in; actor_count is its number of rows."""
+    __tablename__ = "season_actor"
+
+    season_id = db.Column(db.Integer, db.ForeignKey("season.id", ondelete="CASCADE"), primary_key=True)
+    actor_id = db.Column(db.Integer, db.ForeignKey("actor.id", ondelete="CASCADE"), primary_key=True, index=True)
+    appearances = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<SeasonActor season={self.season_id} actor={self.actor_id} x{self.appearances}>"
+
+class ShowActor(db.Model):
+    """How many episodes of a show an actor appears in; actor_count is its number of rows."""
+    __tablename__ = "show_actor"
+
+    tvshow_id = db.Column(db.Integer, db.ForeignKey("tvshow.id", ondelete="CASCADE"), primary_key=True)
+    actor_id = db.Column(db.Integer, db.ForeignKey("actor.id", ondelete="CASCADE"), primary_key=True, index=True)
+    appearances = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<ShowActor tvshow={self.tvshow_id} actor={self.actor_id} x{self.appearances}>"
+
+# -------------------------
+# Co-appearance adjacency (maintained by costars.py)
+# -------------------------
+class ActorCostar(db.Model):
+    """How many episodes two actors share; stored in both directions."""
+    __tablename__ = "actor_costar"
+
+    actor_id = db.Column(db.Integer, db.ForeignKey("actor.id", ondelete="CASCADE"), primary_key=True)
+    costar_id = db.Column(db.Integer, db.ForeignKey("actor.id", ondelete="CASCADE"), primary_key=True,
+                          index=True)
+    episode_count = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<ActorCostar {self.actor_id}-{self.costar_id} x{self.episode_count}>"
+
+# top-k co-stars of an actor is a range scan of this index
+db.Index("ix_actor_costar_top", ActorCostar.actor_id, ActorCostar.episode_count.desc(), ActorCostar.costar_id)
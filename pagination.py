@@ -0,0 +1,80 @@
+# pagination.py
+# Keyset (cursor) pagination shared by the API and UI listings.
+#
+# Pages are fetched with "WHERE (sort_cols) > (last_row_values) ORDER BY
+# sort_cols LIMIT n", so page N costs the same as page 1. Every sort key
+# ends in the primary key to make the ordering total. The cursor handed to
+# clients is an opaque base64 blob; it embeds the sort/order it was issued
+# for and is rejected if reused with different ones.
+import base64
+import binascii
+import json
+from flask import current_app
+from sqlalchemy import tuple_
+from extensions import db
+
+
+class PageRequestError(ValueError):
+    """Raised for a bad limit/sort/order/cursor query parameter."""
+
+
+def encode_cursor(sort, order, values):
+    raw = json.dumps([sort, order, list(values)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort, order, width):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        c_sort, c_order, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError):
+        raise PageRequestError("invalid cursor")
+    if c_sort != sort or c_order != order or not isinstance(values, list) or len(values) != width:
+        raise PageRequestError("cursor does not match sort/order")
+    return values
+
+
+def page_limit(args):
+    default = current_app.config["PAGE_SIZE"]
+    maximum = current_app.config["MAX_PAGE_SIZE"]
+    try:
+        limit = int(args.get("limit", default))
+    except (TypeError, ValueError):
+        raise PageRequestError("limit must be an integer")
+    if limit < 1:
+        raise PageRequestError("limit must be >= 1")
+    return min(limit, maximum)
+
+
+def keyset_page(stmt, sorts, args, session=None):
+    """Run one page of ``stmt`` (a ``select(Model)``) and return (rows, next_cursor).
+
+    ``sorts`` maps sort names to a list of column expressions; the first
+    entry is the default and every list must end with the primary key.
+    Recognised args: ``limit``, ``cursor``, ``sort`` and ``order`` (asc/desc).
+    Runs on ``db.session`` unless another Session is passed.
+    """
+    sort = args.get("sort") or next(iter(sorts))
+    if sort not in sorts:
+        raise PageRequestError(f"sort must be one of: {', '.join(sorts)}")
+    order = (args.get("order") or "asc").lower()
+    if order not in ("asc", "desc"):
+        raise PageRequestError("order must be asc or desc")
+    limit = page_limit(args)
+    cols = sorts[sort]
+
+    cursor = args.get("cursor")
+    if cursor:
+        values = decode_cursor(cursor, sort, order, len(cols))
+        key = tuple_(*cols)
+        stmt = stmt.where(key > tuple(values) if order == "asc" else key < tuple(values))
+
+    ordering = [c.asc() if order == "asc" else c.desc() for c in cols]
+    # select the sort values alongside the entity so expression keys work too
+    result = (session or db.session).execute(stmt.add_columns(*cols).order_by(*ordering).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(result) > limit:
+        result = result[:limit]
+        next_cursor = encode_cursor(sort, order, list(result[-1][1:]))
+    return [r[0] for r in result], next_cursor
@@ -0,0 +1,134 @@
+# passwords.py
+# Password verification off the request thread.
+#
+# Werkzeug's scrypt/pbkdf2 hashes take tens of milliseconds of CPU each, so a
+# burst of logins would otherwise hold every request worker and starve the
+# catalog reads. Hashing runs in a bounded pool instead: PASSWORD_POOL is
+# "thread" (hashlib releases the GIL while hashing, so threads run in
+# parallel) or "process", with PASSWORD_POOL_WORKERS workers (default: one
+# per core). At most PASSWORD_POOL_QUEUE hashes may be pending at once; past
+# that, login answers 429 with Retry-After rather than queueing requests the
+# client will have given up on.
+#
+# A successful login whose stored hash was made with other parameters than
+# PASSWORD_HASH_METHOD is rehashed with the current ones, so raising the cost
+# takes effect as users sign in.
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from extensions import db
+from models import User, password_hash_method
+import metrics
+
+HASH_TIME = metrics.Histogram(
+    "password_hash_seconds", "Time from submitting a hash to its result, queueing included.", ["op"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REJECTED = metrics.Counter("password_pool_rejected_total", "Hashes refused because the pool was saturated.")
+REHASHED = metrics.Counter("password_rehash_total", "Stored hashes upgraded to PASSWORD_HASH_METHOD on login.")
+
+_pools = weakref.WeakSet()
+metrics.Gauge("password_pool_pending", "Hashes queued or running in the pool.",
+              lambda: {(): sum(p.pending for p in list(_pools))})
+_method_prefixes = {}
+_prefix_lock = threading.Lock()
+
+
+class PoolSaturated(Exception):
+    """Raised when PASSWORD_POOL_QUEUE hashes are already pending."""
+
+    def __init__(self, retry_after=1):
+        super().__init__("password hashing pool is saturated")
+        self.retry_after = retry_after
+
+
+class HashPool:
+    """Executor with a cap on pending work; submissions past the cap fail at once."""
+
+    def __init__(self, kind="thread", workers=None, max_pending=None, timeout=10.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.timeout = timeout
+        executor = ProcessPoolExecutor if kind == "process" else ThreadPoolExecutor
+        self._executor = executor(max_workers=self.workers)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def run(self, op, fn, *args):
+        """``fn(*args)`` on a worker; raises PoolSaturated when full or when the result takes too long."""
+        if not self._slots.acquire(blocking=False):
+            REJECTED.inc()
+            raise PoolSaturated()
+        with self._lock:
+            self.pending += 1
+        start = time.perf_counter()
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise PoolSaturated()
+        finally:
+            HASH_TIME.observe(time.perf_counter() - start, op)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _pool():
+    return current_app.extensions["password_pool"]
+
+
+def _method_prefix(method):
+    # the "scrypt:32768:8:1" part of "scrypt:32768:8:1$salt$hash", with werkzeug's defaults filled in
+    with _prefix_lock:
+        if method not in _method_prefixes:
+            _method_prefixes[method] = generate_password_hash("", method=method).split("$", 1)[0]
+        return _method_prefixes[method]
+
+
+def needs_rehash(pwhash, method=None):
+    return pwhash.split("$", 1)[0] != _method_prefix(method or password_hash_method())
+
+
+def hash_password(password):
+    """A new hash of ``password`` with PASSWORD_HASH_METHOD, computed in the pool."""
+    return _pool().run("hash", generate_password_hash, password, password_hash_method())
+
+
+def verify(pwhash, password):
+    """check_password_hash in the pool; raises PoolSaturated."""
+    return _pool().run("verify", check_password_hash, pwhash, password)
+
+
+def authenticate(username, password):
+    """The User with these credentials, or None; upgrades an outdated hash. Raises PoolSaturated."""
+    user = User.query.filter_by(username=username).first()
+    if not user or not verify(user.password_hash, password or ""):
+        return None
+    if needs_rehash(user.password_hash):
+        try:
+            user.password_hash = hash_password(password)
+        except PoolSaturated:
+            return user  # still a valid login; upgrade next time
+        db.session.commit()
+        REHASHED.inc()
+    return user
+
+
+def init_app(app):
+    pool = HashPool(app.config["PASSWORD_POOL"], app.config["PASSWORD_POOL_WORKERS"] or None,
+                    app.config["PASSWORD_POOL_QUEUE"] or None, app.config["PASSWORD_POOL_TIMEOUT"])
+    app.extensions["password_pool"] = pool
+    _pools.add(pool)
@@ -0,0 +1,222 @@
+# queries.py
+# Eager-loading query helpers for the show -> season -> episode -> cast pages.
+# Each loader issues a fixed number of statements no matter how many
+# seasons/episodes/actors are involved, so templates can walk the tree freely.
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from extensions import db
+from models import TVShow, Season, Episode, EpisodeCrew, SeasonStats, episode_actors
+
+
+def live_show(show_id):
+    """Select for a show, unless it has been soft-deleted (deletion.py)."""
+    return select(TVShow).where(TVShow.id == show_id, TVShow.deleted_at.is_(None))
+
+
+# Soft-deleted shows keep their rows until the purge has run. Reads that
+# don't start from the show exclude them with NOT IN over these selects,
+# which stay small (shows awaiting the purge, via ix_tvshow_deleted_at).
+def hidden_shows():
+    """Select of the ids of soft-deleted shows."""
+    return select(TVShow.id).where(TVShow.deleted_at.isnot(None))
+
+
+def hidden_seasons():
+    """Select of the ids of seasons of soft-deleted shows."""
+    return select(Season.id).where(Season.tvshow_id.in_(hidden_shows()))
+
+
+def live_season(season_id):
+    """Select for a season, unless its show has been soft-deleted."""
+    return select(Season).where(Season.id == season_id, Season.tvshow_id.not_in(hidden_shows()))
+
+
+def hidden_episodes():
+    """Select of the ids of episodes of soft-deleted shows."""
+    return select(Episode.id).where(Episode.season_id.in_(hidden_seasons()))
+
+
+def show_with_seasons(show_id, with_stats=False):
+    """Select for a show plus its seasons (2 statements, 3 with their stats)."""
+    seasons = selectinload(TVShow.seasons)
+    if with_stats:
+        seasons = seasons.selectinload(Season.stats)
+    return live_show(show_id).options(seasons)
+
+
+def season_with_episodes(season_id, with_crew=False):
+    """Select for a season plus its episodes and each episode's actors (3 statements, 4 with crew)."""
+    episodes = selectinload(Season.episodes)
+    options = [episodes.selectinload(Episode.actors)]
+    if with_crew:
+        options.append(episodes.selectinload(Episode.crews))  # EpisodeCrew.crew is joined-loaded
+    return live_season(season_id).options(*options)
+
+
+def season_stats_for_show(show_id):
+    """Select (season_number, SeasonStats) rows of a show, in season order."""
+    return (
+        select(Season.season_number, SeasonStats)
+        .join(SeasonStats, SeasonStats.season_id == Season.id)
+        .where(Season.tvshow_id == show_id)
+        .order_by(Season.season_number)
+    )
+
+
+def get_show_with_seasons(show_id, with_stats=False):
+    """Show plus its seasons. 404s if the show is missing."""
+    return db.one_or_404(show_with_seasons(show_id, with_stats))
+
+
+def get_season_with_episodes(season_id, with_crew=False):
+    """Season plus its episodes and their actors (and crew). 404s if the season is missing."""
+    return db.one_or_404(season_with_episodes(season_id, with_crew))
+
+
+# ---------- show tree ----------
+# Core row-tuple builder for GET /api/tv/shows/<id>/tree. One statement per
+# level (show, seasons, episodes, plus one per included link table) no
+# matter the size of the show, and rows become dicts via precomputed
+# key/converter lists instead of per-object marshmallow dumps. Takes a
+# Connection so other drivers (e.g. an async connection's run_sync) can reuse it.
+TREE_FIELDS = {
+    "show": {
+        "id": TVShow.id, "title": TVShow.title, "description": TVShow.description,
+        "updated_at": TVShow.updated_at, "version": TVShow.version,
+    },
+    "season": {
+        "id": Season.id, "season_number": Season.season_number, "title": Season.title,
+        "season_description": Season.season_description, "date_started": Season.date_started,
+        "date_ended": Season.date_ended, "updated_at": Season.updated_at, "version": Season.version,
+    },
+    "episode": {
+        "id": Episode.id, "episode_number": Episode.episode_number, "title": Episode.title,
+        "description": Episode.description, "rating": Episode.rating,
+        "date_published": Episode.date_published, "updated_at": Episode.updated_at,
+        "version": Episode.version,
+    },
+}
+TREE_INCLUDES = ("actors", "crew")
+
+
+class TreeFieldsError(ValueError):
+    pass
+
+
+def parse_tree_fields(value):
+    """``fields=title,episode.rating`` -> {level: [names]} (None = every field).
+
+    Bare names apply to every level that has them, ``level.name`` to one
+    level. ``id`` is always returned.
+    """
+    if not value:
+        return {level: list(cols) for level, cols in TREE_FIELDS.items()}
+    picked = {level: ["id"] for level in TREE_FIELDS}
+    for name in filter(None, (n.strip() for n in value.split(","))):
+        level, _, field = name.rpartition(".")
+        levels = [level] if level else [lv for lv in TREE_FIELDS if field in TREE_FIELDS[lv]]
+        if not levels or any(lv not in TREE_FIELDS or field not in TREE_FIELDS[lv] for lv in levels):
+            raise TreeFieldsError(f"unknown field: {name}")
+        for lv in levels:
+            if field not in picked[lv]:
+                picked[lv].append(field)
+    return picked
+
+
+def parse_tree_include(value):
+    """``include=actors,crew`` -> list of link tables to add to each episode."""
+    include = [i for i in (value or "").split(",") if i]
+    unknown = [i for i in include if i not in TREE_INCLUDES]
+    if unknown:
+        raise TreeFieldsError(f"unknown include: {', '.join(unknown)}")
+    return include
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _row_serializer(level, names):
+    """Columns to select plus a function turning one result row into a dict."""
+    columns = [TREE_FIELDS[level][n] for n in names]
+    keys = tuple(names)
+    convert = [i for i, c in enumerate(columns)
+               if isinstance(c.type, (db.Date, db.DateTime))]
+    if not convert:
+        return columns, lambda row: dict(zip(keys, row))
+
+    def serialize(row):
+        values = list(row)
+        for i in convert:
+            values[i] = _isoformat(values[i])
+        return dict(zip(keys, values))
+    return columns, serialize
+
+
+def _ids_by_episode(conn, stmt):
+    grouped = {}
+    for episode_id, ref_id in conn.execute(stmt):
+        grouped.setdefault(episode_id, []).append(ref_id)
+    return grouped
+
+
+def build_show_tree(conn, show_id, fields=None, include=()):
+    """show -> seasons -> episodes as plain dicts, or None if the show doesn't exist.
+
+    ``fields`` is parse_tree_fields() output; ``include`` may name "actors"
+    and/or "crew" to add ``actor_ids`` / ``crew_ids`` to each episode.
+    """
+    fields = fields or parse_tree_fields(None)
+    show_cols, show_row = _row_serializer("show", fields["show"])
+    row = conn.execute(select(*show_cols).where(TVShow.id == show_id, TVShow.deleted_at.is_(None))).first()
+    if row is None:
+        return None
+    show = show_row(row)
+
+    season_cols, season_row = _row_serializer("season", fields["season"])
+    seasons = {}
+    for row in conn.execute(
+        select(Season.id, *season_cols)
+        .where(Season.tvshow_id == show_id)
+        .order_by(Season.season_number)
+    ):
+        season = season_row(row[1:])
+        season["episodes"] = []
+        seasons[row[0]] = season
+    show["seasons"] = list(seasons.values())
+    if not seasons:
+        return show
+
+    in_show = Season.tvshow_id == show_id
+    actors = crew = {}
+    if "actors" in include:
+        actors = _ids_by_episode(conn, (
+            select(episode_actors.c.episode_id, episode_actors.c.actor_id)
+            .join(Episode, Episode.id == episode_actors.c.episode_id)
+            .join(Season, Season.id == Episode.season_id)
+            .where(in_show)
+            .order_by(episode_actors.c.episode_id, episode_actors.c.actor_id)
+        ))
+    if "crew" in include:
+        crew = _ids_by_episode(conn, (
+            select(EpisodeCrew.episode_id, EpisodeCrew.crew_id)
+            .join(Episode, Episode.id == EpisodeCrew.episode_id)
+            .join(Season, Season.id == Episode.season_id)
+            .where(in_show)
+            .order_by(EpisodeCrew.episode_id, EpisodeCrew.crew_id)
+        ))
+
+    episode_cols, episode_row = _row_serializer("episode", fields["episode"])
+    for row in conn.execute(
+        select(Episode.season_id, Episode.id, *episode_cols)
+        .join(Season, Season.id == Episode.season_id)
+        .where(in_show)
+        .order_by(Episode.season_id, Episode.episode_number)
+    ):
+        episode = episode_row(row[2:])
+        if "actors" in include:
+            episode["actor_ids"] = actors.get(row[1], [])
+        if "crew" in include:
+            episode["crew_ids"] = crew.get(row[1], [])
+        seasons[row[0]]["episodes"].append(episode)
+    return show
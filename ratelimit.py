@@ -0,0 +1,229 @@
+# ratelimit.py
+# Request admission: per-identity token buckets plus a global concurrency cap.
+#
+# Every request draws one token from a bucket chosen by what it does:
+#   auth   POST login/register (API and UI)            RATE_LIMIT_AUTH
+#   write  any other non-GET/HEAD/OPTIONS request      RATE_LIMIT_WRITE
+#   read   everything else                             RATE_LIMIT_READ
+# Limits are "<n>/<second|minute|hour>": a bucket holds up to n tokens and
+# refills at n per period, so a client may burst n requests and then keep
+# to the average rate. Buckets are per identity: the JWT or UI session user
+# when there is one, the client IP otherwise. An empty bucket answers 429
+# with Retry-After (seconds until a token is back).
+#
+# With RATE_LIMIT_TRUSTED_PROXIES=n (n reverse proxies in front), the
+# client IP is taken from X-Forwarded-For by werkzeug's ProxyFix(x_for=n).
+#
+# Buckets live in process memory (RATE_LIMIT_BACKEND=memory, per worker) or
+# in Redis (RATE_LIMIT_BACKEND=redis, shared by every worker; the refill and
+# take run as one Lua script, timed by the Redis clock).
+#
+# MAX_CONCURRENT_REQUESTS caps the requests one process works on at once
+# (default DB_POOL_SIZE + DB_MAX_OVERFLOW). Past it, requests get 503 with
+# Retry-After at once, instead of queueing for a pool connection until
+# DB_POOL_TIMEOUT and failing anyway after holding a worker.
+import math
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from flask import g, request, jsonify
+from werkzeug.middleware.proxy_fix import ProxyFix
+from identity import current_user
+import metrics
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+AUTH_ENDPOINTS = {"auth.login", "auth.register", "ui.login", "ui.register"}
+EXEMPT_ENDPOINTS = {"static", "metrics"}
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+LIMITED = metrics.Counter("http_rate_limited_total", "Requests refused with 429 by budget.", ["budget"])
+SHED = metrics.Counter("http_shed_total", "Requests refused with 503 by MAX_CONCURRENT_REQUESTS.")
+
+_gates = weakref.WeakSet()
+metrics.Gauge("http_requests_in_flight", "Requests admitted and not yet finished in this process.",
+              lambda: {(): sum(gate.in_flight for gate in list(_gates))})
+
+
+def parse_limit(value):
+    """(capacity, tokens per second) from "<n>/<period>", or None for an empty/zero limit."""
+    value = (value or "").strip()
+    if not value or value == "0":
+        return None
+    count, _, period = value.partition("/")
+    try:
+        count = int(count)
+        seconds = PERIODS[period.strip().rstrip("s") or "second"]
+    except (ValueError, KeyError):
+        raise ValueError(f"bad rate limit {value!r}; expected <n>/<second|minute|hour>") from None
+    return (count, count / seconds) if count > 0 else None
+
+
+class MemoryBackend:
+    """Buckets in a dict, least recently used dropped past ``max_keys`` (a dropped bucket is simply full again)."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """(allowed, seconds until a token is available)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+_TAKE_SCRIPT = """
+local capacity, rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(state[1]) or capacity
+local stamp = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - stamp) * rate)
+local allowed, wait = 0, (1 - tokens) / rate
+if tokens >= 1 then
+  tokens, allowed, wait = tokens - 1, 1, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+
+class RedisBackend:
+    """Buckets as Redis hashes that expire once they would be full again."""
+
+    def __init__(self, client, prefix="tvrate:"):
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key, capacity, rate):
+        allowed, wait = self._take(keys=[self.prefix + key], args=[capacity, rate])
+        return bool(allowed), float(wait)
+
+
+class ConcurrencyGate:
+    """At most ``limit`` holders at once; acquire() never waits."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        _gates.add(self)
+
+    def acquire(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class RateLimiter:
+    def __init__(self, backend, budgets):
+        self.backend = backend
+        self.budgets = {name: limit for name, limit in budgets.items() if limit}
+
+    def check(self, budget, who):
+        """None if the request may go ahead, else the Retry-After in whole seconds."""
+        limit = self.budgets.get(budget)
+        if limit is None:
+            return None
+        allowed, wait = self.backend.take(f"{budget}:{who}", *limit)
+        if allowed:
+            return None
+        LIMITED.inc(budget)
+        return max(1, math.ceil(wait))
+
+
+def budget_for(endpoint, method):
+    if method == "POST" and endpoint in AUTH_ENDPOINTS:
+        return "auth"
+    return "read" if method in READ_METHODS else "write"
+
+
+def _who():
+    user = current_user()  # also kept on g for the view
+    return f"user:{user.id}" if user is not None else f"ip:{request.remote_addr}"
+
+
+def client_address(remote_addr, forwarded_for, trusted_proxies):
+    """The client IP as ProxyFix(x_for=trusted_proxies) sees it, for callers outside the WSGI app."""
+    hops = [a.strip() for a in (forwarded_for or "").split(",") if a.strip()]
+    if trusted_proxies and len(hops) >= trusted_proxies:
+        return hops[-trusted_proxies]
+    return remote_addr
+
+
+def _refuse(status, msg, retry_after):
+    response = jsonify({"msg": msg})
+    response.status_code = status
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def _backend(app):
+    if app.config["RATE_LIMIT_BACKEND"] == "redis":
+        response_cache = app.extensions.get("response_cache")
+        client = getattr(getattr(response_cache, "backend", None), "client", None)
+        if client is None or app.config["RATE_LIMIT_REDIS_URL"]:
+            import redis  # optional dependency, only needed for this backend
+            client = redis.Redis.from_url(app.config["RATE_LIMIT_REDIS_URL"] or app.config["CACHE_REDIS_URL"])
+        return RedisBackend(client)
+    if app.config["RATE_LIMIT_BACKEND"] == "memory":
+        return MemoryBackend()
+    raise ValueError(f"unknown RATE_LIMIT_BACKEND {app.config['RATE_LIMIT_BACKEND']!r}")
+
+
+def init_app(app):
+    cap = app.config["MAX_CONCURRENT_REQUESTS"] or app.config["DB_POOL_SIZE"] + app.config["DB_MAX_OVERFLOW"]
+    gate = ConcurrencyGate(cap) if cap > 0 else None
+    limiter = None
+    if app.config["RATE_LIMIT_ENABLED"]:
+        limiter = RateLimiter(_backend(app), {
+            "read": parse_limit(app.config["RATE_LIMIT_READ"]),
+            "write": parse_limit(app.config["RATE_LIMIT_WRITE"]),
+            "auth": parse_limit(app.config["RATE_LIMIT_AUTH"]),
+        })
+    app.extensions["rate_limiter"] = limiter
+    app.extensions["concurrency_gate"] = gate
+    if app.config["RATE_LIMIT_TRUSTED_PROXIES"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["RATE_LIMIT_TRUSTED_PROXIES"])
+
+    @app.before_request
+    def _admit():
+        if request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        if gate is not None:
+            if not gate.acquire():
+                SHED.inc()
+                return _refuse(503, "server busy, retry shortly", 1)
+            g.admission_gate = gate
+        if limiter is not None:
+            retry_after = limiter.check(budget_for(request.endpoint, request.method), _who())
+            if retry_after is not None:
+                return _refuse(429, "rate limit exceeded", retry_after)
+        return None
+
+    # teardown also covers streamed responses, which finish after after_request
+    @app.teardown_request
+    def _release(exc):
+        admitted = g.pop("admission_gate", None)
+        if admitted is not None:
+            admitted.release()
@@ -0,0 +1,183 @@
+# replicas.py
+# Read-replica routing.
+#
+# REPLICA_DATABASE_URLS lists read-only copies of the primary. Each GET/HEAD
+# request picks a healthy replica up front (g.db_replica) and RoutingSession
+# sends that request's queries there; everything else - other methods,
+# flushes, explicit binds - stays on the primary.
+#
+# Read-your-writes: after a request commits, its user is pinned to the
+# primary for REPLICA_STICKY_SECONDS so they don't read their own change from
+# a replica that hasn't replayed it yet. Replicas are health-checked at most
+# every REPLICA_CHECK_INTERVAL seconds; one that is down or lags more than
+# REPLICA_MAX_LAG_SECONDS is skipped (falling back to the primary), and a
+# connection error on a replica takes it out of rotation until the next check.
+import os
+import random
+import threading
+import time
+from flask import g, request, session, has_request_context
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+import metrics
+from dbpool import engine_options
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+READS = metrics.Counter("db_read_requests_total", "Read-only requests by the database they were routed to.",
+                        ["target"])
+
+# PostgreSQL standbys report replay delay; a primary (or SQLite copy) has none
+_PG_LAG = text(
+    "SELECT CASE WHEN pg_is_in_recovery() "
+    "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END"
+)
+
+
+class RoutingSession(FlaskSession):
+    """Flask-SQLAlchemy session that reads from the request's replica, if one was picked."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context():
+            replica = g.get("db_replica")
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag = 0.0
+        self.checked_at = 0.0  # monotonic; 0 forces a check on first use
+        self._lock = threading.Lock()
+
+    def mark_down(self):
+        self.healthy = False
+        self.checked_at = time.monotonic()
+
+    def usable(self, interval, max_lag):
+        if time.monotonic() - self.checked_at >= interval and self._lock.acquire(blocking=False):
+            # one request re-checks; concurrent ones use the previous result
+            try:
+                self.check()
+            finally:
+                self._lock.release()
+        return self.healthy and self.lag <= max_lag
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    self.lag = float(conn.execute(_PG_LAG).scalar() or 0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+            self.healthy = True
+        except Exception:
+            self.healthy = False
+        self.checked_at = time.monotonic()
+
+
+class StickyWindow:
+    """Users who committed recently, per process (or shared through redis)."""
+
+    def __init__(self, seconds, redis_client=None):
+        self.seconds = seconds
+        self.redis = redis_client
+        self._until = {}
+        self._lock = threading.Lock()
+
+    def touch(self, user):
+        if self.redis is not None:
+            self.redis.set("replica-sticky:" + user, 1, px=int(self.seconds * 1000))
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._until) > 10000:
+                self._until = {u: t for u, t in self._until.items() if t > now}
+            self._until[user] = now + self.seconds
+
+    def active(self, user):
+        if self.redis is not None:
+            return bool(self.redis.exists("replica-sticky:" + user))
+        return self._until.get(user, 0) > time.monotonic()
+
+
+def _replica_url(app, url):
+    # resolve relative SQLite paths against the instance folder, like the primary's
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:") \
+            and not os.path.isabs(url.database):
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return url
+
+
+def _current_user():
+    """A key for the requesting user (JWT identity or UI session), or None if anonymous."""
+    if session.get("user_id") is not None:
+        return f"ui:{session['user_id']}"
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        return None  # bad/expired tokens are rejected later by the view itself
+    if isinstance(identity, dict):
+        identity = identity.get("id")
+    return f"api:{identity}" if identity is not None else None
+
+
+def init_app(app):
+    replicas = []
+    for i, url in enumerate(app.config["REPLICA_DATABASE_URLS"]):
+        url = _replica_url(app, url)
+        engine = create_engine(url, **engine_options(app.config, url))
+        replica = Replica(f"replica{i}", engine)
+        # a replica connection failing mid-request takes it out of rotation
+        event.listen(engine, "handle_error", lambda ctx, r=replica: r.mark_down() if ctx.is_disconnect else None)
+        replicas.append(replica)
+    app.extensions["replicas"] = replicas
+    if not replicas:
+        return
+
+    cache = app.extensions.get("response_cache")
+    redis_client = getattr(getattr(cache, "backend", None), "client", None)
+    sticky = StickyWindow(app.config["REPLICA_STICKY_SECONDS"], redis_client)
+    interval = app.config["REPLICA_CHECK_INTERVAL"]
+    max_lag = app.config["REPLICA_MAX_LAG_SECONDS"]
+
+    @app.before_request
+    def _route_reads():
+        g.db_replica = None
+        g.db_committed = False
+        if request.method not in READ_METHODS:
+            return
+        g.db_user = user = _current_user()
+        if user is not None and sticky.active(user):
+            READS.inc("primary")
+            return
+        candidates = [r for r in replicas if r.usable(interval, max_lag)]
+        if candidates:
+            g.db_replica = random.choice(candidates).engine
+            READS.inc("replica")
+        else:
+            READS.inc("primary")
+
+    @app.after_request
+    def _pin_writers(response):
+        if g.get("db_committed"):
+            user = g.get("db_user", None) or _current_user()
+            if user is not None:
+                sticky.touch(user)
+        return response
+
+
+@event.listens_for(Session, "after_commit")
+def _note_commit(db_session):
+    if has_request_context():
+        g.db_committed = True
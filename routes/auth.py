@@ -2,7 +2,9 @@
 from flask import Blueprint, request, jsonify
 from models import User
 from extensions import db
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required
+from identity import current_user
+import passwords
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/auth")
 
@@ -24,10 +26,11 @@ def register():
 @auth_bp.route("/login", methods=["POST"])
 def login():
     data = request.get_json() or {}
-    username = data.get("username")
-    password = data.get("password", "")
-    user = User.query.filter_by(username=username).first()
-    if not user or not user.check_password(password):
+    try:
+        user = passwords.authenticate(data.get("username"), data.get("password", ""))
+    except passwords.PoolSaturated as e:
+        return {"msg": "too many logins in progress, retry shortly"}, 429, {"Retry-After": str(e.retry_after)}
+    if not user:
         return {"msg":"bad credentials"}, 401
     token = create_access_token(identity={"id": user.id, "role": user.role})
     return {"access_token": token}, 200
@@ -35,8 +38,5 @@ def login():
 @auth_bp.route("/me", methods=["GET"])
 @jwt_required()
 def me():
-    identity = get_jwt_identity()
-    user = User.query.get(identity["id"])
-    if not user:
-        return {"msg": "user not found"}, 404
+    user = current_user()  # @jwt_required already refused tokens of deleted users
     return {"id": user.id, "username": user.username, "role": user.role}
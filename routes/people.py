@@ -1,20 +1,208 @@
 # routes/people.py
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import io
+from datetime import datetime, timedelta
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required
+from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError
 from extensions import db
-from models import Actor, Crew, ScreenTime, Episode
-from schemas import ActorSchema, CrewSchema, ScreenTimeSchema
+from models import Actor, Crew, ScreenTime, Episode, Season, TVShow, episode_actors
+from schemas import ActorSchema, CrewSchema, ScreenTimeSchema, naive_utc
+from pagination import keyset_page, page_limit, PageRequestError
+import ingest
+import costars
+import screentime
+import intervals
+from identity import is_admin
 
 people_bp = Blueprint("people", __name__, url_prefix="/api/people")
 
-def admin_required_identity():
-    identity = get_jwt_identity()
-    return identity and identity.get("role") == "admin"
+# '' is rendered inline (not as a bind param) so the sort keys match the
+# ix_actor_name / ix_crew_name expression indexes
+_EMPTY = db.literal_column("''")
+
+ACTOR_SORTS = {
+    "id": [Actor.id],
+    "name": [Actor.first_name, db.func.coalesce(Actor.last_name, _EMPTY), Actor.id],
+}
+
+CREW_SORTS = {
+    "id": [Crew.id],
+    "name": [db.func.coalesce(Crew.first_name, _EMPTY), db.func.coalesce(Crew.last_name, _EMPTY), Crew.id],
+}
+
+def _name_filter(model, q):
+    q = q.lower()
+    return db.or_(
+        db.func.lower(model.first_name).contains(q, autoescape=True),
+        db.func.lower(model.last_name).contains(q, autoescape=True),
+    )
+
+def filter_actors(stmt, args):
+    q = (args.get("q") or "").strip()
+    if q:
+        stmt = stmt.where(_name_filter(Actor, q))
+    return stmt
+
+def filter_crew(stmt, args):
+    q = (args.get("q") or "").strip()
+    if q:
+        stmt = stmt.where(_name_filter(Crew, q))
+    role = (args.get("role") or "").strip()
+    if role:
+        stmt = stmt.where(db.func.lower(Crew.person_definition) == role.lower())
+    return stmt
+
+def screentime_scope(args):
+    """(scope, id) from ?scope=episode|season|show&id=<id>; raises ScopeError."""
+    scope = args.get("scope", "episode")
+    if scope not in screentime.SCOPES:
+        raise screentime.ScopeError(f"scope must be one of: {', '.join(screentime.SCOPES)}")
+    scope_id = args.get("id", type=int)
+    if scope_id is None:
+        raise screentime.ScopeError("id (an integer) is required")
+    return scope, scope_id
+
+@people_bp.route('/actors', methods=['GET'])
+def list_actors():
+    # ?q=<name substring>&sort=id|name&order=asc|desc&limit=&cursor=
+    try:
+        actors, next_cursor = keyset_page(filter_actors(db.select(Actor), request.args), ACTOR_SORTS, request.args)
+    except PageRequestError as e:
+        return {"msg": str(e)}, 400
+    return jsonify({"items": ActorSchema(many=True).dump(actors), "next_cursor": next_cursor})
+
+@people_bp.route('/crews', methods=['GET'])
+def list_crew():
+    # ?q=<name substring>&role=<person_definition>&sort=id|name&order=asc|desc&limit=&cursor=
+    try:
+        crew, next_cursor = keyset_page(filter_crew(db.select(Crew), request.args), CREW_SORTS, request.args)
+    except PageRequestError as e:
+        return {"msg": str(e)}, 400
+    return jsonify({"items": CrewSchema(many=True).dump(crew), "next_cursor": next_cursor})
+
+@people_bp.route('/actors/<int:actor_id>/filmography', methods=['GET'])
+def actor_filmography(actor_id):
+    # every episode the actor is cast in, grouped by show; one indexed join
+    actor = db.get_or_404(Actor, actor_id)
+    rows = db.session.execute(
+        db.select(TVShow.id, TVShow.title, Season.id, Season.season_number,
+                  Episode.id, Episode.episode_number, Episode.title, Episode.date_published)
+        .select_from(episode_actors)
+        .join(Episode, Episode.id == episode_actors.c.episode_id)
+        .join(Season, Season.id == Episode.season_id)
+        .join(TVShow, TVShow.id == Season.tvshow_id)
+        .where(episode_actors.c.actor_id == actor_id, TVShow.deleted_at.is_(None))
+        .order_by(TVShow.title, TVShow.id, Season.season_number, Episode.episode_number)
+    ).all()
+    shows = {}
+    for show_id, show_title, season_id, season_number, episode_id, number, title, published in rows:
+        show = shows.get(show_id)
+        if show is None:
+            show = shows[show_id] = {"id": show_id, "title": show_title, "episodes": []}
+        show["episodes"].append({
+            "id": episode_id, "season_id": season_id, "season_number": season_number,
+            "episode_number": number, "title": title,
+            "date_published": published.isoformat() if published else None,
+        })
+    return jsonify({"actor": ActorSchema().dump(actor), "episode_count": len(rows),
+                    "shows": list(shows.values())})
+
+@people_bp.route('/actors/<int:actor_id>/costars', methods=['GET'])
+def actor_costars(actor_id):
+    # ?limit= ; actors sharing the most episodes, from the precomputed actor_costar table
+    try:
+        limit = page_limit(request.args)
+    except PageRequestError as e:
+        return {"msg": str(e)}, 400
+    actor = db.get_or_404(Actor, actor_id)
+    items = [{"id": id, "first_name": first, "last_name": last, "shared_episodes": shared}
+             for id, first, last, shared in costars.top_costars(actor_id, limit)]
+    return jsonify({"actor": ActorSchema().dump(actor), "items": items})
+
+@people_bp.route('/actors/<int:actor_id>/screentime', methods=['GET'])
+def actor_screentime(actor_id):
+    # ?by=episode|season|show ; the actor's on-screen time per grouping
+    actor = db.get_or_404(Actor, actor_id)
+    try:
+        items = screentime.actor_breakdown(db.session.connection(), actor_id, request.args.get("by", "show"))
+    except screentime.ScopeError as e:
+        return {"msg": str(e)}, 400
+    return jsonify({"actor": ActorSchema().dump(actor), "items": items})
+
+@people_bp.route('/screentime/actors', methods=['GET'])
+def screentime_by_actor():
+    # ?scope=episode|season|show&id=&limit= ; who is on screen longest
+    try:
+        scope, scope_id = screentime_scope(request.args)
+        limit = page_limit(request.args)
+    except (screentime.ScopeError, PageRequestError) as e:
+        return {"msg": str(e)}, 400
+    return jsonify({"scope": scope, "id": scope_id,
+                    "items": screentime.actor_totals(db.session.connection(), scope, scope_id, limit)})
+
+@people_bp.route('/screentime/roles', methods=['GET'])
+def screentime_by_role():
+    # ?scope=episode|season|show&id= ; on-screen time per role_type
+    try:
+        scope, scope_id = screentime_scope(request.args)
+    except screentime.ScopeError as e:
+        return {"msg": str(e)}, 400
+    return jsonify({"scope": scope, "id": scope_id,
+                    "items": screentime.role_breakdown(db.session.connection(), scope, scope_id)})
+
+@people_bp.route('/screentime/overlaps', methods=['GET'])
+def screentime_overlaps():
+    # ?scope=episode|season|show&id=&actor_id=&limit= ; actors on screen together
+    try:
+        scope, scope_id = screentime_scope(request.args)
+        limit = page_limit(request.args)
+    except (screentime.ScopeError, PageRequestError) as e:
+        return {"msg": str(e)}, 400
+    actor_id = request.args.get("actor_id", type=int)
+    return jsonify({"scope": scope, "id": scope_id, "items": screentime.overlaps(
+        db.session.connection(), scope, scope_id, actor_id=actor_id, limit=limit)})
+
+@people_bp.route('/screentime/at', methods=['GET'])
+def screentime_at():
+    # ?episode_id=&minute=<minutes from the episode's first screentime> | &at=<ISO datetime>
+    episode_id = request.args.get("episode_id", type=int)
+    if episode_id is None:
+        return {"msg": "episode_id (an integer) is required"}, 400
+    db.get_or_404(Episode, episode_id)
+    conn = db.session.connection()
+    if request.args.get("at"):
+        try:
+            point = naive_utc(datetime.fromisoformat(request.args["at"]))
+        except ValueError:
+            return {"msg": "at must be an ISO 8601 datetime"}, 400
+    else:
+        minute = request.args.get("minute", type=float)
+        if minute is None:
+            return {"msg": "minute (a number) or at is required"}, 400
+        origin = intervals.episode_origin(conn, episode_id)
+        if origin is None:
+            return jsonify({"episode_id": episode_id, "at": None, "items": []})
+        point = origin + timedelta(minutes=minute)
+    rows = intervals.on_screen_at(conn, episode_id, point)
+    return jsonify({"episode_id": episode_id, "at": point.isoformat(),
+                    "items": ScreenTimeSchema(many=True).dump(rows)})
+
+@people_bp.route('/screentime/conflicts', methods=['GET'])
+def screentime_conflicts():
+    # ?episode_id=&actor_id= ; segments of the same actor that overlap each other
+    episode_id = request.args.get("episode_id", type=int)
+    if episode_id is None:
+        return {"msg": "episode_id (an integer) is required"}, 400
+    db.get_or_404(Episode, episode_id)
+    pairs = intervals.self_overlaps(db.session.connection(), episode_id, request.args.get("actor_id", type=int))
+    return jsonify({"episode_id": episode_id,
+                    "items": [{"actor_id": actor_id, "screentime_ids": [a, b]} for a, b, actor_id in pairs]})
 
 @people_bp.route('/actors', methods=['POST'])
 @jwt_required()
 def create_actor():
-    if not admin_required_identity():
+    if not is_admin():
         return {"msg":"admin only"}, 403
     data = request.get_json() or {}
     errors = ActorSchema().validate(data)
@@ -28,7 +216,7 @@ def create_actor():
 @people_bp.route('/crews', methods=['POST'])
 @jwt_required()
 def create_crew():
-    if not admin_required_identity():
+    if not is_admin():
         return {"msg":"admin only"}, 403
     data = request.get_json() or {}
     errors = CrewSchema().validate(data)
@@ -43,10 +231,11 @@ def create_crew():
 @jwt_required()
 def create_screentime():
     # both admin and normal users can create, adapt as needed
-    data = request.get_json() or {}
-    errors = ScreenTimeSchema().validate(data)
-    if errors:
-        return errors, 400
+    try:
+        data = ScreenTimeSchema().load(request.get_json() or {})
+    except ValidationError as e:
+        return e.messages, 400
+    start, end = data.get('start_time'), data.get('end_time')
 
     # relational existence checks
     actor_exists = Actor.query.get(data["actor_id"])
@@ -61,6 +250,34 @@ def create_screentime():
                     end_time=data.get('end_time'),
                     role_name=data.get('role_name'),
                     role_type=data.get('role_type'))
+    # with SCREENTIME_EXCLUDE_OVERLAPS an actor can't be on screen twice at once in the same episode
+    if start is not None and end is not None and current_app.config["SCREENTIME_EXCLUDE_OVERLAPS"]:
+        clashes = intervals.overlapping(db.session.connection(), st.episode_id, start, end, actor_id=st.actor_id)
+        if clashes:
+            return {"msg": "overlaps existing screentime", "conflicts": [c.id for c in clashes]}, 409
     db.session.add(st)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:  # uq_actor_episode_time, or the overlap exclusion constraint under a race
+        db.session.rollback()
+        return {"msg": "overlaps existing screentime"}, 409
     return ScreenTimeSchema().dump(st), 201
+
+@people_bp.route('/screentimes/bulk', methods=['POST'])
+@jwt_required()
+def bulk_screentimes():
+    # body: a JSON array of segments (Content-Type: application/json) or NDJSON, one per line;
+    # validated and inserted in batches, with a per-row report (index / line number)
+    if request.mimetype == "application/json":
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            return {"msg": "expected a JSON array of screentime objects"}, 400
+        records = ingest.iter_json_array(records, "screentime")
+    else:
+        lines = io.TextIOWrapper(io.BufferedReader(request.stream), encoding="utf-8", newline="")
+        records = ingest.iter_ndjson(lines, default_type="screentime")
+    # only screentime rows belong here
+    records = ((line, t, rec if t == "screentime" else "only screentime records are accepted here")
+               for line, t, rec in records)
+    report = ingest.ingest(records)
+    return report.to_dict(), (200 if not report.error_count else 207)
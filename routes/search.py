@@ -0,0 +1,44 @@
+# routes/search.py
+from flask import Blueprint, request, jsonify, current_app
+from search import search, SEARCH_KINDS
+from pagination import page_limit, PageRequestError
+
+search_bp = Blueprint("search", __name__, url_prefix="/api/search")
+
+
+def parse_search_args(args):
+    """(q, kinds, limit, page) from the query string; PageRequestError on bad input."""
+    q = (args.get("q") or "").strip()
+    if not q:
+        raise PageRequestError("q required")
+    kinds = [k for k in args.get("kind", "").split(",") if k] or SEARCH_KINDS
+    unknown = [k for k in kinds if k not in SEARCH_KINDS]
+    if unknown:
+        raise PageRequestError(f"unknown kind: {', '.join(unknown)}")
+    limit = page_limit(args)
+    try:
+        page = int(args.get("page", 1))
+    except ValueError:
+        raise PageRequestError("page must be an integer")
+    if page < 1 or page > current_app.config["MAX_SEARCH_PAGE"]:
+        raise PageRequestError(f"page must be between 1 and {current_app.config['MAX_SEARCH_PAGE']}")
+    return q, kinds, limit, page
+
+
+def search_page(rows, limit, page):
+    """Response body for ``rows`` fetched with limit + 1 (the extra row means has_more)."""
+    results = [{"kind": kind, "id": ref_id, "title": title, "rank": rank}
+               for kind, ref_id, title, rank in rows[:limit]]
+    return {"items": results, "page": page, "has_more": len(rows) > limit}
+
+
+@search_bp.route("", methods=["GET"])
+def search_catalog():
+    # ?q=<words>&kind=show,episode,actor,crew&limit=&page=
+    try:
+        q, kinds, limit, page = parse_search_args(request.args)
+    except PageRequestError as e:
+        return {"msg": str(e)}, 400
+
+    rows = search(q, kinds, limit=limit + 1, offset=(page - 1) * limit)
+    return jsonify(search_page(rows, limit, page))
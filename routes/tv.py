@@ -1,31 +1,152 @@
 # routes/tv.py
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from models import TVShow, Season, Episode
-from extensions import db
-from schemas import TVShowSchema, SeasonSchema, EpisodeSchema
+import io
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required
+from sqlalchemy.orm.exc import StaleDataError
+from models import TVShow, Season, Episode, ShowStats
+from extensions import db, cache
+from cache import CATALOG_TAG, SHOWS_TAG, show_tag, season_tag
+from schemas import TVShowSchema, SeasonSchema, EpisodeWithActorsSchema, SeasonStatsSchema, ShowStatsSchema
+from queries import (live_show, live_season, get_show_with_seasons, get_season_with_episodes, season_stats_for_show,
+                     build_show_tree, parse_tree_fields, parse_tree_include, TreeFieldsError)
+from pagination import keyset_page, PageRequestError
+from export import EXPORT_TABLES, iter_ndjson, iter_csv
+import ingest
+import assignments
+import season_batch
+import deletion
+from conditional import conditional, entity_etag, collection_etag, episodes_etag, if_match_failed
+from identity import is_admin
+
+SHOW_SORTS = {
+    "id": [TVShow.id],
+    "title": [TVShow.title, TVShow.id],
+}
+
+def filter_shows(stmt, args):
+    stmt = stmt.where(TVShow.deleted_at.is_(None))
+    q = (args.get("q") or "").strip()
+    if q:
+        stmt = stmt.where(db.func.lower(TVShow.title).contains(q.lower(), autoescape=True))
+    return stmt
 
 tv_bp = Blueprint("tv", __name__, url_prefix="/tv")  # note: app registers with /api/tv, keep consistent in app.register
 
-def is_admin():
-    claims = get_jwt() or {}
-    role = claims.get("role")
-    # fallback if identity used differently
-    identity = get_jwt_identity()
-    if isinstance(identity, dict):
-        role = role or identity.get("role")
-    return role == "admin"
+def show_tags(show_id):
+    """Cache tags of a show and every one of its seasons; read them before deleting it."""
+    seasons = db.session.execute(db.select(Season.id).where(Season.tvshow_id == show_id)).scalars()
+    return [SHOWS_TAG, show_tag(show_id), *map(season_tag, seasons)]
+
+def stats_payload(stats, seasons):
+    data = ShowStatsSchema().dump(stats)
+    data["seasons"] = [{"season_number": n, **SeasonStatsSchema().dump(ss)} for n, ss in seasons]
+    return data
 
 # LIST & DETAIL (existing)
 @tv_bp.route("/shows", methods=["GET"])
+@cache.cached(lambda: [SHOWS_TAG])
 def list_shows():
-    shows = TVShow.query.all()
-    return jsonify(TVShowSchema(many=True).dump(shows))
+    # ?q=<title substring>&sort=id|title&order=asc|desc&limit=&cursor=
+    try:
+        shows, next_cursor = keyset_page(filter_shows(db.select(TVShow), request.args), SHOW_SORTS, request.args)
+    except PageRequestError as e:
+        return {"msg": str(e)}, 400
+    return conditional(
+        collection_etag([next_cursor] + [(s.id, s.version) for s in shows]),
+        lambda: jsonify({"items": TVShowSchema(many=True).dump(shows), "next_cursor": next_cursor}),
+    )
 
 @tv_bp.route("/shows/<int:show_id>", methods=["GET"])
+@cache.cached(lambda show_id: [show_tag(show_id)])
 def show_detail(show_id):
-    show = TVShow.query.get_or_404(show_id)
-    return TVShowSchema().dump(show), 200
+    show = db.one_or_404(live_show(show_id))
+    return conditional(entity_etag(show), lambda: TVShowSchema().dump(show), show.updated_at)
+
+@tv_bp.route("/shows/<int:show_id>/seasons", methods=["GET"])
+@cache.cached(lambda show_id: [show_tag(show_id)])
+def list_seasons(show_id):
+    show = get_show_with_seasons(show_id)
+    return conditional(
+        collection_etag([(s.id, s.version) for s in show.seasons]),
+        lambda: jsonify(SeasonSchema(many=True).dump(show.seasons)),
+    )
+
+@tv_bp.route("/seasons/<int:season_id>/episodes", methods=["GET"])
+@cache.cached(lambda season_id: [season_tag(season_id)])
+def list_episodes(season_id):
+    season = get_season_with_episodes(season_id)
+    return conditional(
+        episodes_etag(season.episodes),
+        lambda: jsonify(EpisodeWithActorsSchema(many=True).dump(season.episodes)),
+    )
+
+@tv_bp.route("/shows/<int:show_id>/stats", methods=["GET"])
+@cache.cached(lambda show_id: [show_tag(show_id)])
+def show_stats(show_id):
+    # precomputed aggregates: one PK lookup + one indexed lookup per show
+    stats = db.get_or_404(ShowStats, show_id)
+    return stats_payload(stats, db.session.execute(season_stats_for_show(show_id)).all()), 200
+
+@tv_bp.route("/shows/<int:show_id>/tree", methods=["GET"])
+@cache.cached(lambda show_id: [show_tag(show_id)])
+def show_tree(show_id):
+    # ?fields=title,episode.rating (id always included)&include=actors,crew
+    try:
+        include = parse_tree_include(request.args.get("include"))
+        fields = parse_tree_fields(request.args.get("fields"))
+    except TreeFieldsError as e:
+        return {"msg": str(e)}, 400
+    tree = build_show_tree(db.session.connection(), show_id, fields, include)
+    if tree is None:
+        return {"msg": "show not found"}, 404
+    return jsonify(tree)
+
+# ---------- EXPORT ----------
+@tv_bp.route("/export", methods=["GET"])
+@jwt_required()
+def export_catalog():
+    # ?format=ndjson|csv&type=show,season,...  (csv takes exactly one type)
+    if not is_admin():
+        return {"msg": "admin only"}, 403
+    fmt = request.args.get("format", "ndjson")
+    types = [t for t in request.args.get("type", "").split(",") if t] or list(EXPORT_TABLES)
+    unknown = [t for t in types if t not in EXPORT_TABLES]
+    if unknown:
+        return {"msg": f"unknown type: {', '.join(unknown)}"}, 400
+
+    if fmt == "ndjson":
+        body, mimetype, filename = iter_ndjson(types), "application/x-ndjson", "catalog.ndjson"
+    elif fmt == "csv":
+        if len(types) != 1:
+            return {"msg": "csv export needs exactly one type"}, 400
+        body, mimetype, filename = iter_csv(types[0]), "text/csv", f"{types[0]}.csv"
+    else:
+        return {"msg": "format must be ndjson or csv"}, 400
+
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+# ---------- IMPORT ----------
+@tv_bp.route("/import", methods=["POST"])
+@jwt_required()
+def import_catalog():
+    # body: NDJSON (one {"type": ..., ...} object per line) or CSV with ?format=csv&type=<type>
+    if not is_admin():
+        return {"msg": "admin only"}, 403
+    fmt = request.args.get("format", "ndjson")
+    record_type = request.args.get("type")
+    lines = io.TextIOWrapper(io.BufferedReader(request.stream), encoding="utf-8", newline="")
+    if fmt == "ndjson":
+        records = ingest.iter_ndjson(lines)
+    elif fmt == "csv":
+        if record_type not in ingest.INGEST_TYPES:
+            return {"msg": f"csv import needs type=one of {', '.join(ingest.INGEST_TYPES)}"}, 400
+        records = ingest.iter_csv(lines, record_type)
+    else:
+        return {"msg": "format must be ndjson or csv"}, 400
+    report = ingest.ingest(records)
+    cache.invalidate(CATALOG_TAG)
+    return report.to_dict(), (200 if not report.error_count else 207)
 
 # CREATE (existing)
 @tv_bp.route("/shows", methods=["POST"])
@@ -40,6 +161,7 @@ def create_show():
     show = TVShow(title=data["title"], description=data.get("description"))
     db.session.add(show)
     db.session.commit()
+    cache.invalidate(SHOWS_TAG)
     return TVShowSchema().dump(show), 201
 
 # UPDATE (NEW)
@@ -48,7 +170,9 @@ def create_show():
 def update_show(show_id):
     if not is_admin():
         return {"msg":"admin only"}, 403
-    show = TVShow.query.get_or_404(show_id)
+    show = db.one_or_404(live_show(show_id))
+    if if_match_failed(show):
+        return {"msg": "precondition failed", "version": show.version}, 412
     data = request.get_json() or {}
     # validate incoming fields
     errors = TVShowSchema(partial=True).validate(data)
@@ -63,8 +187,15 @@ def update_show(show_id):
     if description is not None:
         show.description = description
 
-    db.session.commit()
-    return TVShowSchema().dump(show), 200
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        return {"msg": "precondition failed: show was modified concurrently"}, 412
+    cache.invalidate(SHOWS_TAG, show_tag(show_id))
+    response = jsonify(TVShowSchema().dump(show))
+    response.set_etag(entity_etag(show))
+    return response, 200
 
 # DELETE (NEW)
 @tv_bp.route("/shows/<int:show_id>", methods=["DELETE"])
@@ -72,9 +203,16 @@ def update_show(show_id):
 def delete_show(show_id):
     if not is_admin():
         return {"msg":"admin only"}, 403
-    show = TVShow.query.get_or_404(show_id)
-    db.session.delete(show)
+    tags = show_tags(show_id)
+    outcome = deletion.delete_show(show_id)
+    if outcome is None:
+        db.session.rollback()
+        return {"msg": "show not found"}, 404
     db.session.commit()
+    cache.invalidate(*tags)
+    if outcome == "scheduled":
+        deletion.schedule_purge()
+        return {"msg": "deletion scheduled", "id": show_id}, 202
     return {"msg": "deleted", "id": show_id}, 200
 
 # the Season/Episode create endpoints remain unchanged below (if present in your file).
@@ -87,7 +225,9 @@ def update_season(season_id):
     if not is_admin():
         return {"msg": "admin only"}, 403
 
-    season = Season.query.get_or_404(season_id)
+    season = db.one_or_404(live_season(season_id))
+    if if_match_failed(season):
+        return {"msg": "precondition failed", "version": season.version}, 412
     data = request.get_json() or {}
 
     errors = SeasonSchema(partial=True).validate(data)
@@ -100,8 +240,34 @@ def update_season(season_id):
     if "title" in data:
         season.title = data["title"]
 
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        return {"msg": "precondition failed: season was modified concurrently"}, 412
+    cache.invalidate(show_tag(season.tvshow_id), season_tag(season_id))
+    response = jsonify(SeasonSchema().dump(season))
+    response.set_etag(entity_etag(season))
+    return response, 200
+
+
+# ---------- Batch-edit a season's episodes ----------
+@tv_bp.route("/seasons/<int:season_id>/episodes", methods=["PATCH"])
+@jwt_required()
+def update_season_episodes(season_id):
+    # {"episodes": [{"id": 7, "episode_number": 2, "rating": 8, "version": 3 (optional)}, ...]}
+    # all or nothing; numbers may be swapped within the batch
+    if not is_admin():
+        return {"msg": "admin only"}, 403
+    season = db.one_or_404(live_season(season_id))
+    try:
+        results = season_batch.apply(season_id, (request.get_json(silent=True) or {}).get("episodes"))
+    except season_batch.BatchError as e:
+        db.session.rollback()
+        return {"msg": "no episodes were changed", "items": e.results}, e.status
     db.session.commit()
-    return SeasonSchema().dump(season), 200
+    cache.invalidate(show_tag(season.tvshow_id), season_tag(season_id))
+    return {"items": results}, 200
 
 
 # ---------- DELETE Season ----------
@@ -111,8 +277,45 @@ def delete_season(season_id):
     if not is_admin():
         return {"msg": "admin only"}, 403
 
-    season = Season.query.get_or_404(season_id)
-    db.session.delete(season)
+    show_id = deletion.delete_season(season_id)
+    if show_id is None:
+        db.session.rollback()
+        return {"msg": "season not found"}, 404
     db.session.commit()
+    cache.invalidate(show_tag(show_id), season_tag(season_id))
 
     return {"msg": "deleted", "id": season_id}, 200
+
+
+# ---------- Cast / crew assignment ----------
+def _assign(changes):
+    try:
+        results, touched = assignments.apply(changes)
+    except assignments.AssignmentError as e:
+        db.session.rollback()
+        return {"msg": "invalid assignment", "errors": e.errors}, 400
+    db.session.commit()
+    tags = [season_tag(season_id) for season_id in touched] + [show_tag(s) for s in set(touched.values())]
+    if tags:
+        cache.invalidate(*tags)
+    return {"items": results}, 200
+
+@tv_bp.route("/episodes/assignments", methods=["POST"])
+@jwt_required()
+def assign_episodes():
+    # {"changes": [{"episode_id": 1, "actor_ids": [...], "crew": {"add": [...], "remove": [...]}}, ...]}
+    # one transaction; only the links that differ are written
+    if not is_admin():
+        return {"msg": "admin only"}, 403
+    return _assign((request.get_json(silent=True) or {}).get("changes"))
+
+@tv_bp.route("/episodes/<int:episode_id>/assignments", methods=["PATCH"])
+@jwt_required()
+def assign_episode(episode_id):
+    # same change object for one episode, without episode_id
+    if not is_admin():
+        return {"msg": "admin only"}, 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {"msg": "a JSON object is required"}, 400
+    return _assign([{**data, "episode_id": episode_id}])
@@ -1,6 +1,14 @@
 # schemas.py
-from marshmallow import Schema, fields, validates, ValidationError, post_load
-from datetime import date
+from marshmallow import Schema, fields, validates, validates_schema, ValidationError, post_load
+from datetime import date, timezone
+
+
+def naive_utc(value):
+    """Timestamps are stored naive, in UTC: convert an aware datetime, leave a naive one alone."""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 
 # Basic user schema (for serialization, not password handling)
 class UserSchema(Schema):
@@ -15,6 +23,8 @@ class TVShowSchema(Schema):
     id = fields.Int(dump_only=True)
     title = fields.Str(required=True)
     description = fields.Str(allow_none=True)
+    updated_at = fields.DateTime(dump_only=True)
+    version = fields.Int(dump_only=True)
 
 # Season schema
 class SeasonSchema(Schema):
@@ -25,6 +35,8 @@ class SeasonSchema(Schema):
     date_started = fields.Date(allow_none=True)
     date_ended = fields.Date(allow_none=True)
     title = fields.Str(allow_none=True)
+    updated_at = fields.DateTime(dump_only=True)
+    version = fields.Int(dump_only=True)
 
     @validates("season_number")
     def validate_season_number(self, value):
@@ -47,6 +59,8 @@ class EpisodeSchema(Schema):
     description = fields.Str(allow_none=True)
     rating = fields.Int(allow_none=True)
     date_published = fields.Date(allow_none=True)
+    updated_at = fields.DateTime(dump_only=True)
+    version = fields.Int(dump_only=True)
 
     @validates("episode_number")
     def validate_episode_number(self, value):
@@ -58,6 +72,11 @@ class EpisodeSchema(Schema):
         if value is not None and (value < 0 or value > 10):
             raise ValidationError("rating must be between 0 and 10")
 
+# Episode with its actors embedded: only dump episodes whose actors were eager-loaded
+# (queries.season_with_episodes), or every episode lazy-loads them one by one
+class EpisodeWithActorsSchema(EpisodeSchema):
+    actors = fields.Nested("ActorSchema", many=True, dump_only=True)
+
 # Actor schema
 class ActorSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -71,6 +90,34 @@ class CrewSchema(Schema):
     last_name = fields.Str(allow_none=True)
     person_definition = fields.Str(allow_none=True)
 
+# Episode <-> actor / crew link schemas (bulk import)
+class EpisodeActorSchema(Schema):
+    episode_id = fields.Int(required=True)
+    actor_id = fields.Int(required=True)
+
+class EpisodeCrewSchema(Schema):
+    episode_id = fields.Int(required=True)
+    crew_id = fields.Int(required=True)
+
+# Aggregate stats schemas (read-only)
+class SeasonStatsSchema(Schema):
+    season_id = fields.Int()
+    episode_count = fields.Int()
+    avg_rating = fields.Float(allow_none=True)
+    first_air_date = fields.Date(allow_none=True)
+    last_air_date = fields.Date(allow_none=True)
+    actor_count = fields.Int()
+
+class ShowStatsSchema(Schema):
+    tvshow_id = fields.Int()
+    season_count = fields.Int()
+    episode_count = fields.Int()
+    avg_rating = fields.Float(allow_none=True)
+    first_air_date = fields.Date(allow_none=True)
+    last_air_date = fields.Date(allow_none=True)
+    actor_count = fields.Int()
+    updated_at = fields.DateTime()
+
 # ScreenTime schema
 class ScreenTimeSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -86,3 +133,17 @@ class ScreenTimeSchema(Schema):
         # simple check: must be a datetime string parseable by marshmallow
         if value is None:
             return
+
+    @validates_schema
+    def validate_interval(self, data, **kwargs):
+        start, end = naive_utc(data.get("start_time")), naive_utc(data.get("end_time"))
+        if start is not None and end is not None and end <= start:
+            raise ValidationError("end_time must be after start_time", "end_time")
+
+    @post_load
+    def to_naive_utc(self, data, **kwargs):
+        # "...Z" / "+02:00" inputs must compare with (and round-trip as) the naive stored values
+        for name in ("start_time", "end_time"):
+            if name in data:
+                data[name] = naive_utc(data[name])
+        return data
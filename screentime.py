@@ -0,0 +1,128 @@
+# screentime.py
+# Screentime analytics, aggregated in the database.
+#
+# Every figure is one GROUP BY over screentime joined up to the episode /
+# season / show it belongs to; nothing is loaded as ORM objects. Durations
+# are computed in SQL (EXTRACT(EPOCH ...) on PostgreSQL, julianday() on
+# SQLite) and rows without both a start and an end, or with end <= start,
+# are ignored.
+from sqlalchemy import func, select, and_
+from sqlalchemy.orm import aliased
+from models import TVShow, Season, Episode, Actor, ScreenTime
+from queries import hidden_seasons
+
+SCOPES = ("episode", "season", "show")
+
+
+class ScopeError(ValueError):
+    """Raised for an unknown scope / breakdown name."""
+
+
+def _seconds(dialect, start, end):
+    if dialect == "postgresql":
+        return func.extract("epoch", end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400.0
+
+
+def _least(dialect, a, b):
+    return func.least(a, b) if dialect == "postgresql" else func.min(a, b)
+
+
+def _greatest(dialect, a, b):
+    return func.greatest(a, b) if dialect == "postgresql" else func.max(a, b)
+
+
+def _timed(st=ScreenTime):
+    return and_(st.start_time.isnot(None), st.end_time.isnot(None), st.end_time > st.start_time)
+
+
+def _in_scope(stmt, scope, scope_id, st=ScreenTime):
+    """Restrict ``stmt`` (selecting from ``st``) to one episode, season or show, unless soft-deleted."""
+    if scope not in SCOPES:
+        raise ScopeError(f"scope must be one of: {', '.join(SCOPES)}")
+    stmt = stmt.join(Episode, Episode.id == st.episode_id).where(Episode.season_id.not_in(hidden_seasons()))
+    if scope == "episode":
+        return stmt.where(st.episode_id == scope_id)
+    if scope == "season":
+        return stmt.where(Episode.season_id == scope_id)
+    return stmt.join(Season, Season.id == Episode.season_id).where(Season.tvshow_id == scope_id)
+
+
+def _totals(seconds, segments):
+    seconds = float(seconds or 0)
+    return {"seconds": round(seconds, 1), "minutes": round(seconds / 60, 2), "segments": segments}
+
+
+def actor_totals(conn, scope, scope_id, limit=None):
+    """On-screen time per actor within an episode/season/show, longest first."""
+    seconds = func.sum(_seconds(conn.dialect.name, ScreenTime.start_time, ScreenTime.end_time))
+    stmt = _in_scope(
+        select(ScreenTime.actor_id, Actor.first_name, Actor.last_name, seconds.label("seconds"), func.count())
+        .join(Actor, Actor.id == ScreenTime.actor_id)
+        .where(_timed()),
+        scope, scope_id,
+    ).group_by(ScreenTime.actor_id, Actor.first_name, Actor.last_name).order_by(seconds.desc(), ScreenTime.actor_id)
+    if limit:
+        stmt = stmt.limit(limit)
+    return [{"actor_id": actor_id, "first_name": first, "last_name": last, **_totals(secs, n)}
+            for actor_id, first, last, secs, n in conn.execute(stmt)]
+
+
+def role_breakdown(conn, scope, scope_id):
+    """On-screen time per role_type within an episode/season/show."""
+    seconds = func.sum(_seconds(conn.dialect.name, ScreenTime.start_time, ScreenTime.end_time))
+    stmt = _in_scope(
+        select(ScreenTime.role_type, seconds, func.count(), func.count(ScreenTime.actor_id.distinct()))
+        .where(_timed()),
+        scope, scope_id,
+    ).group_by(ScreenTime.role_type).order_by(seconds.desc())
+    return [{"role_type": role, "actors": actors, **_totals(secs, n)}
+            for role, secs, n, actors in conn.execute(stmt)]
+
+
+def actor_breakdown(conn, actor_id, by):
+    """One actor's on-screen time per episode, season or show they appear in."""
+    seconds = func.sum(_seconds(conn.dialect.name, ScreenTime.start_time, ScreenTime.end_time))
+    stmt = select(seconds, func.count()).join(Episode, Episode.id == ScreenTime.episode_id) \
+        .where(ScreenTime.actor_id == actor_id, _timed(), Episode.season_id.not_in(hidden_seasons()))
+    if by == "episode":
+        keys = [Episode.id, Episode.season_id, Episode.episode_number, Episode.title]
+        names = ["episode_id", "season_id", "episode_number", "title"]
+    elif by == "season":
+        stmt = stmt.join(Season, Season.id == Episode.season_id)
+        keys = [Season.id, Season.tvshow_id, Season.season_number]
+        names = ["season_id", "tvshow_id", "season_number"]
+    elif by == "show":
+        stmt = stmt.join(Season, Season.id == Episode.season_id).join(TVShow, TVShow.id == Season.tvshow_id)
+        keys = [TVShow.id, TVShow.title]
+        names = ["tvshow_id", "title"]
+    else:
+        raise ScopeError(f"by must be one of: {', '.join(SCOPES)}")
+    stmt = stmt.add_columns(*keys).group_by(*keys).order_by(*keys[:3])
+    return [{**dict(zip(names, row[2:])), **_totals(row[0], row[1])} for row in conn.execute(stmt)]
+
+
+def overlaps(conn, scope, scope_id, actor_id=None, limit=None):
+    """Pairs of actors on screen at the same time, with the seconds they overlap, most first.
+
+    Each pair is reported once (lower actor id first), or, with ``actor_id``,
+    as that actor's overlap with everyone else.
+    """
+    dialect = conn.dialect.name
+    a, b = aliased(ScreenTime, name="a"), aliased(ScreenTime, name="b")
+    overlap = func.sum(_seconds(dialect, _greatest(dialect, a.start_time, b.start_time),
+                                _least(dialect, a.end_time, b.end_time)))
+    pair = a.actor_id != b.actor_id if actor_id is not None else a.actor_id < b.actor_id
+    stmt = _in_scope(
+        select(a.actor_id, b.actor_id, overlap, func.count())
+        .join(b, and_(b.episode_id == a.episode_id, pair,
+                      b.start_time < a.end_time, a.start_time < b.end_time))
+        .where(_timed(a), _timed(b)),
+        scope, scope_id, st=a,
+    )
+    if actor_id is not None:
+        stmt = stmt.where(a.actor_id == actor_id)
+    stmt = stmt.group_by(a.actor_id, b.actor_id).order_by(overlap.desc(), a.actor_id, b.actor_id)
+    if limit:
+        stmt = stmt.limit(limit)
+    return [{"actor_id": x, "other_actor_id": y, **_totals(secs, n)} for x, y, secs, n in conn.execute(stmt)]
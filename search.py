@@ -0,0 +1,170 @@
+# search.py
+# Ranked full-text search across shows, episodes, actors and crew.
+#
+# PostgreSQL: each searchable table carries a generated ``search_vector``
+# tsvector column (GIN indexed), so it is always current without app code.
+# SQLite (dev/tests): an FTS5 table ``search_index`` kept current by
+# triggers. Its rowid packs (ref_id, kind) so trigger updates/deletes are
+# rowid lookups instead of scans.
+from sqlalchemy import event
+from extensions import db
+
+# kind -> (table, label expression, tsvector expression, text search config)
+PG_SOURCES = {
+    "show": (
+        "tvshow", "title",
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        "english",
+    ),
+    "episode": (
+        "episode", "title",
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        "english",
+    ),
+    "actor": (
+        "actor", "first_name || coalesce(' ' || last_name, '')",
+        "setweight(to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '')), 'A')",
+        "simple",
+    ),
+    "crew": (
+        "crew", "coalesce(first_name, '') || coalesce(' ' || last_name, '')",
+        "setweight(to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(person_definition, '')), 'B')",
+        "simple",
+    ),
+}
+
+SEARCH_KINDS = list(PG_SOURCES)
+
+# kind -> (code packed into the FTS rowid, table, title expr, body expr) using NEW./OLD. row refs
+SQLITE_SOURCES = {
+    "show": (0, "tvshow", "{r}.title", "coalesce({r}.description, '')"),
+    "episode": (1, "episode", "{r}.title", "coalesce({r}.description, '')"),
+    "actor": (2, "actor", "{r}.first_name || coalesce(' ' || {r}.last_name, '')", "''"),
+    "crew": (3, "crew", "coalesce({r}.first_name, '') || coalesce(' ' || {r}.last_name, '')",
+             "coalesce({r}.person_definition, '')"),
+}
+KIND_BITS = 2
+
+# kind -> SQL condition on {r} matching rows of soft-deleted shows (deletion.py), which stay
+# out of results until the purge removes them; both are index lookups on a small set
+HIDDEN = {
+    "show": "{r}.deleted_at IS NOT NULL",
+    "episode": "{r}.season_id IN (SELECT id FROM season WHERE tvshow_id IN "
+               "(SELECT id FROM tvshow WHERE deleted_at IS NOT NULL))",
+}
+
+
+# ---------- schema ----------
+def _pg_ddl(kind):
+    table, _, vector, _ = PG_SOURCES[kind]
+    return [
+        f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED",
+        f"CREATE INDEX ix_{table}_search_vector ON {table} USING gin (search_vector)",
+    ]
+
+
+def _sqlite_ddl():
+    stmts = ["CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(title, body, tokenize='porter unicode61')"]
+    for kind, (code, table, title, body) in SQLITE_SOURCES.items():
+        rowid = "({r}.id << %d) | %d" % (KIND_BITS, code)
+        insert = (f"INSERT INTO search_index(rowid, title, body) "
+                  f"VALUES ({rowid.format(r='new')}, {title.format(r='new')}, {body.format(r='new')});")
+        delete = f"DELETE FROM search_index WHERE rowid = {rowid.format(r='old')};"
+        stmts += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN {delete} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE ON {table} BEGIN {delete} {insert} END",
+        ]
+    return stmts
+
+
+def _sqlite_populate():
+    return [
+        f"INSERT INTO search_index(rowid, title, body) "
+        f"SELECT (id << {KIND_BITS}) | {code}, {title.format(r=table)}, {body.format(r=table)} FROM {table}"
+        for code, table, title, body in SQLITE_SOURCES.values()
+    ]
+
+
+def ensure_sqlite_search_index(conn):
+    """Create (and backfill) the FTS5 index and its triggers if this SQLite db lacks them."""
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+    ).first()
+    if exists:
+        return
+    for stmt in _sqlite_ddl() + _sqlite_populate():
+        conn.exec_driver_sql(stmt)
+
+
+@event.listens_for(db.metadata, "after_create")
+def _create_search_schema(metadata, conn, **kw):
+    # create_all path; migrated PostgreSQL databases get this from alembic
+    if conn.dialect.name == "postgresql":
+        for kind in PG_SOURCES:
+            for stmt in _pg_ddl(kind):
+                conn.exec_driver_sql(stmt)
+    elif conn.dialect.name == "sqlite":
+        ensure_sqlite_search_index(conn)
+
+
+# ---------- querying ----------
+def _fts5_query(q):
+    """Quote every term (so user input can't use FTS5 syntax); prefix-match the last one."""
+    terms = ['"%s"' % t.replace('"', '""') for t in q.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _search_postgres(session, q, kinds, limit, offset):
+    parts = []
+    for kind in kinds:
+        table, label, _, config = PG_SOURCES[kind]
+        query = f"websearch_to_tsquery('{config}', :q)"
+        parts.append(
+            f"SELECT '{kind}' AS kind, id, {label} AS title, ts_rank_cd(search_vector, {query}) AS rank "
+            f"FROM {table} WHERE search_vector @@ {query}"
+            + (f" AND NOT ({HIDDEN[kind].format(r=table)})" if kind in HIDDEN else "")
+        )
+    sql = " UNION ALL ".join(parts) + " ORDER BY rank DESC, kind, id LIMIT :limit OFFSET :offset"
+    return session.execute(db.text(sql), {"q": q, "limit": limit, "offset": offset}).all()
+
+
+_sqlite_ready = set()
+
+
+def _search_sqlite(session, q, kinds, limit, offset):
+    # databases built by `flask db upgrade` get the FTS index on first search
+    engine = session.get_bind()
+    if engine.url not in _sqlite_ready:
+        with engine.begin() as conn:
+            ensure_sqlite_search_index(conn)
+        _sqlite_ready.add(engine.url)
+    codes = [SQLITE_SOURCES[k][0] for k in kinds]
+    names = {SQLITE_SOURCES[k][0]: k for k in SQLITE_SOURCES}
+    mask = (1 << KIND_BITS) - 1
+    hidden = " UNION ALL ".join(
+        f"SELECT ({table}.id << {KIND_BITS}) | {code} FROM {table} WHERE {HIDDEN[kind].format(r=table)}"
+        for kind, (code, table, _, _) in SQLITE_SOURCES.items() if kind in HIDDEN and kind in kinds
+    )
+    sql = (
+        f"SELECT rowid, title, -bm25(search_index, 10.0, 1.0) AS rank FROM search_index "
+        f"WHERE search_index MATCH :q AND (rowid & {mask}) IN ({', '.join(map(str, codes))}) "
+        + (f"AND rowid NOT IN ({hidden}) " if hidden else "")
+        + "ORDER BY rank DESC, rowid LIMIT :limit OFFSET :offset"
+    )
+    rows = session.execute(db.text(sql), {"q": _fts5_query(q), "limit": limit, "offset": offset})
+    return [(names[rowid & mask], rowid >> KIND_BITS, title, rank) for rowid, title, rank in rows]
+
+
+def search(q, kinds=None, limit=20, offset=0, session=None):
+    """Ranked matches for ``q`` as (kind, id, title, rank) tuples, best first."""
+    kinds = kinds or SEARCH_KINDS
+    session = session or db.session
+    if session.get_bind().dialect.name == "postgresql":
+        return _search_postgres(session, q, kinds, limit, offset)
+    return _search_sqlite(session, q, kinds, limit, offset)
@@ -0,0 +1,123 @@
+# season_batch.py
+# Many episode edits of one season in one transaction.
+#
+# Every change is validated against the season as it is (rows locked FOR
+# UPDATE on PostgreSQL) and against the numbering the whole batch produces,
+# so a swap of episode 1 and 2 is fine while two episodes ending up as
+# number 3 is reported. Renumbering is done in two phases: episodes that
+# change number first move to temporary numbers above every number in use,
+# then take their final numbers, so uq_season_episode never sees a
+# duplicate in between (it is not deferrable). Updates are Core statements
+# and bump version/updated_at themselves, like an ORM update would; the
+# season's stats are adjusted in the same transaction. The caller commits.
+from datetime import datetime
+from marshmallow import ValidationError
+from sqlalchemy import bindparam, select, update
+from extensions import db
+from models import Episode
+from schemas import EpisodeSchema
+import stats
+
+EDITABLE = ("episode_number", "title", "description", "rating", "date_published")
+
+
+class BatchError(Exception):
+    """Raised before any write; ``results`` has an entry per change and ``status`` the HTTP code."""
+
+    def __init__(self, results, status=400):
+        super().__init__("episode batch rejected")
+        self.results = results
+        self.status = status
+
+
+def _check(change, rows, seen, schema):
+    """(result, values to write) for one change; result["status"] is "error"/"conflict" if it can't apply."""
+    if not isinstance(change, dict):
+        return {"id": None, "status": "error", "errors": {"_schema": ["each change must be an object"]}}, None
+    episode_id = change.get("id")
+    result = {"id": episode_id}
+    if not isinstance(episode_id, int) or isinstance(episode_id, bool) or episode_id not in rows:
+        return {**result, "status": "error", "errors": {"id": ["not an episode of this season"]}}, None
+    if episode_id in seen:
+        return {**result, "status": "error", "errors": {"id": ["listed more than once"]}}, None
+    seen.add(episode_id)
+    row = rows[episode_id]
+    version = change.get("version")
+    if "version" in change and (not isinstance(version, int) or isinstance(version, bool)):
+        return {**result, "status": "error", "errors": {"version": ["must be an integer"]}}, None
+    fields = {k: v for k, v in change.items() if k not in ("id", "version")}
+    try:
+        loaded = schema.load(fields)
+    except ValidationError as e:
+        return {**result, "status": "error", "errors": e.messages}, None
+    if "version" in change and version != row.version:
+        return {**result, "status": "conflict", "version": row.version}, None
+    return result, {k: v for k, v in loaded.items() if getattr(row, k) != v}
+
+
+def apply(season_id, changes, conn=None):
+    """Apply ``changes`` ([{"id", <episode fields>..., optional "version"}]) to the season's episodes.
+
+    Returns one result per change: {"id", "status": "updated"|"unchanged",
+    "version"}. Raises BatchError if any change is invalid, names an episode
+    of another season, expects a stale version, or the resulting numbering
+    has duplicates; nothing is written then, and the valid changes are
+    reported as "skipped".
+    """
+    conn = conn if conn is not None else db.session.connection()
+    if not isinstance(changes, list) or not changes:
+        raise BatchError([{"id": None, "status": "error",
+                           "errors": {"episodes": ["a non-empty list of changes is required"]}}])
+    rows = {row.id: row for row in conn.execute(
+        select(Episode.id, Episode.version, *(getattr(Episode, k) for k in EDITABLE))
+        .where(Episode.season_id == season_id).with_for_update())}
+    schema = EpisodeSchema(partial=True, only=EDITABLE)
+    results, updates, seen = [], {}, set()
+    for change in changes:
+        result, values = _check(change, rows, seen, schema)
+        results.append(result)
+        if values is not None:
+            updates[result["id"]] = values
+
+    numbers = {eid: row.episode_number for eid, row in rows.items()}
+    numbers.update((eid, v["episode_number"]) for eid, v in updates.items() if "episode_number" in v)
+    holders = {}
+    for eid, number in numbers.items():
+        holders.setdefault(number, []).append(eid)
+    for result in results:
+        clash = [eid for eid in holders.get(numbers.get(result["id"]), []) if eid != result["id"]]
+        if "status" not in result and clash:
+            result.update(status="error", errors={"episode_number": [
+                f"episode_number {numbers[result['id']]} would also be used by episode {clash[0]}"]})
+    if any("status" in r for r in results):
+        statuses = {r.get("status") for r in results}
+        for result in results:
+            result.setdefault("status", "skipped")  # valid, but the batch is all or nothing
+        raise BatchError(results, 412 if statuses <= {"conflict", None} else 400)
+
+    table = Episode.__table__
+    before = stats.snapshot([eid for eid, values in updates.items() if values], conn)
+    moved = sorted(eid for eid, v in updates.items() if "episode_number" in v)
+    if moved:
+        # phase 1: out of the way, above every number in use before or after
+        start = max(max(numbers.values()), max(row.episode_number for row in rows.values())) + 1
+        conn.execute(update(table).where(table.c.id == bindparam("_id"))
+                     .values(episode_number=bindparam("_number")),
+                     [{"_id": eid, "_number": start + i} for i, eid in enumerate(moved)])
+    now = datetime.utcnow()
+    groups = {}
+    for eid, values in updates.items():
+        if values:
+            groups.setdefault(tuple(sorted(values)), []).append({"_id": eid, **values})
+    for keys, params in groups.items():
+        # phase 2: final values, bumping version/updated_at as the ORM would
+        conn.execute(update(table).where(table.c.id == bindparam("_id"))
+                     .values(version=table.c.version + 1, updated_at=now, **{k: bindparam(k) for k in keys}),
+                     params)
+    for result in results:
+        changed = bool(updates.get(result["id"]))
+        result.update(status="updated" if changed else "unchanged",
+                      version=rows[result["id"]].version + changed)
+    if groups:
+        stats.apply(before, conn)
+    return results
@@ -0,0 +1,423 @@
+# stats.py
+# Maintenance of the season_stats / show_stats aggregate tables.
+#
+# Reads are a primary-key lookup. Writes apply deltas: the counts and the
+# rating sum are incremented, an added air date can only widen the
+# first/last bounds, and a bound is recomputed only when a removed date was
+# that bound (over the season's episodes, or the show's season_stats rows).
+# Distinct actors can't be counted that way, so season_actor / show_actor
+# hold each actor's number of episodes in the season / show: a row
+# appearing or going away moves actor_count by one. ORM writes are picked up
+# by the flush hooks below; Core write paths take a snapshot() before
+# writing and pass it to apply() afterwards, cast-only writes call
+# cast_changed(), and deleting a whole season goes through forget_season().
+# Bulk imports and rebuilds recompute whole seasons and shows with
+# refresh_seasons / refresh_shows instead.
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import bindparam, case, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+from extensions import db
+from models import (TVShow, Season, Episode, Actor, SeasonStats, ShowStats, SeasonActor, ShowActor,
+                    episode_actors)
+from bulk import dialect_insert, upsert
+
+SEASON_FIELDS = ["episode_count", "rated_episode_count", "rating_sum",
+                 "first_air_date", "last_air_date", "actor_count", "updated_at"]
+SHOW_FIELDS = ["season_count"] + SEASON_FIELDS
+# counters summed from a season's delta into its show's (actor_count isn't: actors are distinct per level)
+ROLLED_UP = ["season_count", "episode_count", "rated_episode_count", "rating_sum"]
+CHUNK = 500
+
+
+def _conn(conn):
+    return conn if conn is not None else db.session.connection()
+
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), CHUNK):
+        yield values[i:i + CHUNK]
+
+
+class _Level:
+    """One aggregate table: its key, its counters and how to recompute a first/last bound."""
+
+    def __init__(self, model, key, counters, appearances, first, last):
+        self.table = model.__table__
+        self.key = key
+        self.counters = counters
+        self.appearances = appearances.__table__
+        self.recompute = {"first_air_date": first, "last_air_date": last}
+
+
+def _season_bound(agg):
+    return select(agg(Episode.date_published)).where(Episode.season_id == SeasonStats.season_id).scalar_subquery()
+
+
+def _show_bound(agg, column):
+    return (select(agg(column)).join(Season, Season.id == SeasonStats.season_id)
+            .where(Season.tvshow_id == ShowStats.tvshow_id).scalar_subquery())
+
+
+SEASONS = _Level(SeasonStats, "season_id", ["episode_count", "rated_episode_count", "rating_sum", "actor_count"],
+                 SeasonActor, _season_bound(func.min), _season_bound(func.max))
+SHOWS = _Level(ShowStats, "tvshow_id", ["season_count", "episode_count", "rated_episode_count", "rating_sum",
+                                        "actor_count"],
+               ShowActor, _show_bound(func.min, SeasonStats.first_air_date),
+               _show_bound(func.max, SeasonStats.last_air_date))
+
+
+# ---------- deltas ----------
+def _delta():
+    return {"season_count": 0, "episode_count": 0, "rated_episode_count": 0, "rating_sum": 0,
+            "actor_count": 0, "added": [], "removed": []}
+
+
+def snapshot(episode_ids, conn=None):
+    """{episode_id: (season_id, rating, date_published, actor ids), or None if missing} as currently stored."""
+    conn = _conn(conn)
+    state = dict.fromkeys(eid for eid in episode_ids if eid is not None)
+    for ids in _chunks(state):
+        for eid, season_id, rating, published, actor_id in conn.execute(
+                select(Episode.id, Episode.season_id, Episode.rating, Episode.date_published,
+                       episode_actors.c.actor_id)
+                .outerjoin(episode_actors, episode_actors.c.episode_id == Episode.id)
+                .where(Episode.id.in_(ids))):
+            if state[eid] is None:
+                state[eid] = (season_id, rating, published, set())
+            if actor_id is not None:
+                state[eid][3].add(actor_id)
+    return state
+
+
+def _count(seasons, links, state, sign):
+    season_id, rating, published, cast = state
+    delta = seasons.setdefault(season_id, _delta())
+    delta["episode_count"] += sign
+    if rating is not None:
+        delta["rated_episode_count"] += sign
+        delta["rating_sum"] += sign * rating
+    if published is not None:
+        delta["added" if sign > 0 else "removed"].append(published)
+    for actor_id in cast:
+        links[(season_id, actor_id)] += sign
+
+
+def _episode_deltas(before, after):
+    """({season_id: delta}, Counter of (season_id, actor_id) -> change in appearances) between two snapshots."""
+    seasons, links = {}, Counter()
+    for eid in before.keys() | after.keys():
+        old, new = before.get(eid), after.get(eid)
+        if old == new:
+            continue
+        if old is not None:
+            _count(seasons, links, old, -1)
+        if new is not None:
+            _count(seasons, links, new, 1)
+    return seasons, links
+
+
+def _shows_of(season_ids, conn):
+    """{season_id: show_id}, leaving out seasons of soft-deleted shows (they have no show_stats)."""
+    shows = {}
+    for ids in _chunks(season_ids):
+        shows.update(conn.execute(select(Season.id, Season.tvshow_id).join(TVShow, TVShow.id == Season.tvshow_id)
+                                  .where(Season.id.in_(ids), TVShow.deleted_at.is_(None))).all())
+    return shows
+
+
+def _adjust_appearances(level, links, conn):
+    """Apply appearance changes ({(key, actor_id): change}); returns {key: change in actor_count}."""
+    table, key = level.appearances, level.key
+    grown = {link: n for link, n in links.items() if n > 0}
+    shrunk = {link: -n for link, n in links.items() if n < 0}
+    actor_counts = Counter()
+    if grown:
+        stmt = dialect_insert(table, conn)
+        stmt = stmt.on_conflict_do_update(index_elements=[key, "actor_id"],
+                                          set_={"appearances": table.c.appearances + stmt.excluded.appearances})
+        rows = conn.execute(stmt.returning(table.c[key], table.c.actor_id, table.c.appearances),
+                            [{key: k, "actor_id": a, "appearances": n} for (k, a), n in grown.items()])
+        for k, actor_id, appearances in rows:
+            if appearances == grown[(k, actor_id)]:  # the row is new: the actor wasn't there before
+                actor_counts[k] += 1
+    if shrunk:
+        conn.execute(update(table).where(table.c[key] == bindparam("_key"), table.c.actor_id == bindparam("_actor"))
+                     .values(appearances=table.c.appearances - bindparam("_n")),
+                     [{"_key": k, "_actor": a, "_n": n} for (k, a), n in shrunk.items()])
+        for ids in _chunks({k for k, _ in shrunk}):
+            for k in conn.execute(table.delete().where(table.c[key].in_(ids), table.c.appearances <= 0)
+                                  .returning(table.c[key])).scalars():
+                actor_counts[k] -= 1
+    return actor_counts
+
+
+def _bound(level, name, added, removed):
+    """New value of first_air_date / last_air_date after dates were added / removed (bound parameters)."""
+    column, earliest = level.table.c[name], name == "first_air_date"
+    whens = []
+    if removed:
+        gone = bindparam("_removed_" + name)
+        # the bound itself went away: recompute it from what is left
+        whens.append((column >= gone if earliest else column <= gone, level.recompute[name]))
+    if added:
+        new = bindparam("_added_" + name)
+        whens.append((column.is_(None) | (new < column if earliest else new > column), new))
+    return case(*whens, else_=column) if whens else column
+
+
+def _update_rows(level, deltas, conn):
+    """Apply {key: delta} to ``level``'s rows, one executemany per combination of changed bounds."""
+    now = datetime.utcnow()
+    groups = {}
+    for k, delta in deltas.items():
+        if not (any(delta[c] for c in level.counters) or delta["added"] or delta["removed"]):
+            continue
+        params = {"_key": k, **{"_" + c: delta[c] for c in level.counters}}
+        for kind, values in (("added", delta["added"]), ("removed", delta["removed"])):
+            if values:
+                params.update({f"_{kind}_first_air_date": min(values), f"_{kind}_last_air_date": max(values)})
+        groups.setdefault((bool(delta["added"]), bool(delta["removed"])), []).append(params)
+    table = level.table
+    for (added, removed), params in groups.items():
+        values = {c: table.c[c] + bindparam("_" + c) for c in level.counters}
+        values.update({name: _bound(level, name, added, removed) for name in ("first_air_date", "last_air_date")})
+        conn.execute(update(table).where(table.c[level.key] == bindparam("_key")).values(updated_at=now, **values),
+                     params)
+
+
+def _apply(seasons, links, conn):
+    """Apply season deltas and appearance changes to both levels (seasons first: shows roll up from them)."""
+    links = {link: n for link, n in links.items() if n}
+    show_of = _shows_of(set(seasons) | {season_id for season_id, _ in links}, conn)
+    shows, show_links = {}, Counter()
+    for season_id, delta in seasons.items():
+        if season_id in show_of:
+            total = shows.setdefault(show_of[season_id], _delta())
+            for c in ROLLED_UP:
+                total[c] += delta[c]
+            total["added"] += delta["added"]
+            total["removed"] += delta["removed"]
+    for (season_id, actor_id), n in links.items():
+        if season_id in show_of:
+            show_links[(show_of[season_id], actor_id)] += n
+    for k, n in _adjust_appearances(SEASONS, links, conn).items():
+        seasons.setdefault(k, _delta())["actor_count"] += n
+    for k, n in _adjust_appearances(SHOWS, {link: n for link, n in show_links.items() if n}, conn).items():
+        shows.setdefault(k, _delta())["actor_count"] += n
+    _update_rows(SEASONS, seasons, conn)
+    _update_rows(SHOWS, shows, conn)
+
+
+def apply(before, conn=None):
+    """Adjust the aggregates for the episodes in ``before`` (a snapshot() taken before the write)."""
+    conn = _conn(conn)
+    _apply(*_episode_deltas(before, snapshot(before, conn)), conn)
+
+
+def cast_changed(links, conn=None):
+    """Adjust the actor counts for cast links added or removed: (season_id, actor_id, +1 / -1) tuples."""
+    changes = Counter()
+    for season_id, actor_id, n in links:
+        changes[(season_id, actor_id)] += n
+    _apply({}, changes, _conn(conn))
+
+
+def forget_season(season_id, show_id, conn=None):
+    """Take a season out of its show's aggregates and drop its own, before deleting it.
+
+    A fixed number of set-based statements, however big the season is.
+    """
+    conn = _conn(conn)
+    table, seasons, shows = SeasonStats.__table__, SeasonActor.__table__, ShowActor.__table__
+    row = conn.execute(table.delete().where(table.c.season_id == season_id).returning(
+        table.c.episode_count, table.c.rated_episode_count, table.c.rating_sum,
+        table.c.first_air_date, table.c.last_air_date)).first()
+    conn.execute(update(shows)
+                 .where(shows.c.tvshow_id == show_id, shows.c.actor_id == seasons.c.actor_id,
+                        seasons.c.season_id == season_id)
+                 .values(appearances=shows.c.appearances - seasons.c.appearances))
+    gone = conn.execute(shows.delete().where(shows.c.tvshow_id == show_id, shows.c.appearances <= 0)).rowcount
+    conn.execute(seasons.delete().where(seasons.c.season_id == season_id))
+    delta = _delta()
+    delta.update(season_count=-1, actor_count=-gone)
+    if row is not None:
+        delta.update(episode_count=-row.episode_count, rated_episode_count=-row.rated_episode_count,
+                     rating_sum=-row.rating_sum,
+                     removed=[d for d in (row.first_air_date, row.last_air_date) if d is not None])
+    _update_rows(SHOWS, {show_id: delta}, conn)
+
+
+def forget_show(show_id, conn=None):
+    """Drop a show's own aggregate rows (its seasons' stay until the seasons are deleted)."""
+    conn = _conn(conn)
+    conn.execute(ShowStats.__table__.delete().where(ShowStats.tvshow_id == show_id))
+    conn.execute(ShowActor.__table__.delete().where(ShowActor.tvshow_id == show_id))
+
+
+# ---------- full recomputation ----------
+def refresh_seasons(season_ids, conn=None):
+    """Recompute season_stats for ``season_ids`` and show_stats for their shows."""
+    conn = _conn(conn)
+    season_ids = set(season_ids)
+    if not season_ids:
+        return
+    now = datetime.utcnow()
+    rows = {sid: {"season_id": sid, "episode_count": 0, "rated_episode_count": 0, "rating_sum": 0,
+                  "first_air_date": None, "last_air_date": None, "actor_count": 0, "updated_at": now}
+            for sid in conn.execute(select(Season.id).where(Season.id.in_(season_ids))).scalars()}
+
+    episodes = conn.execute(
+        select(Episode.season_id, func.count(), func.count(Episode.rating),
+               func.coalesce(func.sum(Episode.rating), 0),
+               func.min(Episode.date_published), func.max(Episode.date_published))
+        .where(Episode.season_id.in_(rows))
+        .group_by(Episode.season_id)
+    )
+    for sid, count, rated, rating_sum, first, last in episodes:
+        rows[sid].update(episode_count=count, rated_episode_count=rated, rating_sum=rating_sum,
+                         first_air_date=first, last_air_date=last)
+
+    appearances = SeasonActor.__table__
+    conn.execute(appearances.delete().where(appearances.c.season_id.in_(rows)))
+    conn.execute(appearances.insert().from_select(
+        ["season_id", "actor_id", "appearances"],
+        select(Episode.season_id, episode_actors.c.actor_id, func.count())
+        .join(episode_actors, episode_actors.c.episode_id == Episode.id)
+        .where(Episode.season_id.in_(rows))
+        .group_by(Episode.season_id, episode_actors.c.actor_id)))
+    actors = conn.execute(select(appearances.c.season_id, func.count())
+                          .where(appearances.c.season_id.in_(rows)).group_by(appearances.c.season_id))
+    for sid, count in actors:
+        rows[sid]["actor_count"] = count
+
+    upsert(SeasonStats.__table__, list(rows.values()), ["season_id"], SEASON_FIELDS, conn=conn)
+    show_ids = conn.execute(select(Season.tvshow_id).where(Season.id.in_(rows)).distinct()).scalars()
+    _refresh_show_rows(set(show_ids), conn)
+
+
+def refresh_shows(show_ids, conn=None):
+    """Recompute every season of ``show_ids`` and then the shows themselves."""
+    conn = _conn(conn)
+    show_ids = set(show_ids)
+    if not show_ids:
+        return
+    season_ids = set(conn.execute(select(Season.id).where(Season.tvshow_id.in_(show_ids))).scalars())
+    if season_ids:
+        refresh_seasons(season_ids, conn)
+    # shows without seasons still need a (zero) row
+    _refresh_show_rows(show_ids, conn)
+
+
+def _refresh_show_rows(show_ids, conn):
+    if not show_ids:
+        return
+    now = datetime.utcnow()
+    rows = {sid: {"tvshow_id": sid, "season_count": 0, "episode_count": 0, "rated_episode_count": 0,
+                  "rating_sum": 0, "first_air_date": None, "last_air_date": None, "actor_count": 0,
+                  "updated_at": now}
+            for sid in conn.execute(select(TVShow.id).where(TVShow.id.in_(show_ids),
+                                                            TVShow.deleted_at.is_(None))).scalars()}
+    if not rows:
+        return
+
+    seasons = conn.execute(
+        select(Season.tvshow_id, func.count(Season.id),
+               func.coalesce(func.sum(SeasonStats.episode_count), 0),
+               func.coalesce(func.sum(SeasonStats.rated_episode_count), 0),
+               func.coalesce(func.sum(SeasonStats.rating_sum), 0),
+               func.min(SeasonStats.first_air_date), func.max(SeasonStats.last_air_date))
+        .outerjoin(SeasonStats, SeasonStats.season_id == Season.id)
+        .where(Season.tvshow_id.in_(rows))
+        .group_by(Season.tvshow_id)
+    )
+    for sid, season_count, count, rated, rating_sum, first, last in seasons:
+        rows[sid].update(season_count=season_count, episode_count=count, rated_episode_count=rated,
+                         rating_sum=rating_sum, first_air_date=first, last_air_date=last)
+
+    # distinct actors can't be summed from the seasons, their appearances can
+    appearances = ShowActor.__table__
+    conn.execute(appearances.delete().where(appearances.c.tvshow_id.in_(rows)))
+    conn.execute(appearances.insert().from_select(
+        ["tvshow_id", "actor_id", "appearances"],
+        select(Season.tvshow_id, SeasonActor.actor_id, func.sum(SeasonActor.appearances))
+        .join(SeasonActor, SeasonActor.season_id == Season.id)
+        .where(Season.tvshow_id.in_(rows))
+        .group_by(Season.tvshow_id, SeasonActor.actor_id)))
+    actors = conn.execute(select(appearances.c.tvshow_id, func.count())
+                          .where(appearances.c.tvshow_id.in_(rows)).group_by(appearances.c.tvshow_id))
+    for sid, count in actors:
+        rows[sid]["actor_count"] = count
+
+    upsert(ShowStats.__table__, list(rows.values()), ["tvshow_id"], SHOW_FIELDS, conn=conn)
+
+
+def rebuild_all(conn=None):
+    """Recompute every aggregate row (e.g. after a restore)."""
+    conn = _conn(conn)
+    refresh_shows(conn.execute(select(TVShow.id).where(TVShow.deleted_at.is_(None))).scalars().all(), conn)
+
+
+# ---------- ORM writes ----------
+@event.listens_for(Session, "before_flush")
+def _snapshot_episodes(session, flush_context, instances):
+    """Record the stored state of every episode this flush will change."""
+    touched, dead_actors, catalog = set(), set(), False
+    for obj in session.dirty:
+        if isinstance(obj, Episode) and session.is_modified(obj):
+            touched.add(obj.id)
+        elif isinstance(obj, Actor):
+            history = inspect(obj).attrs.episodes.history
+            touched.update(e.id for e in history.added + history.deleted if e.id is not None)
+    for obj in session.deleted:
+        if isinstance(obj, Episode):
+            touched.add(obj.id)
+        elif isinstance(obj, Actor):
+            dead_actors.add(obj.id)
+        catalog = catalog or isinstance(obj, (TVShow, Season))
+    catalog = catalog or any(isinstance(obj, (TVShow, Season, Episode)) for obj in session.new)
+
+    if not (touched or dead_actors or catalog):
+        return
+    conn = session.connection()
+    for ids in _chunks(dead_actors):
+        touched.update(conn.execute(select(episode_actors.c.episode_id)
+                                    .where(episode_actors.c.actor_id.in_(ids))).scalars())
+    session.info["stats_snapshot"] = snapshot(touched, conn)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_catalog_changes(session, flush_context):
+    """Apply the aggregate changes of this flush, inside the same transaction."""
+    before = session.info.pop("stats_snapshot", None)
+    if before is None:
+        return
+    conn = session.connection()
+    new_shows = [obj.id for obj in session.new if isinstance(obj, TVShow)]
+    new_seasons = [obj.id for obj in session.new if isinstance(obj, Season)]
+    for ep in session.new:
+        if isinstance(ep, Episode):  # ids are assigned by now; they didn't exist before
+            before.setdefault(ep.id, None)
+    dead_seasons = {obj.id: obj.tvshow_id for obj in session.deleted if isinstance(obj, Season)}
+    dead_shows = {obj.id for obj in session.deleted if isinstance(obj, TVShow)}
+
+    # new shows and seasons start from a zero row; a new season counts in its show
+    upsert(ShowStats.__table__, [{"tvshow_id": sid} for sid in new_shows], ["tvshow_id"], conn=conn)
+    upsert(SeasonStats.__table__, [{"season_id": sid} for sid in new_seasons], ["season_id"], conn=conn)
+    seasons, links = _episode_deltas(before, snapshot(before, conn))
+    for sid in new_seasons:
+        seasons.setdefault(sid, _delta())["season_count"] += 1
+    _apply(seasons, links, conn)
+
+    if not (dead_seasons or dead_shows):
+        return
+    # ON DELETE CASCADE covers these where foreign keys are enforced; SQLite
+    # usually doesn't enforce them. The ORM deletes whole seasons and shows
+    # only outside the app's own paths (see deletion.py), so the shows left
+    # are simply recomputed.
+    for model, column, ids in ((SeasonStats, "season_id", dead_seasons), (SeasonActor, "season_id", dead_seasons),
+                               (ShowStats, "tvshow_id", dead_shows), (ShowActor, "tvshow_id", dead_shows)):
+        if ids:
+            conn.execute(model.__table__.delete().where(model.__table__.c[column].in_(ids)))
+    _refresh_show_rows(set(dead_seasons.values()) - dead_shows, conn)
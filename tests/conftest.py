@@ -0,0 +1,36 @@
+import os
+
+# config.py reads the environment at import time
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["RATE_LIMIT_ENABLED"] = "0"  # tests that need it install a limiter themselves
+
+import pytest
+from app import create_app
+from extensions import db
+from models import User
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update(TESTING=True)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_headers(app, client):
+    user = User(username="admin", role="admin")
+    user.set_password("secret")
+    db.session.add(user)
+    db.session.commit()
+    token = client.post("/api/auth/login", json={"username": "admin", "password": "secret"}).json["access_token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,119 @@
+# Cast and crew assignment by set difference (assignments.py).
+import pytest
+from sqlalchemy import event, select
+from extensions import db
+from models import TVShow, Season, Episode, Actor, Crew, EpisodeCrew, ActorCostar, episode_actors
+import costars
+
+
+@pytest.fixture
+def cast(app):
+    actors = [Actor(first_name=name) for name in ("ann", "bob", "cid", "dee")]
+    crew = Crew(first_name="dir", person_definition="Director")
+    season = Season(season_number=1, tvshow=TVShow(title="show"))
+    first = Episode(episode_number=1, title="e1", season=season, actors=actors[:2])
+    second = Episode(episode_number=2, title="e2", season=season, actors=actors[:3])
+    db.session.add_all([season, crew, *actors])
+    db.session.commit()
+    ids = {"first": first.id, "second": second.id, "crew": crew.id, **{a.first_name: a.id for a in actors}}
+    db.session.remove()
+    return ids
+
+
+def links(episode_id):
+    return set(db.session.execute(select(episode_actors.c.actor_id)
+                                  .where(episode_actors.c.episode_id == episode_id)).scalars())
+
+
+def costar_counts():
+    return {(a, b): n for a, b, n in db.session.execute(select(ActorCostar.actor_id, ActorCostar.costar_id,
+                                                               ActorCostar.episode_count))}
+
+
+def assert_costars_consistent():
+    db.session.remove()
+    counts = costar_counts()
+    costars.rebuild_all()
+    assert counts == costar_counts()
+    db.session.rollback()
+
+
+def assign(client, headers, episode_id, change):
+    return client.patch(f"/api/tv/episodes/{episode_id}/assignments", json=change, headers=headers)
+
+
+def test_add_and_remove(client, admin_headers, cast):
+    ann, bob, cid, dee = cast["ann"], cast["bob"], cast["cid"], cast["dee"]
+
+    response = assign(client, admin_headers, cast["first"], {"actors": {"add": [dee, ann], "remove": [bob, cid]}})
+
+    assert response.status_code == 200
+    # ann was already there and cid never was: neither is reported
+    assert response.json["items"] == [{"episode_id": cast["first"], "actors": {"added": [dee], "removed": [bob]}}]
+    db.session.remove()
+    assert links(cast["first"]) == {ann, dee}
+    counts = costar_counts()
+    assert counts[(ann, dee)] == counts[(dee, ann)] == 1
+    assert counts[(ann, bob)] == 1  # still together in the second episode
+    assert_costars_consistent()
+
+
+def test_replace_full_cast(client, admin_headers, cast):
+    ann, bob, cid, dee = cast["ann"], cast["bob"], cast["cid"], cast["dee"]
+
+    response = client.post("/api/tv/episodes/assignments", headers=admin_headers, json={"changes": [
+        {"episode_id": cast["first"], "actor_ids": [cid, dee]},
+        {"episode_id": cast["second"], "actor_ids": [], "crew_ids": [cast["crew"]]},
+    ]})
+
+    assert response.status_code == 200
+    assert response.json["items"] == [
+        {"episode_id": cast["first"], "actors": {"added": [cid, dee], "removed": [ann, bob]}},
+        {"episode_id": cast["second"], "actors": {"added": [], "removed": [ann, bob, cid]},
+         "crew": {"added": [cast["crew"]], "removed": []}},
+    ]
+    db.session.remove()
+    assert links(cast["first"]) == {cid, dee}
+    assert links(cast["second"]) == set()
+    assert db.session.scalars(select(EpisodeCrew.crew_id).where(EpisodeCrew.episode_id == cast["second"])).all() \
+        == [cast["crew"]]
+    assert costar_counts() == {(cid, dee): 1, (dee, cid): 1}
+    assert_costars_consistent()
+
+
+def test_unchanged_cast_writes_nothing(app, client, admin_headers, cast):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split(None, 1)[0].upper())
+
+    before = costar_counts()
+    db.session.remove()
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = assign(client, admin_headers, cast["first"],
+                          {"actor_ids": [cast["bob"], cast["ann"]]})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert response.json["items"][0]["actors"] == {"added": [], "removed": []}
+    assert not {"INSERT", "UPDATE", "DELETE"} & set(statements)
+    assert costar_counts() == before
+
+
+@pytest.mark.parametrize("change, message", [
+    ({"actor_ids": [999]}, "unknown actor ids: [999]"),
+    ({"actor_ids": [1], "actors": {"add": [2]}}, "give either actor_ids or actors, not both"),
+    ({"actors": {"add": [1], "remove": [1]}}, "actors: ids both added and removed: [1]"),
+    ({"actor_ids": [True]}, "actor_ids: must be a list of integer ids"),
+])
+def test_invalid_changes_write_nothing(client, admin_headers, cast, change, message):
+    before = links(cast["first"])
+
+    response = assign(client, admin_headers, cast["first"], change)
+
+    assert response.status_code == 400
+    assert response.json["errors"] == {"0": message}
+    db.session.remove()
+    assert links(cast["first"]) == before
@@ -0,0 +1,89 @@
+# Response cache (cache.py): hits, ETags, and invalidation by writes the
+# handlers make and by ORM writes they don't see.
+import pytest
+from extensions import db, cache
+from cache import LRUBackend, RedisBackend
+from models import TVShow, Season, Episode, Actor
+
+
+@pytest.fixture(params=["lru", "redis"])
+def backend(request, app, monkeypatch):
+    if request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        monkeypatch.setattr(cache, "backend", RedisBackend(fakeredis.FakeRedis()))
+    return request.param
+
+
+@pytest.fixture
+def season(app):
+    actor = Actor(first_name="ann")
+    season = Season(season_number=1, tvshow=TVShow(title="show"))
+    Episode(episode_number=1, title="pilot", season=season, actors=[actor])
+    db.session.add(season)
+    db.session.commit()
+    ids = season.tvshow_id, season.id, actor.id
+    db.session.remove()
+    return ids
+
+
+def test_hit_and_revalidation(client, backend, season):
+    show_id, _, _ = season
+    first = client.get(f"/api/tv/shows/{show_id}")
+    second = client.get(f"/api/tv/shows/{show_id}")
+
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert second.json == first.json
+    assert second.headers["ETag"] == first.headers["ETag"]
+    revalidated = client.get(f"/api/tv/shows/{show_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+
+def test_write_invalidates(client, admin_headers, backend, season):
+    show_id, _, _ = season
+    assert client.get("/api/tv/shows").headers["X-Cache"] == "MISS"
+    assert client.get(f"/api/tv/shows/{show_id}").headers["X-Cache"] == "MISS"
+
+    assert client.patch(f"/api/tv/shows/{show_id}", json={"title": "renamed"}, headers=admin_headers).status_code == 200
+
+    for url in ("/api/tv/shows", f"/api/tv/shows/{show_id}"):
+        response = client.get(url)
+        assert response.headers["X-Cache"] == "MISS", url
+        assert "renamed" in response.get_data(as_text=True), url
+
+
+def test_orm_actor_rename_invalidates_embedding_responses(client, backend, season):
+    show_id, season_id, actor_id = season
+    urls = [f"/api/tv/seasons/{season_id}/episodes", f"/api/tv/shows/{show_id}/tree?include=actors"]
+    for url in urls:
+        assert client.get(url).headers["X-Cache"] == "MISS"
+        assert client.get(url).headers["X-Cache"] == "HIT"
+
+    db.session.get(Actor, actor_id).first_name = "anne"
+    db.session.commit()
+    db.session.remove()
+
+    assert [client.get(url).headers["X-Cache"] for url in urls] == ["MISS", "MISS"]
+    assert client.get(urls[0]).json[0]["actors"][0]["first_name"] == "anne"
+
+
+def test_rolled_back_write_keeps_entries(client, backend, season):
+    _, season_id, actor_id = season
+    url = f"/api/tv/seasons/{season_id}/episodes"
+    client.get(url)
+
+    db.session.get(Actor, actor_id).first_name = "anne"
+    db.session.flush()
+    db.session.rollback()
+
+    assert client.get(url).headers["X-Cache"] == "HIT"
+
+
+def test_lru_backend_evicts_least_recent_and_expires():
+    lru = LRUBackend(max_entries=2)
+    lru.set("a", "1", ttl=60)
+    lru.set("b", "2", ttl=60)
+    assert lru.get("a") == "1"  # now the most recent
+    lru.set("c", "3", ttl=60)
+    assert (lru.get("a"), lru.get("b"), lru.get("c")) == ("1", None, "3")
+    lru.set("d", "4", ttl=-1)
+    assert lru.get("d") is None
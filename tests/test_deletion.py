@@ -0,0 +1,128 @@
+# Set-based show deletion (deletion.py): a hard delete leaves no rows behind,
+# a soft delete hides the show at once, and the purge drains it in batches.
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func, select
+from extensions import db
+from models import (TVShow, Season, Episode, Actor, Crew, EpisodeCrew, ScreenTime, SeasonStats, ShowStats,
+                    SeasonActor, ShowActor, ActorCostar, episode_actors)
+import costars
+import deletion
+
+
+def make_show(title, cast, seasons=2, episodes=3):
+    crew = Crew(first_name=f"{title} director", person_definition="Director")
+    show = TVShow(title=title)
+    for season_number in range(1, seasons + 1):
+        season = Season(season_number=season_number, tvshow=show)
+        for episode_number in range(1, episodes + 1):
+            episode = Episode(episode_number=episode_number, title=f"e{episode_number}", season=season,
+                              rating=episode_number, actors=list(cast))
+            episode.crews = [EpisodeCrew(crew=crew)]
+            start = datetime(2020, 1, 1) + timedelta(minutes=episode_number)
+            ScreenTime(actor=cast[0], episode=episode, start_time=start, end_time=start + timedelta(seconds=30))
+    db.session.add(show)
+    db.session.commit()
+    return show.id
+
+
+def show_rows(show_id):
+    """Row counts of every table holding something of the show."""
+    seasons = select(Season.id).where(Season.tvshow_id == show_id)
+    episodes = select(Episode.id).where(Episode.season_id.in_(seasons))
+    count = lambda stmt: db.session.scalar(select(func.count()).select_from(stmt.subquery()))
+    return {
+        "tvshow": count(select(TVShow.id).where(TVShow.id == show_id)),
+        "season": count(seasons),
+        "episode": count(episodes),
+        "episode_actors": count(select(episode_actors).where(episode_actors.c.episode_id.in_(episodes))),
+        "episode_crew": count(select(EpisodeCrew.id).where(EpisodeCrew.episode_id.in_(episodes))),
+        "screentime": count(select(ScreenTime.id).where(ScreenTime.episode_id.in_(episodes))),
+        "season_stats": count(select(SeasonStats.season_id).where(SeasonStats.season_id.in_(seasons))),
+        "season_actor": count(select(SeasonActor.season_id).where(SeasonActor.season_id.in_(seasons))),
+        "show_stats": count(select(ShowStats.tvshow_id).where(ShowStats.tvshow_id == show_id)),
+        "show_actor": count(select(ShowActor.tvshow_id).where(ShowActor.tvshow_id == show_id)),
+    }
+
+
+def costar_rows():
+    return sorted(tuple(row) for row in db.session.execute(select(ActorCostar.__table__)))
+
+
+def rebuilt_costar_rows():
+    costars.rebuild_all()
+    rows = costar_rows()
+    db.session.rollback()
+    return rows
+
+
+@pytest.fixture
+def catalog(app):
+    shared, only_doomed, only_kept = (Actor(first_name=name) for name in ("shared", "doomed", "kept"))
+    doomed = make_show("doomed", [shared, only_doomed])
+    kept = make_show("kept", [shared, only_kept])
+    db.session.remove()
+    return doomed, kept
+
+
+def test_hard_delete_removes_every_row(client, admin_headers, catalog):
+    doomed, kept = catalog
+    kept_rows = show_rows(kept)
+    assert all(show_rows(doomed).values())
+
+    response = client.delete(f"/api/tv/shows/{doomed}", headers=admin_headers)
+
+    assert response.status_code == 200
+    db.session.remove()
+    assert show_rows(doomed) == dict.fromkeys(kept_rows, 0)
+    assert show_rows(kept) == kept_rows
+    assert costar_rows() == rebuilt_costar_rows()
+    assert client.delete(f"/api/tv/shows/{doomed}", headers=admin_headers).status_code == 404
+
+
+def test_soft_delete_hides_show_until_purged(app, client, admin_headers, catalog):
+    app.config["SOFT_DELETE_SHOWS"] = True
+    app.extensions["show_purger"].schedule = lambda: None  # purge by hand below
+    doomed, kept = catalog
+    season_id = db.session.scalar(select(Season.id).where(Season.tvshow_id == doomed))
+
+    response = client.delete(f"/api/tv/shows/{doomed}", headers=admin_headers)
+
+    assert response.status_code == 202
+    assert [show["id"] for show in client.get("/api/tv/shows").json["items"]] == [kept]
+    for url in (f"/api/tv/shows/{doomed}", f"/api/tv/shows/{doomed}/tree", f"/api/tv/shows/{doomed}/seasons",
+                f"/api/tv/seasons/{season_id}/episodes"):
+        assert client.get(url).status_code == 404, url
+    assert client.patch(f"/api/tv/shows/{doomed}", json={"title": "back"}, headers=admin_headers).status_code == 404
+    assert client.patch(f"/api/tv/seasons/{season_id}", json={"title": "x"}, headers=admin_headers).status_code == 404
+    db.session.remove()
+    # rows stay until the purge, but the show's episodes no longer count as shared
+    assert show_rows(doomed)["episode"] == 6
+    assert costar_rows() == rebuilt_costar_rows()
+
+    assert deletion.purge_deleted() == [doomed]
+    assert not any(show_rows(doomed).values())
+
+
+def test_purge_deleted_drains_in_batches(app, client, admin_headers, catalog):
+    app.config.update(SOFT_DELETE_SHOWS=True, DELETE_BATCH_SIZE=4)
+    app.extensions["show_purger"].schedule = lambda: None
+    doomed, kept = catalog
+    assert client.delete(f"/api/tv/shows/{doomed}", headers=admin_headers).status_code == 202
+    db.session.remove()
+    remaining = []
+    commit = db.session.commit
+
+    def record_commit():
+        commit()
+        remaining.append(show_rows(doomed)["episode"])
+
+    db.session.commit = record_commit
+    try:
+        assert deletion.purge_deleted() == [doomed]
+    finally:
+        del db.session.commit
+    # 6 episodes: a batch of 4, one of 2, then the show and seasons themselves
+    assert remaining == [2, 0, 0]
+    assert not any(show_rows(doomed).values())
+    assert show_rows(kept)["episode"] == 6
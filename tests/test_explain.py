@@ -0,0 +1,19 @@
+# The hot lookup queries (explain.py) must be answered from an index on the
+# schema the models create, without scanning their table.
+import pytest
+from explain import explain_hot_queries, hot_queries
+
+SQLITE_QUERIES = [name for name, _, _, dialects in hot_queries() if not dialects or "sqlite" in dialects]
+
+
+@pytest.mark.parametrize("name", SQLITE_QUERIES)
+def test_hot_query_uses_an_index(app, name):
+    plans = {query: (ok, plan) for query, ok, plan in explain_hot_queries()}
+    ok, plan = plans[name]
+    assert ok, plan
+    assert "USING" in plan, plan
+
+
+def test_explain_queries_command(app):
+    result = app.test_cli_runner().invoke(args=["explain-queries"])
+    assert result.exit_code == 0, result.output
@@ -0,0 +1,155 @@
+# Bulk import (ingest.py): invalid rows are reported per line and never
+# abort the rest of the batch.
+import json
+import pytest
+from sqlalchemy import func, select
+from extensions import db
+from models import TVShow, Season, Episode, Actor, ScreenTime
+
+
+def ndjson(*records):
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def import_catalog(client, headers, *records):
+    return client.post("/api/tv/import", data=ndjson(*records), headers=headers)
+
+
+def make_season():
+    season = Season(season_number=1, tvshow=TVShow(title="show"))
+    Episode(episode_number=1, title="pilot", season=season)
+    db.session.add(season)
+    db.session.commit()
+    ids = season.id, season.episodes[0].id
+    db.session.remove()
+    return ids
+
+
+def test_explicit_id_of_another_row_is_reported(client, admin_headers):
+    season_id, episode_id = make_season()
+
+    response = import_catalog(client, admin_headers,
+                              {"type": "episode", "id": episode_id, "season_id": season_id, "episode_number": 2,
+                               "title": "clash"},
+                              {"type": "episode", "id": episode_id, "season_id": season_id, "episode_number": 1,
+                               "title": "renamed"},
+                              {"type": "episode", "season_id": season_id, "episode_number": 3, "title": "new"})
+
+    assert response.status_code == 207
+    report = response.json
+    assert report["written"] == {"episode": 2}
+    assert [(e["line"], list(e["errors"])) for e in report["errors"]] == [(1, ["id"])]
+    db.session.remove()
+    episodes = db.session.execute(select(Episode.id, Episode.episode_number, Episode.title)
+                                  .order_by(Episode.episode_number)).all()
+    assert [(number, title) for _, number, title in episodes] == [(1, "renamed"), (3, "new")]
+    assert episodes[0].id == episode_id
+
+
+def test_explicit_ids_clashing_within_a_batch(client, admin_headers):
+    season_id, _ = make_season()
+
+    response = import_catalog(client, admin_headers,
+                              {"type": "episode", "id": 100, "season_id": season_id, "episode_number": 2, "title": "a"},
+                              {"type": "episode", "id": 100, "season_id": season_id, "episode_number": 3, "title": "b"})
+
+    assert response.status_code == 207
+    assert [e["line"] for e in response.json["errors"]] == [2]
+    db.session.remove()
+    assert db.session.get(Episode, 100).episode_number == 2
+
+
+# ---------- screentime: insert-only, conflicts reported per row ----------
+def screentime(episode_id, actor_id, start, end, **extra):
+    return {"episode_id": episode_id, "actor_id": actor_id,
+            "start_time": f"2024-01-01T20:{start:02d}:00", "end_time": f"2024-01-01T20:{end:02d}:00", **extra}
+
+
+@pytest.fixture
+def episode(app):
+    _, episode_id = make_season()
+    actor = Actor(first_name="lead")
+    db.session.add(actor)
+    db.session.commit()
+    ids = episode_id, actor.id
+    db.session.remove()
+    return ids
+
+
+def bulk(client, headers, *segments):
+    return client.post("/api/people/screentimes/bulk", json=list(segments), headers=headers)
+
+
+def errors_by_row(report):
+    return {e["line"]: e["errors"] for e in report["errors"]}
+
+
+def test_screentime_clashing_with_a_stored_row(client, admin_headers, episode):
+    episode_id, actor_id = episode
+    assert bulk(client, admin_headers, screentime(episode_id, actor_id, 0, 5)).status_code == 200
+
+    response = bulk(client, admin_headers,
+                    screentime(episode_id, actor_id, 0, 3),  # same uq_actor_episode_time key
+                    screentime(episode_id, actor_id, 10, 12))
+
+    assert response.status_code == 207
+    assert response.json["written"] == {"screentime": 1}
+    assert errors_by_row(response.json) == {1: {"_schema": [
+        "conflicts with an existing screentime (actor_id, episode_id, start_time or id)"]}}
+    db.session.remove()
+    assert db.session.scalar(select(func.count()).select_from(ScreenTime)) == 2
+
+
+def test_screentime_duplicated_within_the_batch(client, admin_headers, episode):
+    episode_id, actor_id = episode
+
+    response = bulk(client, admin_headers, screentime(episode_id, actor_id, 0, 5),
+                    screentime(episode_id, actor_id, 0, 5, role_name="again"))
+
+    assert response.status_code == 207
+    assert errors_by_row(response.json) == {2: {"_schema": [
+        "duplicate of an earlier row (actor_id, episode_id, start_time)"]}}
+
+
+def test_screentime_with_missing_parents(client, admin_headers, episode):
+    episode_id, actor_id = episode
+
+    response = bulk(client, admin_headers, screentime(999, actor_id, 0, 5), screentime(episode_id, 998, 0, 5),
+                    screentime(episode_id, actor_id, 0, 5))
+
+    assert response.status_code == 207
+    assert response.json["written"] == {"screentime": 1}
+    assert errors_by_row(response.json) == {1: {"episode_id": ["episode 999 not found"]},
+                                            2: {"actor_id": ["actor 998 not found"]}}
+
+
+def test_screentime_overlaps(app, client, admin_headers, episode):
+    episode_id, actor_id = episode
+    app.config["SCREENTIME_EXCLUDE_OVERLAPS"] = True
+    stored = bulk(client, admin_headers, screentime(episode_id, actor_id, 0, 10))
+    assert stored.status_code == 200
+
+    response = bulk(client, admin_headers,
+                    screentime(episode_id, actor_id, 5, 15),  # overlaps the stored row
+                    screentime(episode_id, actor_id, 20, 30),
+                    screentime(episode_id, actor_id, 25, 35),  # overlaps the row above
+                    screentime(episode_id, actor_id, 30, 40))  # only touches row 2: [start, end)
+
+    assert response.status_code == 207
+    assert response.json["written"] == {"screentime": 2}
+    db.session.remove()
+    stored_id = db.session.scalar(select(ScreenTime.id).order_by(ScreenTime.id))
+    assert errors_by_row(response.json) == {
+        1: {"start_time": [f"overlaps screentime {stored_id}"]},
+        3: {"start_time": ["overlaps an earlier segment in this batch"]},
+    }
+
+
+def test_screentime_overlaps_allowed_by_default(client, admin_headers, episode):
+    episode_id, actor_id = episode
+
+    response = bulk(client, admin_headers, screentime(episode_id, actor_id, 0, 10),
+                    screentime(episode_id, actor_id, 5, 15))
+
+    assert response.status_code == 200
+    assert response.json["written"] == {"screentime": 2}
@@ -0,0 +1,49 @@
+# SQLite interval lookups (intervals.py): the per-episode tree cache.
+from datetime import datetime, timedelta
+import pytest
+from extensions import db
+from models import TVShow, Season, Episode, Actor, ScreenTime
+import intervals
+
+START = datetime(2020, 1, 1, 20, 0)
+
+
+@pytest.fixture
+def episode(app):
+    actor = Actor(first_name="lead")
+    episode = Episode(episode_number=1, title="pilot", season=Season(season_number=1, tvshow=TVShow(title="show")))
+    db.session.add_all([actor, episode])
+    db.session.commit()
+    intervals.invalidate_all()
+    yield episode.id, actor.id
+    intervals.invalidate_all()
+
+
+def on_screen(episode_id):
+    return [row.id for row in intervals.on_screen_at(db.session.connection(), episode_id, START)]
+
+
+def insert_unseen(episode_id, actor_id):
+    """A write this process's flush hook never sees, as another worker's would be."""
+    return db.session.execute(ScreenTime.__table__.insert().returning(ScreenTime.id), {
+        "episode_id": episode_id, "actor_id": actor_id, "start_time": START,
+        "end_time": START + timedelta(minutes=5)}).scalar()
+
+
+def test_orm_writes_invalidate_the_cached_tree(episode):
+    episode_id, actor_id = episode
+    assert on_screen(episode_id) == []
+    segment = ScreenTime(episode_id=episode_id, actor_id=actor_id, start_time=START,
+                         end_time=START + timedelta(minutes=5))
+    db.session.add(segment)
+    db.session.commit()
+    assert on_screen(episode_id) == [segment.id]
+
+
+def test_cached_tree_expires_after_ttl(episode, monkeypatch):
+    episode_id, actor_id = episode
+    assert on_screen(episode_id) == []
+    st_id = insert_unseen(episode_id, actor_id)
+    assert on_screen(episode_id) == []  # still the cached tree
+    monkeypatch.setattr(intervals.episode_trees, "ttl", 0)
+    assert on_screen(episode_id) == [st_id]
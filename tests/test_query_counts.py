@@ -0,0 +1,48 @@
+# Statement counts of the eager-loaded listing endpoints must not grow with
+# the number of seasons, episodes or actors (no N+1 lazy loads).
+import pytest
+from sqlalchemy import event
+from extensions import db
+from models import TVShow, Season, Episode, Actor
+
+
+def make_show(title, seasons, episodes, actors):
+    cast = [Actor(first_name=f"{title} actor {i}") for i in range(actors)]
+    show = TVShow(title=title)
+    for season_number in range(1, seasons + 1):
+        season = Season(season_number=season_number, tvshow=show)
+        for episode_number in range(1, episodes + 1):
+            Episode(episode_number=episode_number, title=f"e{episode_number}", season=season, actors=cast)
+    db.session.add(show)
+    db.session.commit()
+    return show.id, show.seasons[0].id
+
+
+def count_statements(client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert response.status_code == 200, url
+    return len(statements)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("/shows/{show_id}/seasons", 3),  # show, seasons, season stats
+    ("/seasons/{season_id}/episodes", 4),  # season, episodes, actors, crew
+    ("/api/tv/shows/{show_id}/seasons", 2),  # show, seasons
+    ("/api/tv/seasons/{season_id}/episodes", 3),  # season, episodes, actors
+])
+def test_listing_statement_counts(app, client, url, expected):
+    small = make_show("small", seasons=1, episodes=1, actors=1)
+    big = make_show("big", seasons=5, episodes=20, actors=4)
+    db.session.remove()
+    counts = [count_statements(client, url.format(show_id=show_id, season_id=season_id))
+              for show_id, season_id in (small, big)]
+    assert counts == [expected, expected]
@@ -0,0 +1,138 @@
+# Admission control (ratelimit.py): token buckets answered with 429 +
+# Retry-After, and the per-process concurrency gate answered with 503.
+import asyncio
+import json
+import pytest
+from config import Config
+from app import create_app
+from extensions import db
+from ratelimit import MemoryBackend, RateLimiter, ConcurrencyGate, parse_limit, client_address
+
+
+@pytest.fixture
+def limited_app(monkeypatch):
+    # init_app reads these when the app is created
+    monkeypatch.setattr(Config, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(Config, "RATE_LIMIT_READ", "3/minute")
+    monkeypatch.setattr(Config, "RATE_LIMIT_WRITE", "1/minute")
+    monkeypatch.setattr(Config, "MAX_CONCURRENT_REQUESTS", 2)
+    app = create_app()
+    app.config.update(TESTING=True)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_parse_limit():
+    assert parse_limit("120/minute") == (120, 2.0)
+    assert parse_limit("5/seconds") == (5, 5.0)
+    assert parse_limit("10") == (10, 10.0)
+    assert parse_limit("") is None and parse_limit("0") is None
+    with pytest.raises(ValueError):
+        parse_limit("10/fortnight")
+
+
+def test_token_bucket_refills(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("ratelimit.time.monotonic", lambda: clock[0])
+    limiter = RateLimiter(MemoryBackend(), {"read": (2, 0.5), "write": None})
+
+    assert [limiter.check("read", "ip:a") for _ in range(3)] == [None, None, 2]
+    assert limiter.check("read", "ip:b") is None  # buckets are per client
+    assert limiter.check("write", "ip:a") is None  # no write budget configured
+    clock[0] += 1.0  # half a token
+    assert limiter.check("read", "ip:a") == 1
+    clock[0] += 1.0
+    assert limiter.check("read", "ip:a") is None
+
+
+def test_memory_backend_drops_least_recent_buckets():
+    backend = MemoryBackend(max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        backend.take(key, 1, 0.001)
+    assert backend.take("a", 1, 0.001)[0] is False  # still tracked, and empty
+    assert backend.take("b", 1, 0.001)[0] is True  # dropped, so full again
+
+
+def test_429_with_retry_after(limited_app):
+    client = limited_app.test_client()
+    statuses = [client.get("/api/tv/shows").status_code for _ in range(4)]
+
+    assert statuses == [200, 200, 200, 429]
+    response = client.get("/api/tv/shows")
+    assert response.json == {"msg": "rate limit exceeded"}
+    assert 1 <= int(response.headers["Retry-After"]) <= 20
+    # writes have their own budget; other clients their own buckets
+    assert client.post("/api/tv/shows", json={}).status_code == 401
+    other = limited_app.test_client()
+    assert other.get("/api/tv/shows", environ_base={"REMOTE_ADDR": "10.0.0.2"}).status_code == 200
+
+
+def test_503_when_the_gate_is_full(limited_app):
+    gate = limited_app.extensions["concurrency_gate"]
+    client = limited_app.test_client()
+    assert gate.limit == 2
+    assert gate.acquire() and gate.acquire()
+
+    response = client.get("/api/tv/shows")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    gate.release()
+    assert client.get("/api/tv/shows").status_code == 200
+    assert gate.in_flight == 1  # released again after the request
+
+
+def test_concurrency_gate():
+    gate = ConcurrencyGate(1)
+    assert gate.acquire() and not gate.acquire()
+    gate.release()
+    assert gate.acquire()
+
+
+def test_client_address_behind_proxies():
+    assert client_address("10.0.0.1", "1.2.3.4, 5.6.7.8", 0) == "10.0.0.1"
+    assert client_address("10.0.0.1", "1.2.3.4, 5.6.7.8", 1) == "5.6.7.8"
+    assert client_address("10.0.0.1", "1.2.3.4, 5.6.7.8", 2) == "1.2.3.4"
+    assert client_address("10.0.0.1", "5.6.7.8", 2) == "10.0.0.1"  # fewer hops than proxies: spoofed
+
+
+def asgi_get(api, path):
+    """(status, headers, body) of a GET through the ASGI app."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [],
+             "client": ("10.0.0.9", 5000)}
+    asyncio.run(api(scope, receive, send))
+    start, body = sent[0], b"".join(m.get("body", b"") for m in sent[1:])
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body
+
+
+def test_asgi_native_routes_share_the_gate_and_buckets(limited_app):
+    pytest.importorskip("aiosqlite")
+    from asgi import ReadAPI
+    api = ReadAPI(limited_app)
+    gate = limited_app.extensions["concurrency_gate"]
+    assert gate.acquire() and gate.acquire()
+
+    status, headers, body = asgi_get(api, "/api/tv/shows/1")
+
+    assert (status, headers["retry-after"], json.loads(body)) == (503, "1", {"msg": "server busy, retry shortly"})
+    gate.release()
+    gate.release()
+    # the read budget refuses before the database is reached; each request gives its slot back
+    limiter = limited_app.extensions["rate_limiter"]
+    for _ in range(3):
+        limiter.check("read", "ip:10.0.0.9")
+    status, headers, body = asgi_get(api, "/api/tv/shows/1")
+    assert (status, json.loads(body)) == (429, {"msg": "rate limit exceeded"})
+    assert int(headers["retry-after"]) >= 1
+    assert gate.in_flight == 0
@@ -0,0 +1,76 @@
+# GET /api/search on the SQLite FTS5 fallback (search.py).
+import pytest
+from extensions import db
+from models import TVShow, Actor
+
+
+def search(client, **params):
+    response = client.get("/api/search", query_string=params)
+    assert response.status_code == 200, response.json
+    return response.json
+
+
+def hits(body):
+    return [(item["kind"], item["title"]) for item in body["items"]]
+
+
+def test_title_matches_outrank_description_matches(client, app):
+    db.session.add_all([
+        TVShow(title="Harbour Lights", description="a dragon washes ashore"),
+        TVShow(title="Dragon Keepers", description="family drama"),
+        Actor(first_name="Drago", last_name="Ivanov"),
+    ])
+    db.session.commit()
+
+    body = search(client, q="dragon")
+
+    # porter stemming, prefix match on the last term, title weighted over description
+    assert hits(body) == [("show", "Dragon Keepers"), ("show", "Harbour Lights")]
+    assert body["items"][0]["rank"] > body["items"][1]["rank"]
+    assert hits(search(client, q="drag", kind="actor")) == [("actor", "Drago Ivanov")]
+
+
+def test_pagination(client, app):
+    db.session.add_all(Actor(first_name="Smith", last_name=f"no{i}") for i in range(5))
+    db.session.commit()
+
+    pages = [search(client, q="smith", limit=2, page=page) for page in (1, 2, 3)]
+
+    assert [len(p["items"]) for p in pages] == [2, 2, 1]
+    assert [p["has_more"] for p in pages] == [True, True, False]
+    titles = [item["title"] for p in pages for item in p["items"]]
+    assert sorted(titles) == [f"Smith no{i}" for i in range(5)]
+
+
+def test_deep_pages_are_refused(client, app):
+    app.config["MAX_SEARCH_PAGE"] = 3
+    assert client.get("/api/search?q=x&page=3").status_code == 200
+    response = client.get("/api/search?q=x&page=4")
+    assert response.status_code == 400
+    assert response.json == {"msg": "page must be between 1 and 3"}
+
+
+@pytest.mark.parametrize("query", ["q=", "q=x&kind=planet", "q=x&page=zero", "q=x&page=0"])
+def test_bad_requests(client, app, query):
+    assert client.get(f"/api/search?{query}").status_code == 400
+
+
+def test_index_follows_writes(client, admin_headers):
+    response = client.post("/api/tv/shows", json={"title": "Northern Exposure"}, headers=admin_headers)
+    show_id = response.json["id"]
+    assert hits(search(client, q="northern")) == [("show", "Northern Exposure")]
+
+    client.patch(f"/api/tv/shows/{show_id}", json={"title": "Southern Comfort"}, headers=admin_headers)
+    assert hits(search(client, q="northern")) == []
+    assert hits(search(client, q="southern")) == [("show", "Southern Comfort")]
+
+    client.delete(f"/api/tv/shows/{show_id}", headers=admin_headers)
+    assert hits(search(client, q="southern")) == []
+
+
+def test_fts_syntax_is_quoted(client, app):
+    db.session.add(TVShow(title="Law and Order"))
+    db.session.commit()
+    # FTS5 operators and stray quotes in user input are searched for as plain terms
+    assert hits(search(client, q='law AND ("order')) == [("show", "Law and Order")]
+    assert hits(search(client, q="law NEAR order")) == []
@@ -0,0 +1,115 @@
+# PATCH /api/tv/seasons/<id>/episodes (season_batch.py): all or nothing,
+# renumbering within the batch, optimistic versions.
+import pytest
+from sqlalchemy import select
+from extensions import db
+from models import TVShow, Season, Episode
+from conditional import entity_etag
+
+
+@pytest.fixture
+def season(app):
+    season = Season(season_number=1, tvshow=TVShow(title="show"))
+    for number in (1, 2, 3):
+        Episode(episode_number=number, title=f"e{number}", season=season)
+    db.session.add(season)
+    db.session.commit()
+    ids = season.id, [e.id for e in sorted(season.episodes, key=lambda e: e.episode_number)]
+    db.session.remove()
+    return ids
+
+
+def patch(client, headers, season_id, *changes):
+    return client.patch(f"/api/tv/seasons/{season_id}/episodes", json={"episodes": list(changes)}, headers=headers)
+
+
+def numbering(season_id):
+    db.session.remove()
+    return dict(db.session.execute(select(Episode.episode_number, Episode.title)
+                                   .where(Episode.season_id == season_id)).all())
+
+
+def test_swap_episode_numbers(client, admin_headers, season):
+    season_id, (first, second, third) = season
+
+    response = patch(client, admin_headers, season_id,
+                     {"id": first, "episode_number": 2}, {"id": second, "episode_number": 1},
+                     {"id": third, "title": "e3"})
+
+    assert response.status_code == 200
+    assert [(r["id"], r["status"], r["version"]) for r in response.json["items"]] == [
+        (first, "updated", 2), (second, "updated", 2), (third, "unchanged", 1)]
+    assert numbering(season_id) == {1: "e2", 2: "e1", 3: "e3"}
+
+
+def test_duplicate_number_rejects_the_batch(client, admin_headers, season):
+    season_id, (first, second, third) = season
+
+    response = patch(client, admin_headers, season_id,
+                     {"id": first, "title": "renamed"}, {"id": second, "episode_number": 3})
+
+    assert response.status_code == 400
+    assert [r["status"] for r in response.json["items"]] == ["skipped", "error"]
+    assert numbering(season_id) == {1: "e1", 2: "e2", 3: "e3"}
+
+
+def test_stale_version_is_a_conflict(client, admin_headers, season):
+    season_id, (first, second, _) = season
+    assert patch(client, admin_headers, season_id, {"id": first, "title": "v2", "version": 1}).status_code == 200
+
+    response = patch(client, admin_headers, season_id,
+                     {"id": first, "title": "v3", "version": 1}, {"id": second, "title": "x", "version": 1})
+
+    assert response.status_code == 412
+    assert response.json["items"] == [{"id": first, "status": "conflict", "version": 2},
+                                      {"id": second, "status": "skipped"}]
+    assert numbering(season_id)[1] == "v2"
+
+
+def test_season_if_match(client, admin_headers, season):
+    season_id, _ = season
+    etag = entity_etag(db.session.get(Season, season_id))
+    db.session.remove()
+    url = f"/api/tv/seasons/{season_id}"
+
+    response = client.patch(url, json={"title": "one"}, headers={**admin_headers, "If-Match": f'"{etag}"'})
+    assert response.status_code == 200
+    # the same validator is stale now
+    response = client.patch(url, json={"title": "two"}, headers={**admin_headers, "If-Match": f'"{etag}"'})
+    assert response.status_code == 412
+    assert response.json["version"] == 2
+
+
+# ... stands for the id of the season's first episode
+@pytest.mark.parametrize("change, field", [
+    ({"id": True, "title": "x"}, "id"),
+    ({"id": "1", "title": "x"}, "id"),
+    ({"title": "x"}, "id"),
+    ({"id": ..., "title": "x", "version": True}, "version"),
+    ({"id": ..., "title": "x", "version": 1.5}, "version"),
+    ({"id": ..., "rating": "great"}, "rating"),
+])
+def test_invalid_changes(client, admin_headers, season, change, field):
+    season_id, (first, _, _) = season
+    change = {**change, "id": first} if change.get("id") is ... else change
+
+    response = patch(client, admin_headers, season_id, change)
+
+    assert response.status_code == 400
+    assert list(response.json["items"][0]["errors"]) == [field]
+    assert numbering(season_id) == {1: "e1", 2: "e2", 3: "e3"}
+
+
+def test_episode_of_another_season(client, admin_headers, season):
+    season_id, _ = season
+    other = Season(season_number=2, tvshow_id=db.session.scalar(select(Season.tvshow_id)))
+    Episode(episode_number=1, title="elsewhere", season=other)
+    db.session.add(other)
+    db.session.commit()
+    foreign = other.episodes[0].id
+    db.session.remove()
+
+    response = patch(client, admin_headers, season_id, {"id": foreign, "title": "moved?"})
+
+    assert response.status_code == 400
+    assert response.json["items"][0]["errors"] == {"id": ["not an episode of this season"]}
@@ -0,0 +1,165 @@
+# Incrementally maintained aggregates (stats.py) must match a full rebuild
+# after every kind of write.
+import json
+from datetime import date
+import pytest
+from sqlalchemy import select
+from extensions import db
+from models import (TVShow, Season, Episode, Actor, SeasonStats, ShowStats, SeasonActor, ShowActor,
+                    episode_actors)
+import deletion
+import stats
+
+TABLES = (SeasonStats, ShowStats, SeasonActor, ShowActor)
+
+
+def aggregate_rows():
+    rows = {}
+    for model in TABLES:
+        table = model.__table__
+        columns = [c for c in table.columns if c.name != "updated_at"]
+        rows[table.name] = sorted(tuple(row) for row in db.session.execute(select(*columns)))
+    return rows
+
+
+def assert_matches_rebuild():
+    db.session.remove()
+    incremental = aggregate_rows()
+    stats.rebuild_all()
+    db.session.flush()
+    rebuilt = aggregate_rows()
+    db.session.rollback()
+    for name in incremental:
+        assert incremental[name] == rebuilt[name], name
+
+
+@pytest.fixture
+def catalog(app):
+    cast = [Actor(first_name=f"actor {i}") for i in range(4)]
+    for title in ("first", "second"):
+        show = TVShow(title=title)
+        for season_number in (1, 2):
+            season = Season(season_number=season_number, tvshow=show)
+            for episode_number in (1, 2, 3):
+                Episode(episode_number=episode_number, title=f"e{episode_number}", season=season,
+                        rating=episode_number * 2, date_published=date(2010 + season_number, 1, episode_number),
+                        actors=cast[:episode_number + 1])
+        db.session.add(show)
+    db.session.commit()
+    assert_matches_rebuild()
+    db.session.remove()
+
+
+def episode_ids(show_title="first"):
+    return db.session.execute(select(Episode.id).join(Season).join(TVShow).where(TVShow.title == show_title)
+                              .order_by(Episode.id)).scalars().all()
+
+
+def season_ids(show_title="first"):
+    return db.session.execute(select(Season.id).join(TVShow).where(TVShow.title == show_title)
+                              .order_by(Season.id)).scalars().all()
+
+
+def create_show(client, headers):
+    show = TVShow(title="new")
+    Episode(episode_number=1, title="pilot", rating=7, date_published=date(2000, 1, 1),
+            season=Season(season_number=1, tvshow=show), actors=[db.session.get(Actor, 1)])
+    db.session.add(show)
+    db.session.commit()
+    db.session.add(Season(season_number=2, tvshow_id=show.id))  # empty season
+    db.session.commit()
+
+
+def change_rating(client, headers):
+    first, second = episode_ids()[:2]
+    db.session.get(Episode, first).rating = None  # was a bound
+    db.session.get(Episode, second).date_published = date(1990, 1, 1)
+    db.session.commit()
+
+
+def move_episode(client, headers):
+    episode = db.session.get(Episode, episode_ids()[0])
+    episode.season_id = season_ids("second")[1]
+    episode.episode_number = 9
+    db.session.commit()
+
+
+def change_cast(client, headers):
+    first, second = episode_ids()[:2]
+    db.session.get(Episode, first).actors = []
+    episode = db.session.get(Episode, second)
+    actor = db.session.scalars(select(Actor).where(Actor.id.not_in([a.id for a in episode.actors]))).first()
+    actor.episodes.append(episode)  # from the other side of the relationship
+    db.session.commit()
+    response = client.post("/api/tv/episodes/assignments", headers=headers, json={"changes": [
+        {"episode_id": episode_ids()[2], "actors": {"add": [1], "remove": [2, 3]}},
+        {"episode_id": episode_ids("second")[0], "actor_ids": [3, 4]},
+    ]})
+    assert response.status_code == 200, response.json
+
+
+def season_batch(client, headers):
+    season_id = season_ids()[0]
+    first, second, third = db.session.execute(select(Episode.id).where(Episode.season_id == season_id)
+                                              .order_by(Episode.id)).scalars()
+    response = client.patch(f"/api/tv/seasons/{season_id}/episodes", headers=headers, json={"episodes": [
+        {"id": first, "episode_number": 2, "rating": 10},
+        {"id": second, "episode_number": 1, "rating": None, "date_published": "2001-05-05"},
+        {"id": third, "date_published": None},
+    ]})
+    assert response.status_code == 200, response.json
+
+
+def import_rows(client, headers):
+    season_id = season_ids()[1]
+    records = [
+        {"type": "episode", "season_id": season_id, "episode_number": 7, "title": "imported", "rating": 1},
+        {"type": "episode", "season_id": season_id, "episode_number": 1, "title": "updated", "rating": 9},
+        {"type": "episode_actor", "episode_id": episode_ids("second")[0], "actor_id": 4},
+    ]
+    response = client.post("/api/tv/import", headers=headers, data="".join(json.dumps(r) + "\n" for r in records))
+    assert response.status_code == 200, response.json
+
+
+def delete_episode(client, headers):
+    assert deletion.delete_episode(episode_ids()[1])
+    db.session.commit()
+
+
+def delete_season(client, headers):
+    response = client.delete(f"/api/tv/seasons/{season_ids()[0]}", headers=headers)
+    assert response.status_code == 200, response.json
+
+
+def delete_show(client, headers):
+    show_id = db.session.scalar(select(TVShow.id).where(TVShow.title == "first"))
+    assert client.delete(f"/api/tv/shows/{show_id}", headers=headers).status_code == 200
+
+
+def soft_delete_and_purge(client, headers):
+    client.application.config["SOFT_DELETE_SHOWS"] = True
+    client.application.extensions["show_purger"].schedule = lambda: None
+    show_id = db.session.scalar(select(TVShow.id).where(TVShow.title == "first"))
+    assert client.delete(f"/api/tv/shows/{show_id}", headers=headers).status_code == 202
+    db.session.remove()
+    assert not db.session.execute(select(ShowActor).where(ShowActor.tvshow_id == show_id)).first()
+    assert_matches_rebuild()
+    deletion.purge_deleted()
+
+
+@pytest.mark.parametrize("write", [create_show, change_rating, move_episode, change_cast, season_batch,
+                                   import_rows, delete_episode, delete_season, delete_show, soft_delete_and_purge])
+def test_incremental_stats_match_rebuild(client, admin_headers, catalog, write):
+    write(client, admin_headers)
+    assert_matches_rebuild()
+
+
+def test_rebuild_counts(catalog):
+    # 3 episodes per season with 2, 3 and 4 of the 4 actors
+    season_id = season_ids()[0]
+    season = db.session.get(SeasonStats, season_id)
+    assert (season.episode_count, season.rated_episode_count, season.rating_sum, season.actor_count) == (3, 3, 12, 4)
+    appearances = dict(db.session.execute(select(SeasonActor.actor_id, SeasonActor.appearances)
+                                          .where(SeasonActor.season_id == season_id)).all())
+    assert sorted(appearances.values()) == [1, 2, 3, 3]
+    assert db.session.scalar(select(db.func.count()).select_from(episode_actors)) == 36
@@ -1,9 +1,30 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort
 from models import User, TVShow, Season, Episode, Actor, Crew
-from extensions import db
+from extensions import db, cache
+from cache import SHOWS_TAG, show_tag, season_tag
+from queries import get_show_with_seasons, get_season_with_episodes
+from pagination import keyset_page, PageRequestError
+from routes.tv import SHOW_SORTS, filter_shows, show_tags
+from routes.people import ACTOR_SORTS, CREW_SORTS, filter_actors, filter_crew
+from identity import is_admin
+import passwords
+import assignments
+import deletion
 
 ui_bp = Blueprint("ui", __name__)
 
+
+def _page(stmt, sorts):
+    """One keyset page for a listing view, plus the URL of the next page (or None)."""
+    try:
+        rows, next_cursor = keyset_page(stmt, sorts, request.args)
+    except PageRequestError:
+        abort(400)
+    next_url = None
+    if next_cursor:
+        next_url = url_for(request.endpoint, **{**request.args.to_dict(), "cursor": next_cursor})
+    return rows, next_url
+
 # ---------------- LOGIN ----------------
 @ui_bp.route("/login", methods=["GET", "POST"])
 def login():
@@ -11,8 +32,12 @@ def login():
         username = request.form["username"]
         password = request.form["password"]
 
-        user = User.query.filter_by(username=username).first()
-        if not user or not user.check_password(password):
+        try:
+            user = passwords.authenticate(username, password)
+        except passwords.PoolSaturated as e:
+            flash("Too many people are signing in right now, please try again in a moment", "warning")
+            return render_template("login.html"), 429, {"Retry-After": str(e.retry_after)}
+        if not user:
             flash("Invalid username or password", "danger")
             return redirect(url_for("ui.login"))
 
@@ -41,13 +66,13 @@ def dashboard():
 # ---------------- SHOWS ----------------
 @ui_bp.route("/shows")
 def shows():
-    all_shows = TVShow.query.all()
-    return render_template("shows.html", shows=all_shows)
+    page, next_url = _page(filter_shows(db.select(TVShow), request.args), SHOW_SORTS)
+    return render_template("shows.html", shows=page, next_url=next_url)
 
 
 @ui_bp.route("/shows/add", methods=["GET", "POST"])
 def show_add():
-    if session.get("role") != "admin":
+    if not is_admin():
         flash("Admin only", "danger")
         return redirect(url_for("ui.shows"))
 
@@ -62,6 +87,7 @@ def show_add():
         s = TVShow(title=title, description=description)
         db.session.add(s)
         db.session.commit()
+        cache.invalidate(SHOWS_TAG)
 
         flash("Show added!", "success")
         return redirect(url_for("ui.shows"))
@@ -72,7 +98,7 @@ def show_add():
 @ui_bp.route("/shows/<int:show_id>/edit", methods=["GET", "POST"])
 def show_edit(show_id):
     show = TVShow.query.get_or_404(show_id)
-    if session.get("role") != "admin":
+    if not is_admin():
         flash("Admin only", "danger")
         return redirect(url_for("ui.shows"))
 
@@ -80,6 +106,7 @@ def show_edit(show_id):
         show.title = request.form["title"]
         show.description = request.form.get("description")
         db.session.commit()
+        cache.invalidate(SHOWS_TAG, show_tag(show_id))
 
         flash("Show updated", "success")
         return redirect(url_for("ui.shows"))
@@ -89,13 +116,18 @@ def show_edit(show_id):
 
 @ui_bp.route("/shows/<int:show_id>/delete", methods=["POST"])
 def show_delete(show_id):
-    if session.get("role") != "admin":
+    if not is_admin():
         flash("Admin only", "danger")
         return redirect(url_for("ui.shows"))
 
-    show = TVShow.query.get_or_404(show_id)
-    db.session.delete(show)
+    tags = show_tags(show_id)
+    outcome = deletion.delete_show(show_id)
+    if outcome is None:
+        abort(404)
     db.session.commit()
+    cache.invalidate(*tags)
+    if outcome == "scheduled":
+        deletion.schedule_purge()
     flash("Show deleted", "success")
     return redirect(url_for("ui.shows"))
 
@@ -104,13 +136,13 @@ def show_delete(show_id):
 
 @ui_bp.route("/shows/<int:show_id>/seasons")
 def seasons(show_id):
-    show = TVShow.query.get_or_404(show_id)
+    show = get_show_with_seasons(show_id, with_stats=True)
     return render_template("seasons.html", show=show, seasons=show.seasons)
 
 
 @ui_bp.route("/shows/<int:show_id>/seasons/add", methods=["GET", "POST"])
 def season_add(show_id):
-    if session.get("role") != "admin":
+    if not is_admin():
         flash("Admin only", "danger")
         return redirect(url_for("ui.seasons", show_id=show_id))
 
@@ -127,6 +159,7 @@ def season_add(show_id):
         s = Season(season_number=number, title=title, tvshow_id=show_id)
         db.session.add(s)
         db.session.commit()
+        cache.invalidate(show_tag(show_id))
 
         flash("Season added", "success")
         return redirect(url_for("ui.seasons", show_id=show_id))
@@ -139,7 +172,7 @@ def season_edit(season_id):
     season = Season.query.get_or_404(season_id)
     show_id = season.tvshow_id
 
-    if session.get("role") != "admin":
+    if not is_admin():
         flash("Admin only", "danger")
         return redirect(url_for("ui.seasons", show_id=show_id))
 
@@ -147,6 +180,7 @@ def season_edit(season_id):
         season.season_number = request.form["season_number"]
         season.title = request.form["title"]
         db.session.commit()
+        cache.invalidate(show_tag(show_id), season_tag(season_id))
 
         flash("Season updated", "success")
         return redirect(url_for("ui.seasons", show_id=show_id))
@@ -159,12 +193,13 @@ def season_delete(season_id):
     season = Season.query.get_or_404(season_id)
     show_id = season.tvshow_id
 
-    if session.get("role") != "admin":
+    if not is_admin():
         flash("Admin only", "danger")
         return redirect(url_for("ui.seasons", show_id=show_id))
 
-    db.session.delete(season)
+    deletion.delete_season(season_id)
     db.session.commit()
+    cache.invalidate(show_tag(show_id), season_tag(season_id))
 
     flash("Season deleted", "success")
     return redirect(url_for("ui.seasons", show_id=show_id))
@@ -173,10 +208,10 @@ def season_delete(season_id):
 # ---------------- EPISODES ----------------
 @ui_bp.route("/seasons/<int:season_id>/episodes", methods=["GET", "POST"])
 def episodes(season_id):
-    season = Season.query.get_or_404(season_id)
+    season = get_season_with_episodes(season_id, with_crew=True)
 
     if request.method == "POST":
-        if session.get("role") != "admin":
+        if not is_admin():
             flash("Admin only", "danger")
             return redirect(url_for("ui.episodes", season_id=season_id))
 
@@ -188,6 +223,7 @@ def episodes(season_id):
         )
         db.session.add(ep)
         db.session.commit()
+        cache.invalidate(show_tag(season.tvshow_id), season_tag(season_id))
 
         flash("Episode added!", "success")
         return redirect(url_for("ui.episodes", season_id=season_id))
@@ -199,7 +235,7 @@ def episodes(season_id):
 @ui_bp.route("/actors", methods=["GET", "POST"])
 def actors():
     if request.method == "POST":
-        if session.get("role") != "admin":
+        if not is_admin():
             flash("Admin only", "danger")
             return redirect(url_for("ui.actors"))
 
@@ -213,15 +249,15 @@ def actors():
         flash("Actor added!", "success")
         return redirect(url_for("ui.actors"))
 
-    all_actors = Actor.query.all()
-    return render_template("actors.html", actors=all_actors)
+    page, next_url = _page(filter_actors(db.select(Actor), request.args), ACTOR_SORTS)
+    return render_template("actors.html", actors=page, next_url=next_url)
 
 
 # ---------------- CREW ----------------
 @ui_bp.route("/crew", methods=["GET", "POST"])
 def crew():
     if request.method == "POST":
-        if session.get("role") != "admin":
+        if not is_admin():
             flash("Admin only", "danger")
             return redirect(url_for("ui.crew"))
 
@@ -236,8 +272,8 @@ def crew():
         flash("Crew added!", "success")
         return redirect(url_for("ui.crew"))
 
-    all_crew = Crew.query.all()
-    return render_template("crew.html", crew=all_crew)
+    page, next_url = _page(filter_crew(db.select(Crew), request.args), CREW_SORTS)
+    return render_template("crew.html", crew=page, next_url=next_url)
 
 
 # ---------------- REGISTER ----------------
@@ -277,39 +313,36 @@ def episode_edit(episode_id):
     ep = Episode.query.get_or_404(episode_id)
     season = ep.season
 
-    if session.get("role") != "admin":
+    if not is_admin():
         flash("Admin only", "danger")
         return redirect(url_for("ui.episodes", season_id=ep.season_id))
 
-    # load all actors/crew for selection lists
-    all_actors = Actor.query.order_by(Actor.first_name, Actor.last_name).all()
-    all_crew = Crew.query.order_by(Crew.first_name, Crew.last_name).all()
-
     if request.method == "POST":
         # basic fields
         ep.episode_number = request.form.get("episode_number")
         ep.title = request.form.get("title")
         ep.description = request.form.get("description")
 
-        # actor assignments (checkboxes or multi-select)
-        actor_ids = request.form.getlist("actor_ids")  # list of strings
-        if actor_ids:
-            ep.actors = Actor.query.filter(Actor.id.in_(actor_ids)).all()
-        else:
-            ep.actors = []
-
-        # crew assignments
-        crew_ids = request.form.getlist("crew_ids")
-        if crew_ids:
-            ep.crew = Crew.query.filter(Crew.id.in_(crew_ids)).all()
-        else:
-            ep.crew = []
+        # the editor posts the full cast/crew; only the links that changed are written
+        try:
+            assignments.apply([{
+                "episode_id": ep.id,
+                "actor_ids": [int(i) for i in request.form.getlist("actor_ids")],
+                "crew_ids": [int(i) for i in request.form.getlist("crew_ids")],
+            }])
+        except (ValueError, assignments.AssignmentError):
+            db.session.rollback()
+            flash("Unknown actor or crew member", "danger")
+            return redirect(url_for("ui.episode_edit", episode_id=episode_id))
 
         db.session.commit()
+        cache.invalidate(show_tag(season.tvshow_id), season_tag(ep.season_id))
         flash("Episode updated", "success")
         return redirect(url_for("ui.episodes", season_id=ep.season_id))
 
-    return render_template("episode_edit.html", episode=ep, season=season, all_actors=all_actors, all_crew=all_crew)
+    # current cast/crew only; others are found through the typeahead
+    return render_template("episode_edit.html", episode=ep, season=season,
+                           crew=[link.crew for link in ep.crews])
 
 
 # ---------------- EPISODE DELETE ----------------
@@ -317,11 +350,13 @@ def episode_edit(episode_id):
 def episode_delete(episode_id):
     ep = Episode.query.get_or_404(episode_id)
     season_id = ep.season_id
-    if session.get("role") != "admin":
+    show_id = ep.season.tvshow_id
+    if not is_admin():
         flash("Admin only", "danger")
         return redirect(url_for("ui.episodes", season_id=season_id))
 
-    db.session.delete(ep)
+    deletion.delete_episode(episode_id)
     db.session.commit()
+    cache.invalidate(show_tag(show_id), season_tag(season_id))
     flash("Episode deleted", "success")
     return redirect(url_for("ui.episodes", season_id=season_id))